@@ -1,24 +1,105 @@
 # cotizaciones/admin.py
 
-from django.contrib import admin
-from .models import Departamento, Cotizacion
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db import transaction
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+from .forms import CambioPrecioForm
+from .models import Departamento, Cotizacion, TrabajoPDF
+from .paginacion import PaginadorEstimado
+from . import reajustes
+from .resumen import CAMPOS_RESUMEN, Cambios
 
 @admin.register(Departamento)
 class DepartamentoAdmin(admin.ModelAdmin):
-    list_display = ['codigo', 'nombre', 'precio', 'exceso_precio','area_m2', 'area_libre', 'habitaciones', 'banos', 'pisos', 'disponible', 'precio']
-    list_filter = ['disponible', 'habitaciones', 'banos', 'pisos']
+    list_display = ['codigo', 'nombre', 'precio', 'exceso_precio', 'area_m2', 'area_libre', 'habitaciones', 'banos', 'pisos', 'estado', 'disponible']
+    list_filter = ['estado', 'disponible', 'habitaciones', 'banos', 'pisos']
     search_fields = ['codigo', 'nombre', 'descripcion']
-    list_editable = ['disponible', 'precio']
     ordering = ['codigo']
+    # Los cambios masivos van por acciones de un solo UPDATE, no fila por fila con list_editable
+    actions = ['marcar_vendido', 'marcar_separado', 'marcar_disponible', 'cambiar_precio']
+
+    def _cambiar_estado(self, request, queryset, estado):
+        disponible = estado == 'disponible'
+        filas = queryset.exclude(estado=estado, disponible=disponible).actualizar_catalogo(
+            estado=estado, disponible=disponible,
+        )
+        self.message_user(request, f'{filas} departamento(s) marcados como {estado}.', messages.SUCCESS)
+
+    @admin.action(description='Marcar como vendido')
+    def marcar_vendido(self, request, queryset):
+        self._cambiar_estado(request, queryset, 'vendido')
+
+    @admin.action(description='Marcar como separado')
+    def marcar_separado(self, request, queryset):
+        self._cambiar_estado(request, queryset, 'separado')
+
+    @admin.action(description='Marcar como disponible')
+    def marcar_disponible(self, request, queryset):
+        self._cambiar_estado(request, queryset, 'disponible')
+
+    @admin.action(description='Aplicar cambio de precio')
+    def cambiar_precio(self, request, queryset):
+        """Página intermedia con el reajuste; al confirmarlo, un solo UPDATE con F() (ver reajustes.py)"""
+        form = CambioPrecioForm(request.POST if 'aplicar' in request.POST else None)
+        if form.is_valid():
+            try:
+                filas = reajustes.aplicar(
+                    queryset, form.cleaned_data['campo'], form.cleaned_data['tipo'], form.cleaned_data['valor'],
+                )
+            except reajustes.ErrorReajuste as e:
+                self.message_user(request, f'{e} No se aplicó.', messages.ERROR)
+            else:
+                self.message_user(request, f'Precio actualizado en {filas} departamento(s).', messages.SUCCESS)
+            return None
+
+        select_across = request.POST.get('select_across') == '1'
+        return TemplateResponse(request, 'admin/cotizaciones/departamento/cambiar_precio.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Aplicar cambio de precio',
+            'opts': self.model._meta,
+            'form': form,
+            'cantidad': queryset.count(),
+            'seleccionados': [] if select_across else request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': select_across,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
 
 @admin.register(Cotizacion)
 class CotizacionAdmin(admin.ModelAdmin):
     list_display = ['numero_cotizacion', 'nombre_cliente', 'departamento', 'precio_final', 'fecha_creacion', 'creado_por', 'activo']
-    list_filter = ['activo', 'fecha_creacion', 'creado_por']
+    # Sin date_hierarchy: arma sus enlaces con SELECT DISTINCT de fechas sobre toda la tabla
+    # Sin filtro por creado_por: listaría a todos los usuarios (o, con RelatedOnlyFieldListFilter,
+    # un SELECT DISTINCT sobre toda la tabla). ?creado_por__id__exact=<id> sigue funcionando en la URL.
+    list_filter = ['activo', 'fecha_creacion']
     search_fields = ['numero_cotizacion', 'nombre_cliente', 'dni_cliente']
     readonly_fields = ['numero_cotizacion', 'precio_final', 'fecha_creacion']
-    date_hierarchy = 'fecha_creacion'
-    
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related('departamento', 'creado_por')
\ No newline at end of file
+    list_select_related = ['departamento', 'creado_por']
+    autocomplete_fields = ['departamento', 'usuario', 'creado_por']
+    # Sin filtros, el total sale de las estadísticas de la base y no de COUNT(*)
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    actions = ['desactivar']
+
+    @admin.action(description='Desactivar cotizaciones seleccionadas')
+    def desactivar(self, request, queryset):
+        """Baja lógica en un solo UPDATE, restando su aporte al resumen de ventas"""
+        activas = queryset.filter(activo=True)
+        with transaction.atomic():
+            cambios = Cambios()
+            for valores in activas.select_for_update().values(*CAMPOS_RESUMEN).iterator(chunk_size=2000):
+                cambios.sumar(valores, -1)
+            filas = activas.update(activo=False, actualizado=timezone.now())
+            cambios.guardar()
+        self.message_user(request, f'{filas} cotización(es) desactivadas.', messages.SUCCESS)
+
+@admin.register(TrabajoPDF)
+class TrabajoPDFAdmin(admin.ModelAdmin):
+    list_display = ['cotizacion', 'estado', 'intentos', 'actualizado']
+    list_filter = ['estado']
+    list_select_related = ['cotizacion']
+    readonly_fields = ['cotizacion', 'intentos', 'error', 'actualizado']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
@@ -0,0 +1,127 @@
+# cotizaciones/almacen_pdf.py
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.db import models
+
+from . import financiamiento, metricas, precios
+from .utils import generar_pdf_cotizacion
+
+logger = logging.getLogger(__name__)
+
+# Subir este número cuando cambie el diseño del PDF para descartar lo guardado
+VERSION_PLANTILLA = 3
+
+# Campos que alimentan el documento
+CAMPOS_COTIZACION = [
+    'numero_cotizacion', 'nombre_cliente', 'dni_cliente', 'direccion_cliente',
+    'distrito_cliente', 'telefono_cliente', 'email_cliente', 'medio_contacto',
+    'fecha_creacion', 'tipo_descuento', 'valor_descuento', 'precio_final', 'monto_descuento',
+    'cuota_inicial', 'datos_estaticos',
+]
+CAMPOS_DEPARTAMENTO = [
+    'nombre', 'codigo', 'precio', 'exceso_precio', 'area_m2', 'area_libre', 'imagen',
+]
+
+
+def _normalizar(instancia, nombre):
+    """Valor estable de un campo, igual venga del formulario o de la base de datos"""
+    campo = instancia._meta.get_field(nombre)
+    valor = getattr(instancia, nombre)
+    if valor is None or valor == '':
+        return None
+    if isinstance(campo, models.DecimalField):
+        return f"{Decimal(valor):.{campo.decimal_places}f}"
+    if isinstance(campo, models.DateTimeField):
+        return valor.isoformat()
+    if isinstance(campo, models.FileField):
+        return valor.name
+    return valor
+
+
+def huella_cotizacion(cotizacion):
+    """Huella del contenido que determina el PDF de una cotización"""
+    depto = cotizacion.departamento
+    contenido = {
+        'version': VERSION_PLANTILLA,
+        'cotizacion': {c: _normalizar(cotizacion, c) for c in CAMPOS_COTIZACION},
+        'departamento': {c: _normalizar(depto, c) for c in CAMPOS_DEPARTAMENTO},
+        'separacion': str(precios.monto_separacion()),
+    }
+    if settings.PDF_COMPACTO:
+        contenido['compacto'] = True
+    if settings.HIPOTECA_EN_PDF:
+        contenido['hipoteca'] = {str(anios): str(tea) for anios, tea in financiamiento.tasas().items()}
+    serializado = json.dumps(contenido, sort_keys=True, default=str)
+    return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+
+
+def _directorio(cotizacion_id):
+    return os.path.join(settings.PDF_CACHE_DIR, str(cotizacion_id))
+
+
+def _ruta(cotizacion_id, huella):
+    return os.path.join(_directorio(cotizacion_id), f'{huella}.pdf')
+
+
+def _guardar(cotizacion_id, huella, pdf):
+    """Escribe el PDF de forma atómica y elimina versiones anteriores"""
+    directorio = _directorio(cotizacion_id)
+    os.makedirs(directorio, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directorio, suffix='.tmp', delete=False) as tmp:
+        tmp.write(pdf)
+    ruta = _ruta(cotizacion_id, huella)
+    os.replace(tmp.name, ruta)
+
+    for nombre in os.listdir(directorio):
+        if nombre != os.path.basename(ruta) and nombre.endswith('.pdf'):
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except OSError:
+                pass
+    return ruta
+
+
+def pdf_disponible(cotizacion):
+    """Indica si el PDF del contenido actual ya está en el almacén"""
+    return os.path.exists(_ruta(cotizacion.pk, huella_cotizacion(cotizacion)))
+
+
+def abrir_pdf_cotizacion(cotizacion):
+    """
+    Devuelve un archivo abierto con el PDF de la cotización.
+    Si ya existe en el almacén para el contenido actual se lee de disco;
+    de lo contrario se genera y se guarda para las siguientes consultas.
+    """
+    ruta = _ruta(cotizacion.pk, huella_cotizacion(cotizacion))
+    with metricas.etapa('almacen') as medida:
+        try:
+            pdf = open(ruta, 'rb')
+            medida.acierto = True
+            medida.bytes = os.fstat(pdf.fileno()).st_size
+            return pdf
+        except FileNotFoundError:
+            medida.acierto = False
+
+    pdf = generar_pdf_cotizacion(cotizacion)
+
+    # La generación puede completar datos_estaticos, así que se recalcula
+    huella = huella_cotizacion(cotizacion)
+    try:
+        return open(_guardar(cotizacion.pk, huella, pdf), 'rb')
+    except OSError as e:
+        logger.warning("No se pudo guardar el PDF de la cotización %s: %s", cotizacion.pk, e)
+        return BytesIO(pdf)
+
+
+def invalidar_pdf_cotizacion(cotizacion_id):
+    """Elimina los PDFs guardados de una cotización"""
+    shutil.rmtree(_directorio(cotizacion_id), ignore_errors=True)
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CotizacionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cotizaciones'
+
+    def ready(self):
+        from . import signals
+        post_migrate.connect(signals.asegurar_indice_busqueda, sender=self)
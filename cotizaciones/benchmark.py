@@ -0,0 +1,241 @@
+# cotizaciones/benchmark.py
+"""
+Benchmark de la generación de PDFs con cotizaciones sintéticas.
+
+    python -m cotizaciones.benchmark --cotizaciones 20 --repeticiones 5 --salida antes.json
+    python manage.py benchmark_renderizado --salida despues.json
+
+Los datos se crean dentro de una transacción que se deshace al terminar y
+las imágenes salen de media/ con el storage local, sin ir a Cloudinary.
+Cada caso se mide con la salida normal y con la compacta. El resultado es
+JSON para comparar corridas entre commits.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inmobiliaria_project.settings')
+    import django
+    django.setup()
+
+import reportlab
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import override_settings
+
+from cotizaciones.models import Cotizacion, Departamento
+from cotizaciones.utils import generar_pdf_cotizacion
+
+# Imagen incluida en el repositorio que reemplaza a las de Cloudinary
+IMAGEN_SINTETICA = 'departamentos/tp-2.jpg'
+
+CASOS = {
+    'sin_imagen': None,
+    'con_imagen': IMAGEN_SINTETICA,
+}
+
+# Modos de salida comparados: el PDF de siempre y el compacto (PDF_COMPACTO)
+MODOS = {
+    'normal': False,
+    'compacto': True,
+}
+
+
+def _percentil(valores, p):
+    """Percentil por rango más cercano"""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+def _commit():
+    try:
+        resultado = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return resultado.stdout.strip() or None
+
+
+def crear_datos(cantidad):
+    """Departamentos y cotizaciones sintéticos para cada caso"""
+    usuario = User.objects.create(username=f'benchmark_{time.time_ns()}')
+    datos = {}
+    for caso, imagen in CASOS.items():
+        cotizaciones = []
+        for i in range(cantidad):
+            depto = Departamento.objects.create(
+                codigo=f'BENCH-{caso[:3]}-{i}',
+                nombre=f'Departamento {i + 1}',
+                precio=Decimal('250000.00') + i * 1000,
+                exceso_precio=Decimal('50000.00'),
+                area_m2=Decimal('72.50'),
+                area_libre=Decimal('12.00'),
+                habitaciones=3,
+                banos=2,
+                pisos=i % 10 + 1,
+                imagen=imagen,
+            )
+            cotizacion = Cotizacion.objects.create(
+                nombre_cliente=f'Cliente Sintético {i + 1}',
+                dni_cliente=f'{10000000 + i}',
+                direccion_cliente='Av. Siempre Viva 742',
+                distrito_cliente='San Miguel',
+                telefono_cliente='987654321',
+                email_cliente=f'cliente{i}@example.com',
+                cuota_inicial=Decimal('30000.00'),
+                departamento=depto,
+                creado_por=usuario,
+                tipo_descuento='PORC' if i % 2 else 'MONTO',
+                valor_descuento=Decimal('5') if i % 2 else Decimal('2000'),
+            )
+            cotizaciones.append(cotizacion)
+        datos[caso] = cotizaciones
+    return datos
+
+
+def medir(cotizaciones, repeticiones, calentamiento, compacto=False):
+    """Latencias, PDFs por segundo, tamaño y pico de memoria de un caso"""
+    for cotizacion in cotizaciones[:calentamiento]:
+        generar_pdf_cotizacion(cotizacion, compacto=compacto)
+
+    latencias = []
+    tamanos = []
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for cotizacion in cotizaciones:
+            t = time.perf_counter()
+            pdf = generar_pdf_cotizacion(cotizacion, compacto=compacto)
+            latencias.append((time.perf_counter() - t) * 1000)
+            tamanos.append(len(pdf))
+    duracion = time.perf_counter() - inicio
+
+    # tracemalloc hace todo más lento: la memoria se mide en una pasada aparte
+    picos = []
+    tracemalloc.start()
+    try:
+        for cotizacion in cotizaciones:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            generar_pdf_cotizacion(cotizacion, compacto=compacto)
+            picos.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'pdfs': len(latencias),
+        'latencia_ms': {
+            'media': round(statistics.mean(latencias), 3),
+            'p50': round(_percentil(latencias, 50), 3),
+            'p90': round(_percentil(latencias, 90), 3),
+            'p99': round(_percentil(latencias, 99), 3),
+            'max': round(max(latencias), 3),
+        },
+        'pdfs_por_segundo': round(len(latencias) / duracion, 2),
+        'tamano_bytes': {
+            'media': round(statistics.mean(tamanos)),
+            'min': min(tamanos),
+            'max': max(tamanos),
+        },
+        'memoria_pico_kb': {
+            'p50': round(_percentil(picos, 50) / 1024, 1),
+            'max': round(max(picos) / 1024, 1),
+        },
+    }
+
+
+def _comparar(normal, compacto):
+    """Proporción compacto/normal: menos de 1 es mejor"""
+    return {
+        'tamano': round(compacto['tamano_bytes']['media'] / normal['tamano_bytes']['media'], 3),
+        'latencia_p50': round(compacto['latencia_ms']['p50'] / normal['latencia_ms']['p50'], 3),
+        'memoria_pico': round(compacto['memoria_pico_kb']['max'] / normal['memoria_pico_kb']['max'], 3),
+    }
+
+
+def ejecutar(cantidad=20, repeticiones=5, calentamiento=3):
+    """Corre el benchmark completo y devuelve el resultado como diccionario"""
+    cache_imagenes = tempfile.mkdtemp(prefix='benchmark_imagenes_')
+    storages = {
+        **settings.STORAGES,
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': str(settings.MEDIA_ROOT), 'base_url': settings.MEDIA_URL},
+        },
+    }
+    resultado = {
+        'commit': _commit(),
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'reportlab': reportlab.Version,
+        'parametros': {
+            'cotizaciones': cantidad,
+            'repeticiones': repeticiones,
+            'calentamiento': calentamiento,
+        },
+        'casos': {},
+    }
+    try:
+        with override_settings(STORAGES=storages, IMAGENES_CACHE_DIR=cache_imagenes):
+            with transaction.atomic():
+                datos = crear_datos(cantidad)
+
+                # Primer PDF del proceso: incluye preparar el renderer y la imagen
+                t = time.perf_counter()
+                generar_pdf_cotizacion(datos['con_imagen'][0], compacto=False)
+                resultado['primer_pdf_ms'] = round((time.perf_counter() - t) * 1000, 3)
+
+                for caso, cotizaciones in datos.items():
+                    modos = {
+                        modo: medir(cotizaciones, repeticiones, calentamiento, compacto)
+                        for modo, compacto in MODOS.items()
+                    }
+                    modos['compacto_vs_normal'] = _comparar(modos['normal'], modos['compacto'])
+                    resultado['casos'][caso] = modos
+                transaction.set_rollback(True)
+    finally:
+        shutil.rmtree(cache_imagenes, ignore_errors=True)
+    return resultado
+
+
+def agregar_argumentos(parser):
+    parser.add_argument('--cotizaciones', type=int, default=20, help='Cotizaciones sintéticas por caso')
+    parser.add_argument('--repeticiones', type=int, default=5, help='Veces que se genera cada PDF')
+    parser.add_argument('--calentamiento', type=int, default=3, help='PDFs generados antes de medir')
+    parser.add_argument('--salida', help='Archivo JSON donde guardar el resultado')
+
+
+def guardar(resultado, salida=None):
+    """Escribe el JSON en el archivo indicado y lo devuelve como texto"""
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if salida:
+        with open(salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    return texto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de generación de PDFs de cotizaciones')
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+    resultado = ejecutar(args.cotizaciones, args.repeticiones, args.calentamiento)
+    print(guardar(resultado, args.salida))
+
+
+if __name__ == '__main__':
+    main()
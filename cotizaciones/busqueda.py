@@ -0,0 +1,185 @@
+# cotizaciones/busqueda.py
+"""
+Búsqueda de cotizaciones por nombre, DNI o teléfono del cliente.
+
+En SQLite se usa una tabla FTS5 (cotizaciones_busqueda) que lee las columnas
+de cotizaciones_cotizacion y se mantiene al día con triggers, así que también
+cubre bulk_create y los update() masivos. En PostgreSQL se usa un índice GIN
+de trigramas (pg_trgm) sobre los mismos campos concatenados.
+
+En las dos bases la búsqueda no distingue tildes: "perez" encuentra "Pérez".
+SQLite las quita en el tokenizer (remove_diacritics 2); en PostgreSQL el
+índice y la consulta pasan por cotizaciones_unaccent, una envoltura IMMUTABLE
+de unaccent (unaccent no lo es y no se puede usar en un índice).
+"""
+
+import re
+from datetime import datetime, time, timedelta
+
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+TABLA_FTS = 'cotizaciones_busqueda'
+INDICE_TRIGRAMAS = 'cotizacion_busqueda_unaccent_trgm_idx'
+SIN_TILDES = 'cotizaciones_unaccent'
+
+_PG_SIN_TILDES = f"""
+CREATE OR REPLACE FUNCTION {SIN_TILDES}(text) RETURNS text AS
+$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+"""
+
+# Misma expresión en el índice y en la consulta para que PostgreSQL lo use
+DOCUMENTO_PG = f"{SIN_TILDES}(nombre_cliente || ' ' || dni_cliente || ' ' || telefono_cliente)"
+
+_SQLITE_TABLA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+    nombre_cliente, dni_cliente, telefono_cliente,
+    content='cotizaciones_cotizacion', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+)
+"""
+
+_SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON cotizaciones_cotizacion BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, nombre_cliente, dni_cliente, telefono_cliente)
+        VALUES (new.id, new.nombre_cliente, new.dni_cliente, new.telefono_cliente);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON cotizaciones_cotizacion BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre_cliente, dni_cliente, telefono_cliente)
+        VALUES ('delete', old.id, old.nombre_cliente, old.dni_cliente, old.telefono_cliente);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF nombre_cliente, dni_cliente, telefono_cliente
+    ON cotizaciones_cotizacion
+    WHEN old.nombre_cliente IS NOT new.nombre_cliente
+        OR old.dni_cliente IS NOT new.dni_cliente
+        OR old.telefono_cliente IS NOT new.telefono_cliente
+    BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre_cliente, dni_cliente, telefono_cliente)
+        VALUES ('delete', old.id, old.nombre_cliente, old.dni_cliente, old.telefono_cliente);
+        INSERT INTO {TABLA_FTS}(rowid, nombre_cliente, dni_cliente, telefono_cliente)
+        VALUES (new.id, new.nombre_cliente, new.dni_cliente, new.telefono_cliente);
+    END
+    """,
+]
+
+
+def crear_indice(connection):
+    """
+    Crea el índice de búsqueda si falta. En SQLite también revisa los
+    triggers: las migraciones que reconstruyen la tabla de cotizaciones los
+    borran, y en ese caso se recrean y se vuelve a poblar el índice.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{TABLA_FTS}_a_'],
+            )
+            if cursor.fetchone()[0] == len(_SQLITE_TRIGGERS):
+                return
+            cursor.execute(_SQLITE_TABLA)
+            for trigger in _SQLITE_TRIGGERS:
+                cursor.execute(trigger)
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+            cursor.execute(_PG_SIN_TILDES)
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {INDICE_TRIGRAMAS} ON cotizaciones_cotizacion '
+                f'USING gin (({DOCUMENTO_PG}) gin_trgm_ops)'
+            )
+
+
+def eliminar_indice(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for sufijo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA_FTS}_{sufijo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {INDICE_TRIGRAMAS}')
+
+
+def terminos(texto):
+    """Palabras de la búsqueda, sin signos de puntuación"""
+    return re.findall(r'\w+', texto or '')
+
+
+def _consulta_fts(palabras):
+    # Cada palabra como prefijo entre comillas: "perez" encuentra "Pérez" y "Perezoso"
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def _contiene(palabra):
+    escapada = palabra.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escapada}%'
+
+
+def buscar(queryset, texto):
+    """
+    Filtra el queryset de cotizaciones por las palabras de la búsqueda y lo
+    anota con `relevancia` (mayor es mejor). Todas las palabras deben
+    aparecer en el nombre, el DNI o el teléfono.
+    """
+    palabras = terminos(texto)
+    if not palabras:
+        return queryset.none()
+
+    if connections[queryset.db].vendor == 'postgresql':
+        for palabra in palabras:
+            queryset = queryset.filter(
+                RawSQL(
+                    f'{DOCUMENTO_PG} ILIKE {SIN_TILDES}(%s)', [_contiene(palabra)], output_field=BooleanField()
+                )
+            )
+        return queryset.annotate(
+            relevancia=RawSQL(
+                f'word_similarity({SIN_TILDES}(%s), {DOCUMENTO_PG})', [' '.join(palabras)],
+                output_field=FloatField(),
+            )
+        )
+
+    # Unión con la tabla FTS (modelo IndiceBusqueda): SQLite recorre primero
+    # las coincidencias y calcula bm25 una sola vez por fila
+    return queryset.filter(
+        indice_busqueda__isnull=False,
+    ).filter(
+        RawSQL(f'{TABLA_FTS} MATCH %s', [_consulta_fts(palabras)], output_field=BooleanField())
+    ).annotate(
+        relevancia=-F('indice_busqueda__rank')
+    )
+
+
+def filtrar(queryset, criterios):
+    """
+    Aplica los criterios de BusquedaCotizacionesForm y ordena: por relevancia
+    si hay texto, si no de la más reciente a la más antigua.
+    """
+    if criterios.get('medio_contacto'):
+        queryset = queryset.filter(medio_contacto=criterios['medio_contacto'])
+    if criterios.get('departamento'):
+        queryset = queryset.filter(departamento=criterios['departamento'])
+    # Rangos sobre la columna, sin __date, para que sirva el índice por fecha
+    if criterios.get('fecha_desde'):
+        queryset = queryset.filter(fecha_creacion__gte=_inicio_del_dia(criterios['fecha_desde']))
+    if criterios.get('fecha_hasta'):
+        queryset = queryset.filter(
+            fecha_creacion__lt=_inicio_del_dia(criterios['fecha_hasta'] + timedelta(days=1))
+        )
+
+    if terminos(criterios.get('q')):
+        return buscar(queryset, criterios['q']).order_by('-relevancia', '-fecha_creacion', '-id')
+    return queryset.order_by('-fecha_creacion', '-id')
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
@@ -0,0 +1,53 @@
+# cotizaciones/catalogo.py
+"""
+Catálogo de departamentos en JSON para las tablets de ventas.
+
+Sin `desde` se devuelve el catálogo completo. Con `desde=<versión>` solo los
+departamentos cuya versión es mayor (altas y cambios en CAMPOS_CATALOGO) y
+los ids de los borrados después de esa versión. El cliente guarda la
+`version` de la respuesta y la envía en la siguiente consulta.
+"""
+
+from .models import (
+    CAMPOS_CATALOGO, CONTADOR_DEPARTAMENTOS, Contador, Departamento, DepartamentoEliminado,
+)
+
+
+def _serializar(depto, storage):
+    imagen = depto.pop('imagen')
+    depto['imagen'] = storage.url(imagen) if imagen else None
+    return depto
+
+
+def version_actual():
+    return Contador.objects.valor(CONTADOR_DEPARTAMENTOS)
+
+
+def catalogo(version, desde=None):
+    """
+    Departamentos y bajas posteriores a la versión `desde` (todo si es None).
+    `version` se lee antes que los datos: un cambio que entre mientras tanto
+    se vuelve a enviar en la consulta siguiente, nunca se pierde.
+    """
+    if desde is not None and desde > version:
+        desde = None  # Versión de otra base (restaurada o nueva): catálogo completo
+    storage = Departamento._meta.get_field('imagen').storage
+
+    departamentos = Departamento.objects.order_by('pisos', 'codigo')
+    eliminados = []
+    if desde is not None:
+        departamentos = departamentos.filter(version__gt=desde)
+        eliminados = list(
+            DepartamentoEliminado.objects.filter(version__gt=desde)
+            .order_by('version').values_list('departamento_id', flat=True)
+        )
+
+    return {
+        'version': version,
+        'completo': desde is None,
+        'departamentos': [
+            _serializar(depto, storage)
+            for depto in departamentos.values('id', 'version', *CAMPOS_CATALOGO)
+        ],
+        'eliminados': eliminados,
+    }
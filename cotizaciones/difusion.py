@@ -0,0 +1,116 @@
+# cotizaciones/difusion.py
+"""
+Aviso en tiempo real de cambios en los departamentos (Server-Sent Events).
+
+Cada cambio publicado del catálogo sube la versión de departamentos (ver
+Departamento.save). El difusor reparte esa versión a las conexiones SSE
+abiertas en el proceso y el navegador pide el detalle a la API del catálogo
+con ?desde=. Los cambios hechos en otro proceso (otro worker web, el admin
+en otro servidor, un comando) los detecta un vigía que lee la versión cada
+SSE_INTERVALO_VERSION segundos: una consulta por proceso, no por conexión.
+
+El difusor se elige con settings.DIFUSOR_DEPARTAMENTOS; cualquier clase con
+publicar(version) y suscribir() sirve de reemplazo.
+"""
+
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .catalogo import version_actual
+
+logger = logging.getLogger(__name__)
+
+
+def _poner(cola, version):
+    # Solo importa la última versión: una conexión lenta no acumula avisos
+    if cola.full():
+        cola.get_nowait()
+    cola.put_nowait(version)
+
+
+def _leer_version():
+    try:
+        return version_actual()
+    finally:
+        close_old_connections()
+
+
+class DifusorLocal:
+    """Reparte versiones entre las conexiones asyncio abiertas en este proceso"""
+
+    def __init__(self, intervalo=None):
+        self.intervalo = intervalo if intervalo is not None else settings.SSE_INTERVALO_VERSION
+        self.version = None
+        self._suscriptores = set()
+        self._vigias = {}
+        self._lock = threading.Lock()
+
+    def publicar(self, version):
+        """Avisa una versión nueva a todas las conexiones; se puede llamar desde cualquier hilo"""
+        with self._lock:
+            if self.version is not None and version <= self.version:
+                return
+            self.version = version
+            suscriptores = list(self._suscriptores)
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(_poner, cola, version)
+            except RuntimeError:
+                pass  # Loop ya cerrado: la conexión se está yendo
+
+    @asynccontextmanager
+    async def suscribir(self):
+        """Cola de la que la conexión lee las versiones nuevas mientras está abierta"""
+        loop = asyncio.get_running_loop()
+        suscriptor = (loop, asyncio.Queue(maxsize=1))
+        with self._lock:
+            self._suscriptores.add(suscriptor)
+            vigia = self._vigias.get(loop)
+            if vigia is None or vigia.done():
+                self._vigias[loop] = loop.create_task(self._vigilar(loop))
+        try:
+            yield suscriptor[1]
+        finally:
+            with self._lock:
+                self._suscriptores.discard(suscriptor)
+
+    def _hay_suscriptores(self, loop):
+        with self._lock:
+            if any(l is loop for l, _ in self._suscriptores):
+                return True
+            self._vigias.pop(loop, None)
+            return False
+
+    async def _vigilar(self, loop):
+        """Cambios hechos fuera de este proceso; termina cuando no quedan conexiones"""
+        while self._hay_suscriptores(loop):
+            await asyncio.sleep(self.intervalo)
+            try:
+                self.publicar(await sync_to_async(_leer_version, thread_sensitive=False)())
+            except Exception:
+                logger.exception('No se pudo leer la versión de los departamentos')
+
+
+_difusor = None
+_difusor_lock = threading.Lock()
+
+
+def obtener_difusor():
+    """Difusor del proceso, de la clase configurada en DIFUSOR_DEPARTAMENTOS"""
+    global _difusor
+    with _difusor_lock:
+        if _difusor is None:
+            _difusor = import_string(settings.DIFUSOR_DEPARTAMENTOS)()
+        return _difusor
+
+
+def publicar_version(version):
+    """Llamado al confirmarse un cambio en los departamentos"""
+    obtener_difusor().publicar(version)
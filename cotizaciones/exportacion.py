@@ -0,0 +1,387 @@
+# cotizaciones/exportacion.py
+
+import csv
+import multiprocessing
+import re
+import resource
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time as hora, timedelta
+from decimal import Decimal
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+
+from .models import Cotizacion, Departamento
+from .almacen_pdf import abrir_pdf_cotizacion
+from .utils import obtener_renderer
+
+# Filas leídas de la base por viaje y escritas por cada parte de la respuesta
+LOTE_EXPORTACION = 2000
+
+# (encabezado, campo). Los encabezados de cotizaciones son los que acepta la importación
+COLUMNAS_COTIZACIONES = [
+    ('numero_cotizacion', 'numero_cotizacion'),
+    ('fecha_creacion', 'fecha_creacion'),
+    ('nombre_cliente', 'nombre_cliente'),
+    ('dni_cliente', 'dni_cliente'),
+    ('direccion_cliente', 'direccion_cliente'),
+    ('distrito_cliente', 'distrito_cliente'),
+    ('telefono_cliente', 'telefono_cliente'),
+    ('email_cliente', 'email_cliente'),
+    ('medio_contacto', 'medio_contacto'),
+    ('departamento', 'departamento__codigo'),
+    ('departamento_nombre', 'departamento__nombre'),
+    ('piso', 'departamento__pisos'),
+    ('agente', 'creado_por__username'),
+    ('precio_lista', 'precio_lista'),
+    ('tipo_descuento', 'tipo_descuento'),
+    ('valor_descuento', 'valor_descuento'),
+    ('monto_descuento', 'monto_descuento'),
+    ('precio_final', 'precio_final'),
+    ('cuota_inicial', 'cuota_inicial'),
+]
+
+COLUMNAS_DEPARTAMENTOS = [
+    ('codigo', 'codigo'),
+    ('nombre', 'nombre'),
+    ('piso', 'pisos'),
+    ('estado', 'estado'),
+    ('disponible', 'disponible'),
+    ('precio', 'precio'),
+    ('exceso_precio', 'exceso_precio'),
+    ('area_m2', 'area_m2'),
+    ('area_libre', 'area_libre'),
+    ('habitaciones', 'habitaciones'),
+    ('banos', 'banos'),
+    ('actualizado', 'actualizado'),
+]
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, hora.min))
+
+
+def filtrar_cotizaciones(desde=None, hasta=None, departamento=None):
+    """Cotizaciones activas por rango de fechas y/o código de departamento, de la más antigua a la más reciente"""
+    qs = Cotizacion.objects.filter(activo=True)
+    # Rangos sobre la columna, sin __date, para que sirva el índice por fecha
+    if desde:
+        qs = qs.filter(fecha_creacion__gte=_inicio_del_dia(desde))
+    if hasta:
+        qs = qs.filter(fecha_creacion__lt=_inicio_del_dia(hasta + timedelta(days=1)))
+    if departamento:
+        qs = qs.filter(departamento__codigo=departamento)
+    return qs.order_by('fecha_creacion', 'id')
+
+
+def seleccionar_cotizaciones(desde=None, hasta=None, departamento=None):
+    """IDs de las cotizaciones activas a exportar, por rango de fechas y/o departamento"""
+    return list(filtrar_cotizaciones(desde, hasta, departamento).values_list('id', flat=True))
+
+
+def filas_cotizaciones(desde=None, hasta=None, departamento=None):
+    """
+    Tuplas con las columnas de COLUMNAS_COTIZACIONES, leídas por lotes con
+    un cursor: sin instancias de modelos y con memoria constante.
+    """
+    precio_lista = ExpressionWrapper(
+        F('precio_final') + F('monto_descuento'), output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    return (
+        filtrar_cotizaciones(desde, hasta, departamento)
+        .annotate(precio_lista=precio_lista)
+        .values_list(*(campo for _, campo in COLUMNAS_COTIZACIONES))
+        .iterator(chunk_size=LOTE_EXPORTACION)
+    )
+
+
+def filas_departamentos():
+    return (
+        Departamento.objects.order_by('pisos', 'codigo')
+        .values_list(*(campo for _, campo in COLUMNAS_DEPARTAMENTOS))
+        .iterator(chunk_size=LOTE_EXPORTACION)
+    )
+
+
+def _lotes(filas):
+    filas = iter(filas)
+    while lote := list(islice(filas, LOTE_EXPORTACION)):
+        yield lote
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sí' if valor else 'No'
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M:%S')
+    return str(valor)
+
+
+class _Eco:
+    """csv.writer escribe aquí y devuelve la línea en lugar de guardarla"""
+    def write(self, linea):
+        return linea
+
+
+def csv_en_streaming(encabezados, filas):
+    """CSV en UTF-8 con BOM (Excel lo abre con tildes) entregado por lotes de filas"""
+    escritor = csv.writer(_Eco())
+    yield ('\ufeff' + escritor.writerow(encabezados)).encode()
+    for lote in _lotes(filas):
+        yield ''.join(escritor.writerow([_texto(v) for v in fila]) for fila in lote).encode()
+
+
+# Partes fijas de un libro XLSX con una sola hoja. Estilos: 1 fecha, 2 encabezado, 3 importe
+_NS = 'http://schemas.openxmlformats.org'
+_XLSX_FIJOS = {
+    '[Content_Types].xml': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<Types xmlns="{_NS}/package/2006/content-types">'
+        f'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        f'<Default Extension="xml" ContentType="application/xml"/>'
+        f'<Override PartName="/xl/workbook.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        f'<Override PartName="/xl/worksheets/sheet1.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        f'<Override PartName="/xl/styles.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f'</Types>'
+    ),
+    '_rels/.rels': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<Relationships xmlns="{_NS}/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_NS}/officeDocument/2006/relationships/officeDocument" '
+        f'Target="xl/workbook.xml"/>'
+        f'</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<Relationships xmlns="{_NS}/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_NS}/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_NS}/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        f'</Relationships>'
+    ),
+    'xl/styles.xml': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<styleSheet xmlns="{_NS}/spreadsheetml/2006/main">'
+        f'<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm"/></numFmts>'
+        f'<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        f'<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        f'<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        f'<fill><patternFill patternType="gray125"/></fill></fills>'
+        f'<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        f'<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        f'<cellXfs count="4">'
+        f'<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        f'<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        f'<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+        f'<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        f'</cellXfs>'
+        f'<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        f'</styleSheet>'
+    ),
+}
+_XLSX_LIBRO = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<workbook xmlns="{_NS}/spreadsheetml/2006/main" xmlns:r="{_NS}/officeDocument/2006/relationships">'
+    f'<sheets><sheet name="{{hoja}}" sheetId="1" r:id="rId1"/></sheets>'
+    f'</workbook>'
+)
+_XLSX_HOJA_INICIO = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<worksheet xmlns="{_NS}/spreadsheetml/2006/main"><sheetViews><sheetView workbookViewId="0">'
+    f'<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    f'</sheetView></sheetViews><sheetData>'
+)
+_XLSX_HOJA_FIN = '</sheetData></worksheet>'
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+# Caracteres de control que XML no admite
+_NO_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _celda(valor, estilo=0):
+    if valor is None or valor == '':
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, Decimal):
+        return f'<c s="3"><v>{valor}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f'<c><v>{valor}</v></c>'
+    if isinstance(valor, (datetime, date)):
+        if isinstance(valor, datetime):
+            valor = timezone.localtime(valor).replace(tzinfo=None) if timezone.is_aware(valor) else valor
+        else:
+            valor = datetime.combine(valor, hora.min)
+        return f'<c s="1"><v>{(valor - _EPOCA_EXCEL) / timedelta(days=1)}</v></c>'
+    texto = escape(_NO_XML.sub('', str(valor)))
+    atributos = f' s="{estilo}"' if estilo else ''
+    return f'<c t="inlineStr"{atributos}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xlsx(valores, estilo=0):
+    return '<row>' + ''.join(_celda(valor, estilo) for valor in valores) + '</row>'
+
+
+def xlsx_en_streaming(encabezados, filas, hoja='Datos'):
+    """
+    Libro XLSX de una hoja escrito a medida que llegan las filas: la hoja
+    se comprime dentro del ZIP por lotes y cada lote se entrega enseguida.
+    """
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for nombre, contenido in _XLSX_FIJOS.items():
+            zf.writestr(nombre, contenido)
+        zf.writestr('xl/workbook.xml', _XLSX_LIBRO.format(hoja=escape(hoja, {'"': '&quot;'})))
+        with zf.open('xl/worksheets/sheet1.xml', 'w') as hoja_xml:
+            hoja_xml.write((_XLSX_HOJA_INICIO + _fila_xlsx(encabezados, estilo=2)).encode())
+            for lote in _lotes(filas):
+                hoja_xml.write(''.join(_fila_xlsx(fila) for fila in lote).encode())
+                yield salida.vaciar()
+            hoja_xml.write(_XLSX_HOJA_FIN.encode())
+        yield salida.vaciar()
+    yield salida.vaciar()
+
+
+FORMATOS_TABLA = {
+    'csv': ('text/csv; charset=utf-8', csv_en_streaming),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', xlsx_en_streaming),
+}
+
+
+def exportar_tabla(formato, columnas, filas):
+    """(content_type, partes en bytes) de la tabla en el formato pedido"""
+    content_type, escribir = FORMATOS_TABLA[formato]
+    return content_type, escribir([encabezado for encabezado, _ in columnas], filas)
+
+
+def guardar_tabla(ruta, formato, columnas, filas):
+    """Escribe la tabla en un archivo, por partes; devuelve la cantidad de filas"""
+    cantidad = 0
+
+    def contar(filas):
+        nonlocal cantidad
+        for fila in filas:
+            cantidad += 1
+            yield fila
+
+    _, partes = exportar_tabla(formato, columnas, contar(filas))
+    with open(ruta, 'wb') as f:
+        for parte in partes:
+            f.write(parte)
+    return cantidad
+
+
+async def en_hilo(partes):
+    """
+    Entrega un iterador síncrono a un servidor ASGI parte por parte. Django
+    junta en una lista los iteradores síncronos antes de enviarlos por ASGI;
+    así cada parte se pide en el hilo de la vista (el de su conexión a la
+    base) y la memoria no crece con el tamaño de la descarga.
+    """
+    siguiente = sync_to_async(next, thread_sensitive=True)
+    while (parte := await siguiente(partes, None)) is not None:
+        yield parte
+
+
+def _iniciar_worker():
+    # Estilos, logo y partes fijas quedan listos una vez por proceso
+    obtener_renderer()
+
+
+def _renderizar(cotizacion_id):
+    cotizacion = Cotizacion.objects.select_related('departamento').get(pk=cotizacion_id)
+    with abrir_pdf_cotizacion(cotizacion) as pdf:
+        return f'{cotizacion.numero_cotizacion}.pdf', pdf.read()
+
+
+def iterar_pdfs(ids, procesos=1):
+    """
+    Genera (nombre, pdf) en el orden de ids. Con varios procesos se usa un
+    pool con una ventana acotada de trabajos en curso, así la memoria no
+    crece con la cantidad de cotizaciones. El pool cierra las conexiones y
+    hace fork del proceso: solo para comandos, nunca dentro de una petición.
+    """
+    if procesos <= 1:
+        for cotizacion_id in ids:
+            yield _renderizar(cotizacion_id)
+        return
+
+    # Los procesos hijos abren sus propias conexiones
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_iniciar_worker,
+    ) as pool:
+        en_curso = deque()
+        for cotizacion_id in ids:
+            en_curso.append(pool.submit(_renderizar, cotizacion_id))
+            if len(en_curso) >= procesos * 2:
+                yield en_curso.popleft().result()
+        while en_curso:
+            yield en_curso.popleft().result()
+
+
+class _SalidaZip:
+    """Destino de zipfile que acumula lo escrito hasta que se entrega"""
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def zip_en_streaming(pdfs):
+    """Arma el ZIP a medida que llegan los PDFs y lo entrega por partes"""
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for nombre, pdf in pdfs:
+            zf.writestr(nombre, pdf)
+            yield salida.vaciar()
+    yield salida.vaciar()
+
+
+def memoria_maxima_mb():
+    """Pico de memoria residente de este proceso y de sus hijos, en MB"""
+    propio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return propio / 1024, hijos / 1024
+
+
+class Medicion:
+    """Cuenta PDFs exportados y calcula el rendimiento"""
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.cantidad = 0
+        self.bytes = 0
+
+    def contar(self, pdfs):
+        for nombre, pdf in pdfs:
+            self.cantidad += 1
+            self.bytes += len(pdf)
+            yield nombre, pdf
+
+    @property
+    def pdfs_por_segundo(self):
+        duracion = time.monotonic() - self.inicio
+        return self.cantidad / duracion if duracion else 0
@@ -0,0 +1,142 @@
+# cotizaciones/financiamiento.py
+"""
+Crédito hipotecario referencial del saldo a financiar: cuota mensual fija
+(método francés) y cronograma de pagos para los plazos y tasas de
+settings.HIPOTECA_TASAS (TEA en % por plazo en años).
+
+La cuota se redondea a céntimos y el saldo tras el mes k es el monto
+capitalizado k meses menos las k cuotas pagadas, cada una capitalizada desde
+su pago. Por eso los factores (la cuota de un préstamo de 1 sol, lo que crece
+1 sol en k meses y lo que suman k pagos de 1 sol) se calculan una sola vez
+por tasa y plazo y quedan en memoria; el cronograma de cualquier monto sale
+de multiplicarlos, sin repetir el cálculo mes a mes. La última cuota es el
+saldo que queda, así absorbe el redondeo de la cuota y el total pagado es la
+suma del cronograma. El renderer de PDFs los precalcula al crearse
+(precalcular()).
+"""
+
+from decimal import Decimal, localcontext
+from functools import lru_cache
+
+from django.conf import settings
+
+from .precios import redondear
+
+
+def tasas():
+    """TEA (%) por plazo en años, de menor a mayor plazo"""
+    return {int(anios): Decimal(tea) for anios, tea in sorted(settings.HIPOTECA_TASAS.items())}
+
+
+@lru_cache(maxsize=None)
+def factores(tea, anios):
+    """
+    Tasa mensual, cuota de un préstamo de 1 sol y, por cada mes k, lo que
+    crece 1 sol en k meses y lo que vale al mes k pagar 1 sol cada mes
+    """
+    meses = anios * 12
+    with localcontext() as ctx:
+        ctx.prec = 34
+        tem = (1 + tea / 100) ** (Decimal(1) / 12) - 1
+        cuota = tem / (1 - (1 + tem) ** -meses) if tem else Decimal(1) / meses
+        crecimiento, acumulado = [], []
+        capital, pagos = Decimal(1), Decimal(0)
+        for _ in range(meses):
+            pagos = pagos * (1 + tem) + 1
+            capital = capital * (1 + tem)
+            crecimiento.append(capital)
+            acumulado.append(pagos)
+    return tem, cuota, tuple(crecimiento), tuple(acumulado)
+
+
+def precalcular():
+    """Factores de todos los plazos configurados, para que el primer PDF no los calcule"""
+    for anios, tea in tasas().items():
+        factores(tea, anios)
+
+
+def _saldo(monto, cuota, crecimiento, acumulado, mes):
+    """Saldo tras pagar la cuota del mes (1 en adelante); el último mes cierra en 0"""
+    if mes >= len(crecimiento):
+        return Decimal('0.00')
+    return redondear(monto * crecimiento[mes - 1] - cuota * acumulado[mes - 1])
+
+
+def _credito(monto, anios, tea):
+    tem, cuota_unitaria, crecimiento, acumulado = factores(tea, anios)
+    meses = len(crecimiento)
+    cuota = redondear(monto * cuota_unitaria)
+    # Lo que se debe al último mes: el monto capitalizado menos las cuotas anteriores capitalizadas
+    ultima_cuota = redondear(monto * crecimiento[-1] - cuota * (acumulado[-1] - 1))
+    total = cuota * (meses - 1) + ultima_cuota
+    return {
+        'anios': anios,
+        'meses': meses,
+        'tea': tea,
+        'tem': (tem * 100).quantize(Decimal('0.0001')),
+        'monto': monto,
+        'cuota': cuota,
+        'ultima_cuota': ultima_cuota,
+        'total_intereses': total - monto,
+        'total_pagado': total,
+    }
+
+
+def creditos(monto):
+    """Cuota mensual e intereses totales del monto en cada plazo configurado"""
+    monto = redondear(monto)
+    if monto <= 0:
+        return []
+    return [_credito(monto, anios, tea) for anios, tea in tasas().items()]
+
+
+def saldos_anuales(monto):
+    """
+    Créditos del monto en cada plazo y el saldo al cierre de cada año: una
+    fila por año con un saldo por plazo (None cuando ese plazo ya terminó).
+    """
+    lista = creditos(monto)
+    anios = max((c['anios'] for c in lista), default=0)
+    factores_por_plazo = [factores(c['tea'], c['anios'])[2:] for c in lista]
+    filas = [
+        {
+            'anio': anio,
+            'saldos': [
+                _saldo(c['monto'], c['cuota'], *factores_plazo, anio * 12) if anio <= c['anios'] else None
+                for c, factores_plazo in zip(lista, factores_por_plazo)
+            ],
+        }
+        for anio in range(1, anios + 1)
+    ]
+    return {'creditos': lista, 'filas': filas}
+
+
+def cronograma(monto, anios):
+    """
+    Crédito del monto a un plazo configurado, con sus pagos mes a mes:
+    cuota, interés, amortización y saldo. La amortización es la diferencia
+    entre saldos redondeados, así las amortizaciones suman exactamente el monto
+    y las cuotas (la última ajustada) suman el total pagado.
+    """
+    tea = tasas().get(anios)
+    if tea is None:
+        raise ValueError(f'No hay tasa configurada para {anios} años.')
+    monto = redondear(monto)
+    credito = _credito(monto, anios, tea)
+    crecimiento, acumulado = factores(tea, anios)[2:]
+    pagos = []
+    anterior = monto
+    for numero in range(1, credito['meses'] + 1):
+        saldo = _saldo(monto, credito['cuota'], crecimiento, acumulado, numero)
+        cuota = credito['ultima_cuota'] if numero == credito['meses'] else credito['cuota']
+        amortizacion = anterior - saldo
+        pagos.append({
+            'numero': numero,
+            'cuota': cuota,
+            'interes': cuota - amortizacion,
+            'amortizacion': amortizacion,
+            'saldo': saldo,
+        })
+        anterior = saldo
+    credito['pagos'] = pagos
+    return credito
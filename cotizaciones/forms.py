@@ -1,7 +1,10 @@
 # cotizaciones/forms.py
 
+from decimal import Decimal, InvalidOperation
+
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
+from . import precios
 from .models import Cotizacion, Departamento
 
 class LoginForm(AuthenticationForm):
@@ -129,17 +132,7 @@ class CotizacionForm(forms.ModelForm):
         if not departamento or valor is None:
             return cleaned_data
 
-        precio_original = departamento.precio
-        precio_base = precio_original + departamento.exceso_precio
-
-        if tipo == "MONTO":
-            precio_final = precio_base - valor
-
-        elif tipo == "PORC":
-            precio_final = precio_base - (precio_base * (valor / 100))
-
-
-        if precio_final < precio_original:
+        if not precios.calcular(departamento, tipo, valor)['descuento_valido']:
             self.add_error('valor_descuento',
                 f"Descuento invalido."
             )
@@ -164,7 +157,7 @@ class DepartamentoForm(forms.ModelForm):
             'area_m2': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'habitaciones': forms.NumberInput(attrs={'class': 'form-control'}),
             'banos': forms.NumberInput(attrs={'class': 'form-control'}),
-            'pisos': forms.TextInput(attrs={'class': 'form-control'}),
+            'pisos': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
             'estado': forms.Select(attrs={'class': 'form-select'}),
             'imagen': forms.ClearableFileInput(attrs={'class': 'form-control'}),
         }
@@ -178,7 +171,215 @@ class DepartamentoForm(forms.ModelForm):
             'area_libre': 'Área Libre (m²)',
             'habitaciones': 'N° de Habitaciones',
             'banos': 'N° de Baños',
-            'pisos': 'Pisos',
+            'pisos': 'Piso',
             'estado': 'Estado del Departamento',
             'imagen': 'Imagen del Departamento',
-        }
\ No newline at end of file
+        }
+
+class CotizacionImportacionForm(CotizacionForm):
+    """
+    Valida una fila importada con las mismas reglas que CotizacionForm. El
+    departamento llega por código y se busca en los ya cargados, sin una
+    consulta por fila.
+    """
+    departamento = forms.CharField(label='Código de departamento')
+
+    class Meta(CotizacionForm.Meta):
+        fields = CotizacionForm.Meta.fields + ['cuota_inicial']
+
+    def __init__(self, *args, departamentos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.departamentos = departamentos or {}
+
+    def clean_departamento(self):
+        codigo = self.cleaned_data['departamento'].strip().upper()
+        departamento = self.departamentos.get(codigo)
+        if departamento is None:
+            raise forms.ValidationError(f'No existe un departamento disponible con código {codigo}.')
+        return departamento
+
+    def _get_validation_exclusions(self):
+        # El departamento ya salió de los cargados: sin validar la FK con una consulta por fila
+        exclusiones = super()._get_validation_exclusions()
+        exclusiones.add('departamento')
+        return exclusiones
+
+
+class ImportarCotizacionesForm(forms.Form):
+    """Archivo con las cotizaciones a importar"""
+    archivo = forms.FileField(
+        label='Archivo CSV o Excel (.xlsx)',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if not archivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError('El archivo debe ser .csv o .xlsx.')
+        return archivo
+
+
+class BusquedaCotizacionesForm(forms.Form):
+    """Criterios de búsqueda de la lista de cotizaciones"""
+    q = forms.CharField(
+        required=False,
+        label='Buscar',
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Nombre, DNI o teléfono...'
+        })
+    )
+    medio_contacto = forms.ChoiceField(
+        required=False,
+        choices=[('', 'Todos los medios')] + Cotizacion.MEDIO_CONTACTO_CHOICES,
+        label='Medio de captación',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    departamento = forms.ModelChoiceField(
+        required=False,
+        queryset=Departamento.objects.all(),
+        label='Departamento',
+        empty_label='Todos los departamentos',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    fecha_desde = forms.DateField(
+        required=False,
+        label='Desde',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    fecha_hasta = forms.DateField(
+        required=False,
+        label='Hasta',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde = cleaned_data.get('fecha_desde')
+        hasta = cleaned_data.get('fecha_hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError('La fecha "Desde" no puede ser posterior a "Hasta".')
+        return cleaned_data
+
+    def tiene_criterios(self):
+        return any(self.cleaned_data.get(campo) for campo in self.fields)
+
+
+class CambioPrecioForm(forms.Form):
+    """Reajuste de precio para varios departamentos a la vez (acción del admin)"""
+    CAMPO_CHOICES = [
+        ('precio', 'Precio base'),
+        ('exceso_precio', 'Exceso de precio'),
+    ]
+    TIPO_CHOICES = [
+        ('PORC', 'Porcentaje (%)'),
+        ('MONTO', 'Monto S/.'),
+    ]
+
+    campo = forms.ChoiceField(choices=CAMPO_CHOICES, label='Campo')
+    tipo = forms.ChoiceField(choices=TIPO_CHOICES, label='Tipo de cambio')
+    valor = forms.DecimalField(
+        max_digits=10, decimal_places=2, label='Valor',
+        help_text='Positivo para subir, negativo para bajar',
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('tipo') == 'PORC' and cleaned_data.get('valor') is not None and cleaned_data['valor'] <= -100:
+            raise forms.ValidationError('Una baja porcentual debe ser menor al 100%.')
+        return cleaned_data
+
+
+class ReajustePreciosForm(CambioPrecioForm):
+    """Departamentos a reajustar y el reajuste; `version` detecta cambios entre la vista previa y la aplicación"""
+    piso_desde = forms.IntegerField(required=False, min_value=1, label='Desde el piso')
+    piso_hasta = forms.IntegerField(required=False, min_value=1, label='Hasta el piso')
+    habitaciones = forms.TypedMultipleChoiceField(
+        required=False, coerce=int, label='Habitaciones', widget=forms.CheckboxSelectMultiple,
+    )
+    estado = forms.ChoiceField(
+        required=False, choices=[('', 'Todos')] + Departamento.ESTADO_CHOICES, label='Estado',
+    )
+    codigo = forms.CharField(
+        required=False, max_length=20, label='Código',
+        help_text='Use * para cualquier texto y ? para un carácter, por ejemplo 18*',
+    )
+    version = forms.IntegerField(required=False, widget=forms.HiddenInput)
+
+    field_order = ['piso_desde', 'piso_hasta', 'habitaciones', 'estado', 'codigo', 'campo', 'tipo', 'valor']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['habitaciones'].choices = [
+            (n, n) for n in Departamento.objects.order_by('habitaciones').values_list('habitaciones', flat=True).distinct()
+        ]
+        for nombre, campo in self.fields.items():
+            if isinstance(campo.widget, forms.Select):
+                campo.widget.attrs['class'] = 'form-select'
+            elif not isinstance(campo.widget, (forms.CheckboxSelectMultiple, forms.HiddenInput)):
+                campo.widget.attrs['class'] = 'form-control'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde, hasta = cleaned_data.get('piso_desde'), cleaned_data.get('piso_hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError('El piso inicial no puede ser mayor que el final.')
+        return cleaned_data
+
+    def criterios(self):
+        return {
+            campo: self.cleaned_data.get(campo)
+            for campo in ('piso_desde', 'piso_hasta', 'habitaciones', 'estado', 'codigo')
+        }
+
+
+class SimuladorPreciosForm(forms.Form):
+    """Departamentos, descuentos y cuotas iniciales a combinar en la matriz de precios"""
+    MAX_OPCIONES = 10
+
+    departamentos = forms.ModelMultipleChoiceField(
+        queryset=Departamento.objects.exclude(estado='vendido').order_by('pisos', 'codigo'),
+        required=False, label='Departamentos',
+        help_text='Sin selección se simulan todos los que no están vendidos',
+        widget=forms.SelectMultiple(attrs={'class': 'form-select', 'size': 8}),
+    )
+    descuentos = forms.CharField(
+        initial='0%, 3%, 5%', label='Descuentos',
+        help_text='Porcentajes con % o montos en soles, separados por comas',
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+    )
+    cuotas_iniciales = forms.CharField(
+        initial='20000, 40000, 60000', label='Cuotas iniciales (S/)',
+        help_text='Montos separados por comas',
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+    )
+
+    def _montos(self, texto):
+        partes = [p.strip() for p in texto.split(',') if p.strip()]
+        if not partes:
+            raise forms.ValidationError('Ingrese al menos un valor.')
+        if len(partes) > self.MAX_OPCIONES:
+            raise forms.ValidationError(f'Ingrese como máximo {self.MAX_OPCIONES} valores.')
+        for parte in partes:
+            try:
+                monto = Decimal(parte.rstrip('%').strip())
+            except InvalidOperation:
+                raise forms.ValidationError(f'"{parte}" no es un número.')
+            if not monto.is_finite() or monto < 0:
+                raise forms.ValidationError(f'"{parte}" no es un monto válido.')
+            yield parte, monto
+
+    def clean_descuentos(self):
+        """'5%' es un porcentaje y '2000' un monto: [('PORC', 5), ('MONTO', 2000)]"""
+        descuentos = []
+        for parte, monto in self._montos(self.cleaned_data['descuentos']):
+            if parte.endswith('%'):
+                if monto > 100:
+                    raise forms.ValidationError(f'"{parte}" supera el 100%.')
+                descuentos.append(('PORC', monto))
+            else:
+                descuentos.append(('MONTO', monto))
+        return descuentos
+
+    def clean_cuotas_iniciales(self):
+        return [monto for parte, monto in self._montos(self.cleaned_data['cuotas_iniciales'])]
@@ -0,0 +1,265 @@
+# cotizaciones/imagenes.py
+
+import copy
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import requests
+from django.conf import settings
+from PIL import Image as PILImage
+from reportlab.lib.rl_accel import asciiBase85Decode
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfdoc import PDFImageXObject
+from reportlab.pdfgen import canvas
+
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+
+class ImagenCodificada:
+    """
+    Imagen ya decodificada y codificada como objeto PDF. Solo guarda el
+    stream comprimido, es de solo lectura y se comparte entre documentos
+    e hilos: dibujarla equivale a canvas.drawImage con la imagen original.
+    Con compacta los streams se guardan en binario, sin ASCII85.
+    """
+    def __init__(self, origen, mask='auto', compacta=False):
+        lienzo = canvas.Canvas(BytesIO())
+        lienzo.drawImage(ImageReader(origen), 0, 0, mask=mask)
+        objetos = lienzo._doc.idToObject
+        self.xobjeto = next(o for o in objetos.values() if isinstance(o, PDFImageXObject))
+        self.nombre = self.xobjeto.name
+        self.ancho, self.alto = self.xobjeto.width, self.xobjeto.height
+
+        # Máscara de transparencia (PNG con canal alfa)
+        self.mascara = None
+        self.registro_mascara = None
+        referencia = getattr(self.xobjeto, 'smask', None)
+        if referencia is not None:
+            self.registro_mascara = referencia.name
+            self.mascara = objetos[referencia.name]
+
+        if compacta:
+            _sin_ascii85(self.xobjeto)
+            if self.mascara is not None:
+                _sin_ascii85(self.mascara)
+
+        self.tamano_bytes = len(self.xobjeto.streamContent)
+        if self.mascara is not None:
+            self.tamano_bytes += len(self.mascara.streamContent)
+
+    @staticmethod
+    def _copia(objeto):
+        # Cada documento registra su propia copia; el stream no se duplica
+        copia = copy.copy(objeto)
+        vars(copia).pop('__InternalName__', None)
+        return copia
+
+    def dibujar(self, canv, x, y, width, height):
+        """Mismo registro y operadores que hace drawImage"""
+        canv._currentPageHasImages = 1
+        doc = canv._doc
+        registro = doc.getXObjectName(self.nombre)
+        if registro not in doc.idToObject:
+            xobjeto = self._copia(self.xobjeto)
+            canv._setXObjects(xobjeto)
+            doc.Reference(xobjeto, registro)
+            doc.addForm(self.nombre, xobjeto)
+            if self.mascara is not None and self.registro_mascara not in doc.idToObject:
+                mascara = self._copia(self.mascara)
+                canv._setXObjects(mascara)
+                doc.Reference(mascara, self.registro_mascara)
+
+        canv.saveState()
+        canv.translate(x, y)
+        canv.scale(width, height)
+        canv._code.append("/%s Do" % registro)
+        canv.restoreState()
+        canv._formsinuse.append(self.nombre)
+
+
+def _sin_ascii85(xobjeto):
+    """ASCII85 solo agrega un 25% al stream; el PDF admite datos binarios"""
+    if xobjeto._filters and xobjeto._filters[0] == 'ASCII85Decode':
+        xobjeto.streamContent = asciiBase85Decode(xobjeto.streamContent)
+        xobjeto._filters = tuple(xobjeto._filters[1:])
+
+
+class _CacheMemoria:
+    """LRU en memoria de imágenes codificadas, limitado por tamaño total"""
+    def __init__(self):
+        self._items = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            imagen = self._items.get(clave)
+            if imagen is not None:
+                self._items.move_to_end(clave)
+            return imagen
+
+    def set(self, clave, imagen):
+        limite = settings.IMAGENES_CACHE_MEMORIA_BYTES
+        if imagen.tamano_bytes > limite:
+            return
+        with self._lock:
+            anterior = self._items.pop(clave, None)
+            if anterior is not None:
+                self._total -= anterior.tamano_bytes
+            self._items[clave] = imagen
+            self._total += imagen.tamano_bytes
+            while self._total > limite:
+                _, expulsada = self._items.popitem(last=False)
+                self._total -= expulsada.tamano_bytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._total = 0
+
+
+_memoria = _CacheMemoria()
+
+
+def _clave(imagen):
+    """Clave por nombre en el storage y URL (que incluye la versión en Cloudinary)"""
+    try:
+        url = imagen.url
+    except ValueError:
+        url = ''
+    return hashlib.sha256(f'{imagen.name}|{url}'.encode('utf-8')).hexdigest(), url
+
+
+def _descargar(imagen, url):
+    if url.startswith(('http://', 'https://')):
+        response = requests.get(url, timeout=settings.IMAGENES_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    # Storage local (desarrollo): se lee directamente
+    with imagen.storage.open(imagen.name, 'rb') as f:
+        return f.read()
+
+
+def _recortar_disco(directorio):
+    """Elimina los archivos usados hace más tiempo hasta respetar el límite"""
+    archivos = []
+    total = 0
+    for entrada in os.scandir(directorio):
+        if entrada.is_file() and not entrada.name.endswith('.tmp'):
+            info = entrada.stat()
+            archivos.append((info.st_mtime, info.st_size, entrada.path))
+            total += info.st_size
+
+    archivos.sort()
+    for _, tamano, ruta in archivos:
+        if total <= settings.IMAGENES_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(ruta)
+            total -= tamano
+        except OSError:
+            pass
+
+
+def _leer_original(imagen, clave, url):
+    """Bytes originales desde el disco local o, la primera vez, desde el storage"""
+    directorio = settings.IMAGENES_CACHE_DIR
+    ruta = os.path.join(directorio, clave)
+    with metricas.etapa('imagen_disco') as medida:
+        try:
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            os.utime(ruta)  # marca de uso para el LRU
+            medida.acierto = True
+            medida.bytes = len(contenido)
+        except FileNotFoundError:
+            medida.acierto = False
+            contenido = None
+    if contenido is not None:
+        return contenido
+
+    with metricas.etapa('imagen_descarga') as medida:
+        contenido = _descargar(imagen, url)
+        medida.bytes = len(contenido)
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directorio, suffix='.tmp', delete=False) as tmp:
+            tmp.write(contenido)
+        os.replace(tmp.name, ruta)
+        _recortar_disco(directorio)
+    except OSError as e:
+        logger.warning("No se pudo guardar la imagen %s en caché: %s", imagen.name, e)
+    return contenido
+
+
+def _preparar(contenido):
+    """Decodifica la imagen y la vuelve a guardar como PNG, igual que antes del caché"""
+    with metricas.etapa('imagen_decodificacion') as medida:
+        pil_img = PILImage.open(BytesIO(contenido))
+        png = BytesIO()
+        pil_img.save(png, format='PNG')
+        png.seek(0)
+        codificada = ImagenCodificada(png)
+        medida.bytes = codificada.tamano_bytes
+    return codificada
+
+
+def _preparar_compacta(contenido, tamano):
+    """
+    Imagen para el modo compacto: se reduce a la resolución con la que se
+    imprime (tamano en puntos a PDF_COMPACTO_DPI) y un JPEG que ya entra en
+    esa resolución se incrusta tal cual, sin volver a codificarlo.
+    """
+    with metricas.etapa('imagen_decodificacion') as medida:
+        pil_img = PILImage.open(BytesIO(contenido))
+        dpi = settings.PDF_COMPACTO_DPI
+        maximo = (round(tamano[0] * dpi / 72), round(tamano[1] * dpi / 72))
+        objetivo = (min(pil_img.width, maximo[0]), min(pil_img.height, maximo[1]))
+
+        if objetivo != pil_img.size:
+            formato = 'JPEG' if pil_img.format == 'JPEG' else 'PNG'
+            reducida = pil_img.resize(objetivo, PILImage.LANCZOS)
+            salida = BytesIO()
+            if formato == 'JPEG':
+                reducida.save(salida, format='JPEG', quality=settings.PDF_COMPACTO_CALIDAD_JPEG, optimize=True)
+            else:
+                reducida.save(salida, format='PNG', optimize=True)
+            contenido = salida.getvalue()
+
+        codificada = ImagenCodificada(BytesIO(contenido), compacta=True)
+        medida.bytes = codificada.tamano_bytes
+    return codificada
+
+
+def obtener_imagen_departamento(depto, compacta=False, tamano=None):
+    """
+    Imagen del departamento lista para el PDF, o None si no tiene.
+    Solo la primera consulta va a la red; luego se lee del disco local
+    y las más usadas quedan codificadas en memoria. Con compacta se
+    prepara para imprimirse en tamano (ancho, alto en puntos).
+    """
+    imagen = getattr(depto, 'imagen', None)
+    if not imagen:
+        return None
+
+    with metricas.etapa('imagen') as medida:
+        clave, url = _clave(imagen)
+        clave_memoria = f'{clave}:compacta:{tamano[0]}x{tamano[1]}' if compacta else clave
+        codificada = _memoria.get(clave_memoria)
+        medida.acierto = codificada is not None
+        if codificada is None:
+            contenido = _leer_original(imagen, clave, url)
+            if compacta:
+                codificada = _preparar_compacta(contenido, tamano)
+            else:
+                codificada = _preparar(contenido)
+            _memoria.set(clave_memoria, codificada)
+        medida.bytes = codificada.tamano_bytes
+    return codificada
@@ -0,0 +1,173 @@
+# cotizaciones/importacion.py
+
+import codecs
+import csv
+import io
+import unicodedata
+
+from django.db import transaction
+
+from .forms import CotizacionImportacionForm
+from .models import Cotizacion, Departamento
+from .resumen import registrar_nuevas
+
+# Filas insertadas por transacción
+LOTE = 1000
+
+# Valores que se asumen cuando la columna no viene o está vacía
+VALORES_POR_DEFECTO = {
+    'medio_contacto': 'Otros',
+    'tipo_descuento': 'PORC',
+    'valor_descuento': '0',
+}
+
+# Otros nombres con los que suelen venir las columnas en las hojas de campañas
+ALIAS_COLUMNAS = {
+    'nombre': 'nombre_cliente',
+    'cliente': 'nombre_cliente',
+    'dni': 'dni_cliente',
+    'direccion': 'direccion_cliente',
+    'distrito': 'distrito_cliente',
+    'telefono': 'telefono_cliente',
+    'celular': 'telefono_cliente',
+    'email': 'email_cliente',
+    'correo': 'email_cliente',
+    'medio': 'medio_contacto',
+    'medio_de_captacion': 'medio_contacto',
+    'codigo': 'departamento',
+    'codigo_departamento': 'departamento',
+    'descuento': 'valor_descuento',
+}
+
+
+class ErrorArchivo(Exception):
+    """El archivo no se puede leer como CSV o XLSX"""
+
+
+def _normalizar_columna(nombre):
+    nombre = unicodedata.normalize('NFKD', str(nombre or '')).encode('ascii', 'ignore').decode()
+    nombre = nombre.strip().lower().replace(' ', '_').replace('-', '_')
+    return ALIAS_COLUMNAS.get(nombre, nombre)
+
+
+def _validar_utf8(archivo):
+    """
+    Decodifica todo el archivo antes de importar: un error a mitad del CSV
+    aparecería después de haber guardado los primeros lotes.
+    """
+    decodificador = codecs.getincrementaldecoder('utf-8-sig')()
+    linea = 1
+    while True:
+        bloque = archivo.read(64 * 1024)
+        try:
+            decodificador.decode(bloque, final=not bloque)
+        except UnicodeDecodeError as e:
+            linea += bloque.count(b'\n', 0, max(e.start, 0))
+            raise ErrorArchivo(f'El CSV debe estar guardado en UTF-8 (carácter inválido en la línea {linea}).')
+        if not bloque:
+            break
+        linea += bloque.count(b'\n')
+    archivo.seek(0)
+
+
+def _filas_csv(archivo):
+    _validar_utf8(archivo)
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    yield from lector
+
+
+def _filas_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErrorArchivo('Para importar archivos .xlsx instale openpyxl.')
+    try:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+    except Exception as e:
+        raise ErrorArchivo(f'No se pudo abrir el archivo Excel: {e}')
+    try:
+        for fila in libro.active.iter_rows(values_only=True):
+            yield ['' if valor is None else valor for valor in fila]
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre):
+    """Devuelve (número de fila, datos) por cada fila con contenido del archivo"""
+    filas = _filas_xlsx(archivo) if nombre.lower().endswith('.xlsx') else _filas_csv(archivo)
+    try:
+        encabezado = [_normalizar_columna(c) for c in next(filas)]
+    except StopIteration:
+        return
+
+    for numero, valores in enumerate(filas, start=2):
+        if not any(str(v).strip() for v in valores):
+            continue
+        datos = {}
+        for columna, valor in zip(encabezado, valores):
+            if isinstance(valor, float) and valor.is_integer():
+                valor = int(valor)  # Excel guarda DNI y teléfonos como números
+            datos[columna] = str(valor).strip()
+        for columna, valor in VALORES_POR_DEFECTO.items():
+            if not datos.get(columna):
+                datos[columna] = valor
+        yield numero, datos
+
+
+class ResultadoImportacion:
+    """Cotizaciones creadas y errores por fila"""
+    def __init__(self):
+        self.filas = 0
+        self.creadas = 0
+        self.errores = []
+
+    def agregar_error(self, fila, errores):
+        self.errores.append({'fila': fila, 'errores': errores})
+
+
+def _insertar(cotizaciones, resultado):
+    # Números reservados en bloque y resumen de ventas en la misma transacción que el INSERT
+    with transaction.atomic():
+        Cotizacion.asignar_numeros(cotizaciones)
+        Cotizacion.objects.bulk_create(cotizaciones, batch_size=LOTE)
+        registrar_nuevas(cotizaciones)
+    resultado.creadas += len(cotizaciones)
+
+
+def importar_cotizaciones(archivo, nombre, usuario, lote=LOTE):
+    """
+    Valida cada fila con las reglas de CotizacionForm e inserta las válidas
+    con bulk_create por lotes. Las filas con errores no se importan y se
+    informan en el resultado.
+    """
+    departamentos = {d.codigo.upper(): d for d in Departamento.objects.filter(disponible=True)}
+    resultado = ResultadoImportacion()
+    pendientes = []
+
+    for fila, datos in leer_filas(archivo, nombre):
+        resultado.filas += 1
+        form = CotizacionImportacionForm(datos, departamentos=departamentos)
+        if not form.is_valid():
+            resultado.agregar_error(fila, {campo: list(mensajes) for campo, mensajes in form.errors.items()})
+            continue
+
+        cotizacion = form.save(commit=False)
+        cotizacion.usuario = usuario
+        cotizacion.creado_por = usuario
+        cotizacion.calcular_precios()
+        pendientes.append(cotizacion)
+
+        if len(pendientes) >= lote:
+            _insertar(pendientes, resultado)
+            pendientes = []
+
+    if pendientes:
+        _insertar(pendientes, resultado)
+    return resultado
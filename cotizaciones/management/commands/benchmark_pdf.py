@@ -0,0 +1,82 @@
+import hashlib
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from reportlab import rl_config
+
+from cotizaciones.models import Cotizacion
+from cotizaciones.utils import ProformaRenderer, generar_pdf_cotizacion, obtener_renderer
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo de generación del PDF con y sin plantilla precompilada y verifica que el resultado sea idéntico'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cotizacion', type=int, help='ID de la cotización a usar (por defecto la más reciente)')
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        qs = Cotizacion.objects.select_related('departamento')
+        if options['cotizacion']:
+            cotizacion = qs.filter(pk=options['cotizacion']).first()
+        else:
+            cotizacion = qs.filter(activo=True).first()
+        if cotizacion is None:
+            raise CommandError('No hay cotizaciones para medir.')
+
+        repeticiones = options['repeticiones']
+        invariant = rl_config.invariant
+        # Sin fecha ni ID aleatorio en el PDF para poder comparar los bytes
+        rl_config.invariant = 1
+        try:
+            resultados = {}
+            for modo, usar_plantilla in (('clasico', False), ('plantilla', True)):
+                pdf = generar_pdf_cotizacion(cotizacion, usar_plantilla=usar_plantilla)
+                tiempos = []
+                for _ in range(repeticiones):
+                    inicio = time.perf_counter()
+                    generar_pdf_cotizacion(cotizacion, usar_plantilla=usar_plantilla)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                resultados[modo] = (hashlib.sha256(pdf).hexdigest(), tiempos)
+
+            # Costo fijo que el renderer compartido ahorra en cada llamada
+            preparacion = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                ProformaRenderer()
+                preparacion.append((time.perf_counter() - inicio) * 1000)
+
+            # El renderer compartido usado desde varios hilos da el mismo PDF
+            renderer = obtener_renderer()
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                concurrentes = set(
+                    hashlib.sha256(pdf).hexdigest()
+                    for pdf in pool.map(lambda _: renderer.render(cotizacion), range(8))
+                )
+        finally:
+            rl_config.invariant = invariant
+
+        self.stdout.write(f'Cotización {cotizacion.numero_cotizacion}, {repeticiones} repeticiones')
+        for modo, (huella, tiempos) in resultados.items():
+            self.stdout.write(
+                f'  {modo:<10} media {statistics.mean(tiempos):7.2f} ms  '
+                f'mediana {statistics.median(tiempos):7.2f} ms  sha256 {huella[:16]}'
+            )
+
+        media_clasico = statistics.mean(resultados['clasico'][1])
+        media_plantilla = statistics.mean(resultados['plantilla'][1])
+        self.stdout.write(f'  aceleración x{media_clasico / media_plantilla:.2f}')
+        self.stdout.write(
+            f'  preparación del renderer (evitada por llamada) media {statistics.mean(preparacion):7.2f} ms  '
+            f'mediana {statistics.median(preparacion):7.2f} ms'
+        )
+
+        if concurrentes != {resultados['plantilla'][0]}:
+            raise CommandError('El renderer compartido generó PDFs distintos al usarse desde varios hilos')
+
+        if resultados['clasico'][0] == resultados['plantilla'][0]:
+            self.stdout.write(self.style.SUCCESS('  Los PDFs son idénticos byte a byte'))
+        else:
+            raise CommandError('Los PDFs generados con y sin plantilla son distintos')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones.benchmark import agregar_argumentos, ejecutar, guardar
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia, PDFs por segundo, tamaño y memoria de la generación de PDFs con datos sintéticos (salida JSON)'
+
+    def add_arguments(self, parser):
+        agregar_argumentos(parser)
+
+    def handle(self, *args, **options):
+        if options['cotizaciones'] < 1 or options['repeticiones'] < 1:
+            raise CommandError('--cotizaciones y --repeticiones deben ser mayores que cero.')
+        resultado = ejecutar(options['cotizaciones'], options['repeticiones'], options['calentamiento'])
+        self.stdout.write(guardar(resultado, options['salida']))
@@ -0,0 +1,30 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from cotizaciones.exportacion import (
+    COLUMNAS_COTIZACIONES, FORMATOS_TABLA, filas_cotizaciones, guardar_tabla, memoria_maxima_mb,
+)
+
+
+class Command(BaseCommand):
+    help = 'Exporta a CSV o XLSX las cotizaciones activas de un rango de fechas o de un departamento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=sorted(FORMATOS_TABLA), default='csv')
+        parser.add_argument('--desde', type=date.fromisoformat, help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Fecha final (AAAA-MM-DD)')
+        parser.add_argument('--departamento', help='Código del departamento')
+        parser.add_argument('--salida', help='Archivo a generar')
+
+    def handle(self, *args, **options):
+        salida = options['salida'] or f"cotizaciones_{time.strftime('%Y%m%d_%H%M%S')}.{options['formato']}"
+        inicio = time.monotonic()
+        filas = filas_cotizaciones(options['desde'], options['hasta'], options['departamento'])
+        cantidad = guardar_tabla(salida, options['formato'], COLUMNAS_COTIZACIONES, filas)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{cantidad} cotizaciones exportadas a {salida} en {time.monotonic() - inicio:.1f} s'
+        ))
+        self.stdout.write(f'  Memoria máxima: {memoria_maxima_mb()[0]:.0f} MB')
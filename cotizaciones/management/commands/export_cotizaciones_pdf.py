@@ -0,0 +1,38 @@
+import os
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones.exportacion import (
+    seleccionar_cotizaciones, iterar_pdfs, zip_en_streaming, memoria_maxima_mb, Medicion,
+)
+
+
+class Command(BaseCommand):
+    help = 'Exporta en un ZIP los PDFs de las cotizaciones activas de un rango de fechas o de un departamento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Fecha final (AAAA-MM-DD)')
+        parser.add_argument('--departamento', help='Código del departamento')
+        parser.add_argument('--salida', help='Archivo ZIP a generar')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        ids = seleccionar_cotizaciones(options['desde'], options['hasta'], options['departamento'])
+        if not ids:
+            raise CommandError('No hay cotizaciones activas con esos filtros.')
+
+        salida = options['salida'] or f"cotizaciones_{time.strftime('%Y%m%d_%H%M%S')}.zip"
+        self.stdout.write(f'Exportando {len(ids)} cotizaciones con {options["procesos"]} proceso(s)...')
+
+        medicion = Medicion()
+        with open(salida, 'wb') as f:
+            for parte in zip_en_streaming(medicion.contar(iterar_pdfs(ids, options['procesos']))):
+                f.write(parte)
+
+        propio, hijos = memoria_maxima_mb()
+        self.stdout.write(self.style.SUCCESS(f'ZIP generado: {salida} ({os.path.getsize(salida) / 1024 / 1024:.1f} MB)'))
+        self.stdout.write(f'  {medicion.cantidad} PDFs, {medicion.pdfs_por_segundo:.1f} PDFs/s')
+        self.stdout.write(f'  Memoria máxima: {propio:.0f} MB (proceso principal), {hijos:.0f} MB (workers)')
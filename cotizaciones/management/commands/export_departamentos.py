@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cotizaciones.exportacion import COLUMNAS_DEPARTAMENTOS, FORMATOS_TABLA, filas_departamentos, guardar_tabla
+
+
+class Command(BaseCommand):
+    help = 'Exporta los departamentos a CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=sorted(FORMATOS_TABLA), default='csv')
+        parser.add_argument('--salida', help='Archivo a generar')
+
+    def handle(self, *args, **options):
+        salida = options['salida'] or f"departamentos_{time.strftime('%Y%m%d_%H%M%S')}.{options['formato']}"
+        cantidad = guardar_tabla(salida, options['formato'], COLUMNAS_DEPARTAMENTOS, filas_departamentos())
+        self.stdout.write(self.style.SUCCESS(f'{cantidad} departamentos exportados a {salida}'))
@@ -0,0 +1,39 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones.importacion import importar_cotizaciones, ErrorArchivo, LOTE
+
+
+class Command(BaseCommand):
+    help = 'Importa cotizaciones desde un archivo CSV o XLSX, validando cada fila como el formulario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--usuario', required=True, help='Usuario que figura como creador de las cotizaciones')
+        parser.add_argument('--lote', type=int, default=LOTE, help='Filas insertadas por transacción')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f'No existe el usuario {options["usuario"]}.')
+
+        inicio = time.monotonic()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar_cotizaciones(archivo, options['archivo'], usuario, options['lote'])
+        except (OSError, ErrorArchivo) as e:
+            raise CommandError(str(e))
+        duracion = time.monotonic() - inicio
+
+        for error in resultado.errores:
+            detalle = '; '.join(f'{campo}: {" ".join(mensajes)}' for campo, mensajes in error['errores'].items())
+            self.stderr.write(f'Fila {error["fila"]}: {detalle}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.creadas} cotizaciones importadas de {resultado.filas} filas en {duracion:.1f} s'
+        ))
+        if resultado.errores:
+            self.stdout.write(self.style.WARNING(f'{len(resultado.errores)} filas con errores no se importaron'))
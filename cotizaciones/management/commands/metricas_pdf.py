@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from cotizaciones import metricas
+
+
+class Command(BaseCommand):
+    help = 'Muestra los tiempos, bytes y aciertos de caché acumulados por etapa de la generación de PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reiniciar', action='store_true', help='Borra los contadores después de mostrarlos')
+
+    def handle(self, *args, **options):
+        etapas = metricas.resumen()
+        if not etapas:
+            self.stdout.write('Todavía no hay métricas registradas.')
+            return
+
+        self.stdout.write(
+            f'{"etapa":<24}{"cantidad":>10}{"media ms":>11}{"max ms":>10}{"media bytes":>14}{"aciertos":>10}'
+        )
+        for nombre, valores in etapas.items():
+            tasa = '' if valores['tasa_aciertos'] is None else f'{valores["tasa_aciertos"]:.0%}'
+            self.stdout.write(
+                f'{nombre:<24}{valores["cantidad"]:>10}{valores["media_ms"]:>11.2f}'
+                f'{valores["max_ms"]:>10.1f}{valores["media_bytes"]:>14}{tasa:>10}'
+            )
+
+        if options['reiniciar']:
+            metricas.reiniciar()
+            self.stdout.write(self.style.SUCCESS('Métricas reiniciadas.'))
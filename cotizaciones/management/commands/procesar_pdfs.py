@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cotizaciones import metricas
+from cotizaciones.tareas import reclamar_trabajo, procesar_trabajo, liberar_trabajos_colgados
+
+
+class Command(BaseCommand):
+    help = 'Worker que genera los PDFs de cotizaciones pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesar los pendientes y terminar')
+        parser.add_argument('--intervalo', type=float, default=2, help='Segundos de espera cuando no hay trabajos')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker de PDFs iniciado')
+        try:
+            while True:
+                liberados = liberar_trabajos_colgados()
+                if liberados:
+                    self.stdout.write(f'{liberados} trabajo(s) colgado(s) devueltos a la cola')
+
+                trabajo = reclamar_trabajo()
+                if trabajo is None:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                inicio = time.monotonic()
+                estado = procesar_trabajo(trabajo)
+                self.stdout.write(
+                    f'Cotización {trabajo.cotizacion_id}: {estado} ({(time.monotonic() - inicio) * 1000:.0f} ms)'
+                )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            metricas.volcar()
+        self.stdout.write('Worker de PDFs detenido')
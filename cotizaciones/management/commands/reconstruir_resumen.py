@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cotizaciones.resumen import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde cero el resumen de ventas del tablero (por mes, agente, medio, '
+        'distrito y departamento). Necesario después de loaddata o de cambios con update() masivos'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        filas = reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumen reconstruido: {filas} filas en {time.monotonic() - inicio:.1f} s'
+        ))
@@ -0,0 +1,153 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from cotizaciones.models import Cotizacion, TrabajoPDF
+from cotizaciones.paginacion import codificar_cursor
+
+# SQLite: "SCAN tabla" sin índice; las tablas FTS aparecen como VIRTUAL TABLE
+SCAN_SQLITE = re.compile(r'^SCAN (\w+)(?!.*\b(?:INDEX|VIRTUAL TABLE)\b)')
+ORDEN_SQLITE = re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)')
+SCAN_POSTGRESQL = re.compile(r'Seq Scan on (\w+)')
+ORDEN_POSTGRESQL = re.compile(r'\bSort\s+\(cost')
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta las vistas de listas y del admin, hace EXPLAIN de cada consulta '
+        'y marca las que recorren tablas completas sin índice'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Superusuario con el que se abren las vistas (por defecto, el primero)')
+        parser.add_argument(
+            '--min-filas', type=int, default=1000,
+            help='Los recorridos completos de tablas con menos filas no se marcan como problema',
+        )
+        parser.add_argument('--sql', action='store_true', help='Muestra el SQL y el plan de cada consulta')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'No se sabe leer el EXPLAIN de {connection.vendor}.')
+        usuarios = User.objects.filter(is_superuser=True)
+        if options['usuario']:
+            usuarios = usuarios.filter(username=options['usuario'])
+        usuario = usuarios.order_by('pk').first()
+        if usuario is None:
+            raise CommandError('Se necesita un superusuario para abrir las vistas del admin.')
+
+        self.min_filas = options['min_filas']
+        self.ver_sql = options['sql']
+        self.filas_por_tabla = {}
+        problemas = 0
+        for nombre, consultas in self.formas_de_consulta(usuario):
+            self.stdout.write(self.style.MIGRATE_HEADING(nombre))
+            for sql, params in consultas:
+                problemas += self.revisar(sql, params)
+
+        if problemas:
+            raise CommandError(f'{problemas} consulta(s) recorren tablas completas sin índice.')
+        self.stdout.write(self.style.SUCCESS('Todas las consultas usan índices.'))
+
+    def formas_de_consulta(self, usuario):
+        """Consultas de cada pantalla, tal como las hacen las vistas"""
+        fabrica = RequestFactory()
+        lista = reverse('cotizaciones:lista_cotizaciones')
+        admin_cotizaciones = reverse('admin:cotizaciones_cotizacion_changelist')
+
+        quinta_pagina = (
+            Cotizacion.objects.filter(activo=True).order_by('-fecha_creacion', '-id')
+            .values_list('fecha_creacion', 'id')[249:250]
+        )
+        cursor = ''.join(codificar_cursor(fecha, pk) for fecha, pk in quinta_pagina)
+        nombre = Cotizacion.objects.values_list('nombre_cliente', flat=True).first() or 'cliente'
+
+        urls = [
+            ('Lista de cotizaciones', lista),
+            ('Lista de cotizaciones, página siguiente', f'{lista}?despues={cursor}'),
+            ('Búsqueda por nombre', f'{lista}?q={nombre.split()[0]}'),
+            ('Filtro por medio de captación', f'{lista}?medio_contacto=Facebook'),
+            ('Filtro por fechas', f'{lista}?fecha_desde=2024-01-01&fecha_hasta=2024-12-31'),
+            ('Cuadrícula de departamentos', reverse('cotizaciones:lista_departamentos')),
+            ('Nueva cotización', reverse('cotizaciones:nueva_cotizacion')),
+            ('Admin: cotizaciones', admin_cotizaciones),
+            ('Admin: cotizaciones activas', f'{admin_cotizaciones}?activo__exact=1'),
+            ('Admin: cotizaciones por agente', f'{admin_cotizaciones}?creado_por__id__exact={usuario.pk}'),
+            ('Admin: departamentos', reverse('admin:cotizaciones_departamento_changelist')),
+            ('Admin: trabajos PDF pendientes', f'{reverse("admin:cotizaciones_trabajopdf_changelist")}?estado__exact=pendiente'),
+        ]
+        for nombre_forma, url in urls:
+            request = fabrica.get(url)
+            request.user = usuario
+            request.session = {}
+            yield nombre_forma, self.capturar(resolve(request.path_info), request)
+
+        cola = TrabajoPDF.objects.filter(estado='pendiente').order_by('actualizado')[:1]
+        yield 'Cola del worker de PDFs', [cola.query.sql_with_params()]
+
+    def capturar(self, coincidencia, request):
+        """SQL de las consultas SELECT que hace la vista"""
+        consultas = []
+
+        def registrar(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                consultas.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(registrar):
+            respuesta = coincidencia.func(request, *coincidencia.args, **coincidencia.kwargs)
+            if hasattr(respuesta, 'render'):
+                respuesta.render()
+        return consultas
+
+    def plan(self, sql, params):
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                return [fila[-1] for fila in cursor.fetchall()]
+            # Sin recorridos secuenciales: si igual aparece uno, no hay índice que sirva
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def filas(self, tabla):
+        if tabla not in self.filas_por_tabla:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT count(*) FROM {connection.ops.quote_name(tabla)}')
+                self.filas_por_tabla[tabla] = cursor.fetchone()[0]
+        return self.filas_por_tabla[tabla]
+
+    def revisar(self, sql, params):
+        """Muestra la consulta y devuelve 1 si recorre una tabla grande sin índice"""
+        plan = self.plan(sql, params)
+        if connection.vendor == 'sqlite':
+            scan, orden = SCAN_SQLITE, ORDEN_SQLITE
+        else:
+            scan, orden = SCAN_POSTGRESQL, ORDEN_POSTGRESQL
+        recorridas = [m.group(1) for m in map(scan.search, plan) if m]
+        grandes = [t for t in recorridas if self.filas(t) >= self.min_filas]
+        ordena = any(orden.search(linea) for linea in plan)
+
+        resumen = ' '.join(sql.split())[:110]
+        if grandes:
+            detalle = ', '.join(f'{t} ({self.filas(t)} filas)' for t in grandes)
+            self.stdout.write(self.style.ERROR(f'  SIN ÍNDICE  {resumen}'))
+            self.stdout.write(f'              recorre {detalle}')
+        elif recorridas or ordena:
+            notas = [f'recorre {t} ({self.filas(t)} filas)' for t in recorridas]
+            if ordena:
+                notas.append('ordena sin índice')
+            self.stdout.write(self.style.WARNING(f'  aviso       {resumen}'))
+            self.stdout.write(f'              {", ".join(notas)}')
+        else:
+            self.stdout.write(f'  ok          {resumen}')
+
+        if self.ver_sql:
+            self.stdout.write(f'              {sql} {params}')
+            for linea in plan:
+                self.stdout.write(f'                {linea}')
+        return 1 if grandes else 0
@@ -0,0 +1,180 @@
+# cotizaciones/metricas.py
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import MetricaPDF
+
+logger = logging.getLogger(__name__)
+
+
+class Medida:
+    """Lo registrado por una etapa: duración, bytes procesados y acierto de caché"""
+    __slots__ = ('etapa', 'ms', 'bytes', 'acierto')
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+        self.ms = 0.0
+        self.bytes = 0
+        self.acierto = None
+
+
+def _combinar(etapas, nombre, valores):
+    total = etapas.setdefault(nombre, dict.fromkeys(valores, 0))
+    for campo, valor in valores.items():
+        total[campo] = max(total[campo], valor) if campo == 'max_ms' else total[campo] + valor
+
+
+class _Acumulador:
+    """Totales por etapa en memoria, pendientes de volcar a la base de datos"""
+    def __init__(self):
+        self._etapas = {}
+        self._lock = threading.Lock()
+        self.ultimo_volcado = time.monotonic()
+
+    def sumar(self, medida):
+        with self._lock:
+            total = self._etapas.setdefault(medida.etapa, {
+                'cantidad': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'bytes': 0, 'aciertos': 0, 'fallos': 0,
+            })
+            total['cantidad'] += 1
+            total['total_ms'] += medida.ms
+            total['max_ms'] = max(total['max_ms'], medida.ms)
+            total['bytes'] += medida.bytes
+            if medida.acierto is True:
+                total['aciertos'] += 1
+            elif medida.acierto is False:
+                total['fallos'] += 1
+
+    def tomar(self):
+        with self._lock:
+            etapas, self._etapas = self._etapas, {}
+            self.ultimo_volcado = time.monotonic()
+            return etapas
+
+    def devolver(self, etapas):
+        """Reincorpora totales que no se pudieron volcar"""
+        with self._lock:
+            for nombre, valores in etapas.items():
+                _combinar(self._etapas, nombre, valores)
+
+    def pendientes(self):
+        with self._lock:
+            return {etapa: dict(valores) for etapa, valores in self._etapas.items()}
+
+
+_acumulador = _Acumulador()
+_local = threading.local()
+
+
+@contextmanager
+def etapa(nombre):
+    """
+    Mide una etapa de la generación del PDF. El bloque puede completar
+    medida.bytes y medida.acierto (True/False si usó o no una caché).
+    """
+    medida = Medida(nombre)
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    finally:
+        medida.ms = (time.perf_counter() - inicio) * 1000
+        _acumulador.sumar(medida)
+        documento_actual = getattr(_local, 'medidas', None)
+        if documento_actual is not None:
+            documento_actual.append(medida)
+        else:
+            _volcar_si_corresponde()
+
+
+@contextmanager
+def documento(cotizacion_id):
+    """Agrupa las etapas de un PDF y deja una línea en el log con su detalle"""
+    anteriores = getattr(_local, 'medidas', None)
+    _local.medidas = []
+    try:
+        with etapa('pdf') as total:
+            yield total
+    finally:
+        medidas, _local.medidas = _local.medidas, anteriores
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "PDF cotización %s: %s", cotizacion_id,
+                ', '.join(_describir(m) for m in medidas),
+            )
+        if anteriores is None:
+            _volcar_si_corresponde()
+
+
+def _volcar_si_corresponde():
+    if time.monotonic() - _acumulador.ultimo_volcado >= settings.METRICAS_PDF_INTERVALO:
+        volcar()
+
+
+def _describir(medida):
+    texto = f'{medida.etapa} {medida.ms:.1f} ms'
+    if medida.bytes:
+        texto += f' {medida.bytes} B'
+    if medida.acierto is not None:
+        texto += ' (caché)' if medida.acierto else ' (sin caché)'
+    return texto
+
+
+def volcar():
+    """Suma los totales en memoria a los contadores compartidos en la base de datos"""
+    etapas = _acumulador.tomar()
+    if not etapas:
+        return
+    try:
+        with transaction.atomic():
+            for nombre, valores in etapas.items():
+                MetricaPDF.objects.get_or_create(etapa=nombre)
+                MetricaPDF.objects.filter(etapa=nombre).update(
+                    cantidad=F('cantidad') + valores['cantidad'],
+                    total_ms=F('total_ms') + valores['total_ms'],
+                    max_ms=Greatest(F('max_ms'), valores['max_ms']),
+                    bytes=F('bytes') + valores['bytes'],
+                    aciertos=F('aciertos') + valores['aciertos'],
+                    fallos=F('fallos') + valores['fallos'],
+                    actualizado=timezone.now(),
+                )
+    except DatabaseError as e:
+        logger.warning("No se pudieron guardar las métricas de PDF: %s", e)
+        _acumulador.devolver(etapas)
+
+
+def resumen():
+    """Contadores por etapa: lo guardado en la base de datos más lo pendiente de este proceso"""
+    etapas = {
+        m.etapa: {
+            'cantidad': m.cantidad, 'total_ms': m.total_ms, 'max_ms': m.max_ms,
+            'bytes': m.bytes, 'aciertos': m.aciertos, 'fallos': m.fallos,
+        }
+        for m in MetricaPDF.objects.all()
+    }
+    for nombre, valores in _acumulador.pendientes().items():
+        _combinar(etapas, nombre, valores)
+
+    for valores in etapas.values():
+        cantidad = valores['cantidad'] or 1
+        consultas_cache = valores['aciertos'] + valores['fallos']
+        valores['media_ms'] = round(valores['total_ms'] / cantidad, 2)
+        valores['media_bytes'] = round(valores['bytes'] / cantidad)
+        valores['tasa_aciertos'] = round(valores['aciertos'] / consultas_cache, 3) if consultas_cache else None
+        valores['total_ms'] = round(valores['total_ms'], 1)
+        valores['max_ms'] = round(valores['max_ms'], 1)
+    return dict(sorted(etapas.items()))
+
+
+def reiniciar():
+    """Borra los contadores guardados y los pendientes de este proceso"""
+    _acumulador.tomar()
+    MetricaPDF.objects.all().delete()
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0017_departamento_exceso_precio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('listo', 'Listo'), ('error', 'Error')], db_index=True, default='pendiente', max_length=20)),
+                ('intentos', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('cotizacion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='trabajo_pdf', to='cotizaciones.cotizacion')),
+            ],
+            options={
+                'verbose_name': 'Trabajo PDF',
+                'verbose_name_plural': 'Trabajos PDF',
+            },
+        ),
+    ]
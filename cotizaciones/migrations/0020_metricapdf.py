@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0019_actualizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etapa', models.CharField(max_length=50, unique=True)),
+                ('cantidad', models.BigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('aciertos', models.BigIntegerField(default=0)),
+                ('fallos', models.BigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Métrica PDF',
+                'verbose_name_plural': 'Métricas PDF',
+                'ordering': ['etapa'],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+def inicializar_contador(apps, schema_editor):
+    """El contador arranca en el número más alto ya usado"""
+    Contador = apps.get_model('cotizaciones', 'Contador')
+    Cotizacion = apps.get_model('cotizaciones', 'Cotizacion')
+    ultimo = 0
+    for numero in Cotizacion.objects.values_list('numero_cotizacion', flat=True).iterator():
+        try:
+            ultimo = max(ultimo, int(numero.split('_')[1]))
+        except (IndexError, ValueError):
+            pass
+    Contador.objects.update_or_create(nombre='cotizaciones', defaults={'valor': ultimo})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0020_metricapdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador',
+                'verbose_name_plural': 'Contadores',
+            },
+        ),
+        migrations.RunPython(inicializar_contador, migrations.RunPython.noop),
+    ]
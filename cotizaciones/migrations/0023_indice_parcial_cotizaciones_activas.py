@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0021_contador'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['-fecha_creacion', '-id'], name='cotizacion_activas_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+from django.db import migrations
+
+# Copia del SQL de cotizaciones/busqueda.py al momento de esta migración:
+# la migración no debe cambiar si después cambia el módulo
+
+TABLA_FTS = 'cotizaciones_busqueda'
+INDICE_TRIGRAMAS = 'cotizacion_busqueda_trgm_idx'
+DOCUMENTO_PG = "(nombre_cliente || ' ' || dni_cliente || ' ' || telefono_cliente)"
+
+SQLITE_TABLA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+    nombre_cliente, dni_cliente, telefono_cliente,
+    content='cotizaciones_cotizacion', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+)
+"""
+
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON cotizaciones_cotizacion BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, nombre_cliente, dni_cliente, telefono_cliente)
+        VALUES (new.id, new.nombre_cliente, new.dni_cliente, new.telefono_cliente);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON cotizaciones_cotizacion BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre_cliente, dni_cliente, telefono_cliente)
+        VALUES ('delete', old.id, old.nombre_cliente, old.dni_cliente, old.telefono_cliente);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF nombre_cliente, dni_cliente, telefono_cliente
+    ON cotizaciones_cotizacion
+    WHEN old.nombre_cliente IS NOT new.nombre_cliente
+        OR old.dni_cliente IS NOT new.dni_cliente
+        OR old.telefono_cliente IS NOT new.telefono_cliente
+    BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre_cliente, dni_cliente, telefono_cliente)
+        VALUES ('delete', old.id, old.nombre_cliente, old.dni_cliente, old.telefono_cliente);
+        INSERT INTO {TABLA_FTS}(rowid, nombre_cliente, dni_cliente, telefono_cliente)
+        VALUES (new.id, new.nombre_cliente, new.dni_cliente, new.telefono_cliente);
+    END
+    """,
+]
+
+
+def crear_indice(apps, schema_editor):
+    """FTS5 en SQLite o índice de trigramas en PostgreSQL, según la base"""
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(SQLITE_TABLA)
+            for trigger in SQLITE_TRIGGERS:
+                cursor.execute(trigger)
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {INDICE_TRIGRAMAS} ON cotizaciones_cotizacion '
+                f'USING gin ({DOCUMENTO_PG} gin_trgm_ops)'
+            )
+
+
+def eliminar_indice(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for sufijo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA_FTS}_{sufijo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {INDICE_TRIGRAMAS}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0023_indice_parcial_cotizaciones_activas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0024_busqueda_cotizaciones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trabajopdf',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('listo', 'Listo'), ('error', 'Error')], default='pendiente', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='cotizacion_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(fields=['creado_por', '-fecha_creacion', '-id'], name='cotizacion_creador_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='departamento',
+            index=models.Index(fields=['pisos', 'codigo'], name='departamento_piso_codigo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='departamento',
+            index=models.Index(fields=['estado', 'pisos'], name='departamento_estado_piso_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='departamento',
+            index=models.Index(condition=models.Q(('disponible', True)), fields=['codigo'], name='departamento_disponibles_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trabajopdf',
+            index=models.Index(fields=['estado', 'actualizado'], name='trabajopdf_estado_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:04
+
+import re
+
+from django.db import migrations, models
+
+
+def normalizar_pisos(apps, schema_editor):
+    """Deja solo el número del piso ('Piso 3' -> '3'); lo que no tiene número queda vacío"""
+    Departamento = apps.get_model('cotizaciones', 'Departamento')
+    for depto in Departamento.objects.exclude(pisos=None).only('pisos'):
+        numero = re.search(r'\d+', depto.pisos)
+        valor = str(int(numero.group())) if numero else None
+        if valor != depto.pisos:
+            Departamento.objects.filter(pk=depto.pk).update(pisos=valor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0025_plan_indices'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_pisos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='departamento',
+            name='pisos',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Piso'),
+        ),
+    ]
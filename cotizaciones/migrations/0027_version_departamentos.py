@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0026_pisos_entero'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartamentoEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departamento_id', models.BigIntegerField()),
+                ('codigo', models.CharField(max_length=20)),
+                ('version', models.BigIntegerField(db_index=True)),
+                ('eliminado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Departamento eliminado',
+                'verbose_name_plural': 'Departamentos eliminados',
+            },
+        ),
+        migrations.AddField(
+            model_name='departamento',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
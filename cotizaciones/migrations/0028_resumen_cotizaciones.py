@@ -0,0 +1,111 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:10
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, When
+from django.utils import timezone
+
+
+def calcular_montos_descuento(apps, schema_editor):
+    """
+    Monto del descuento de las cotizaciones existentes a partir de su precio
+    final, sin depender del precio actual del departamento, salvo en los
+    descuentos del 100 % donde es lo único que queda.
+    """
+    Cotizacion = apps.get_model('cotizaciones', 'Cotizacion')
+    Departamento = apps.get_model('cotizaciones', 'Departamento')
+    importe = DecimalField(max_digits=10, decimal_places=2)
+    precio_base = Departamento.objects.filter(pk=OuterRef('departamento_id')).values(
+        base=ExpressionWrapper(F('precio') + F('exceso_precio'), output_field=importe)
+    )
+    Cotizacion.objects.update(monto_descuento=Case(
+        When(tipo_descuento='MONTO', then=F('valor_descuento')),
+        When(
+            Q(valor_descuento__lt=100),
+            then=ExpressionWrapper(
+                F('precio_final') * F('valor_descuento') / (100 - F('valor_descuento')), output_field=importe
+            ),
+        ),
+        default=ExpressionWrapper(Subquery(precio_base) - F('precio_final'), output_field=importe),
+        output_field=importe,
+    ))
+
+
+CENTIMOS = Decimal('0.01')
+
+
+def llenar_resumen(apps, schema_editor):
+    """
+    Resumen inicial desde las cotizaciones activas. Copia del cálculo de
+    resumen.reconstruir() al momento de esta migración, para que no cambie
+    si después cambia el módulo.
+    """
+    db = schema_editor.connection.alias
+    Cotizacion = apps.get_model('cotizaciones', 'Cotizacion')
+    ResumenCotizaciones = apps.get_model('cotizaciones', 'ResumenCotizaciones')
+
+    totales = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    cotizaciones = Cotizacion.objects.using(db).filter(activo=True).values(
+        'fecha_creacion', 'creado_por_id', 'medio_contacto', 'distrito_cliente',
+        'departamento_id', 'precio_final', 'monto_descuento',
+    )
+    for c in cotizaciones.iterator(chunk_size=2000):
+        mes = timezone.localdate(c['fecha_creacion']).replace(day=1)
+        distrito = ' '.join((c['distrito_cliente'] or '').split()).upper()[:100]
+        precio = Decimal(c['precio_final'] or 0).quantize(CENTIMOS)
+        descuento = Decimal(c['monto_descuento'] or 0).quantize(CENTIMOS)
+        for dimension, clave in (
+            ('total', ''),
+            ('agente', str(c['creado_por_id'])),
+            ('medio', c['medio_contacto']),
+            ('distrito', distrito),
+            ('departamento', str(c['departamento_id'])),
+        ):
+            fila = totales[(dimension, clave, mes)]
+            fila[0] += 1
+            fila[1] += precio
+            fila[2] += descuento
+
+    ResumenCotizaciones.objects.using(db).bulk_create([
+        ResumenCotizaciones(
+            dimension=dimension, clave=clave, mes=mes,
+            cantidad=cantidad, suma_precio_final=precio, suma_descuento=descuento,
+        )
+        for (dimension, clave, mes), (cantidad, precio, descuento) in totales.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0027_version_departamentos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cotizacion',
+            name='monto_descuento',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='ResumenCotizaciones',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('agente', 'Agente'), ('medio', 'Medio de captación'), ('distrito', 'Distrito'), ('departamento', 'Departamento')], max_length=20)),
+                ('clave', models.CharField(blank=True, max_length=100)),
+                ('mes', models.DateField()),
+                ('cantidad', models.BigIntegerField(default=0)),
+                ('suma_precio_final', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('suma_descuento', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'verbose_name': 'Resumen de cotizaciones',
+                'verbose_name_plural': 'Resúmenes de cotizaciones',
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'mes', 'clave'), name='resumen_dimension_mes_clave_unico')],
+            },
+        ),
+        migrations.RunPython(calcular_montos_descuento, migrations.RunPython.noop),
+        migrations.RunPython(llenar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0028_resumen_cotizaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusqueda',
+            fields=[
+                ('cotizacion', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='indice_busqueda', serialize=False, to='cotizaciones.cotizacion')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'cotizaciones_busqueda',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+# Copia del SQL de cotizaciones/busqueda.py al momento de esta migración:
+# la migración no debe cambiar si después cambia el módulo
+
+INDICE_ANTERIOR = 'cotizacion_busqueda_trgm_idx'
+DOCUMENTO_ANTERIOR = "(nombre_cliente || ' ' || dni_cliente || ' ' || telefono_cliente)"
+INDICE_TRIGRAMAS = 'cotizacion_busqueda_unaccent_trgm_idx'
+SIN_TILDES = 'cotizaciones_unaccent'
+DOCUMENTO_PG = f"{SIN_TILDES}(nombre_cliente || ' ' || dni_cliente || ' ' || telefono_cliente)"
+
+PG_SIN_TILDES = f"""
+CREATE OR REPLACE FUNCTION {SIN_TILDES}(text) RETURNS text AS
+$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+"""
+
+
+def crear_indice(apps, schema_editor):
+    """Índice de trigramas sin tildes en PostgreSQL; SQLite ya las quita en el FTS"""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+        cursor.execute(PG_SIN_TILDES)
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDICE_TRIGRAMAS} ON cotizaciones_cotizacion '
+            f'USING gin (({DOCUMENTO_PG}) gin_trgm_ops)'
+        )
+        cursor.execute(f'DROP INDEX IF EXISTS {INDICE_ANTERIOR}')
+
+
+def eliminar_indice(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDICE_ANTERIOR} ON cotizaciones_cotizacion '
+            f'USING gin ({DOCUMENTO_ANTERIOR} gin_trgm_ops)'
+        )
+        cursor.execute(f'DROP INDEX IF EXISTS {INDICE_TRIGRAMAS}')
+        cursor.execute(f'DROP FUNCTION IF EXISTS {SIN_TILDES}(text)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0029_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
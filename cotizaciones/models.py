@@ -1,10 +1,80 @@
 # cotizaciones/models.py
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
 import json
 
+from . import precios
+
+CONTADOR_COTIZACIONES = 'cotizaciones'
+# Versión del catálogo de departamentos: sube con cada alta, cambio o baja
+CONTADOR_DEPARTAMENTOS = 'departamentos'
+
+# Campos que publican la cuadrícula y el catálogo JSON: cambiar uno da una nueva versión
+CAMPOS_CATALOGO = [
+    'codigo', 'nombre', 'precio', 'exceso_precio', 'area_m2', 'area_libre',
+    'habitaciones', 'banos', 'pisos', 'estado', 'disponible', 'imagen',
+]
+
+
+class ContadorManager(models.Manager):
+    def reservar(self, nombre, cantidad=1):
+        """
+        Incrementa el contador de forma atómica y devuelve el rango de números
+        reservados. El UPDATE bloquea la fila hasta el fin de la transacción,
+        así dos procesos nunca obtienen el mismo número. Sin consultar la
+        tabla de cotizaciones. En SQLite, solo para desarrollo, el bloqueo es
+        de toda la base (ver DATABASES en settings).
+        """
+        if cantidad < 1:
+            return range(0)
+        with transaction.atomic():
+            actualizados = self.filter(nombre=nombre).update(valor=F('valor') + cantidad)
+            if not actualizados:
+                self.get_or_create(nombre=nombre)
+                self.filter(nombre=nombre).update(valor=F('valor') + cantidad)
+            valor = self.filter(nombre=nombre).values_list('valor', flat=True).get()
+        return range(valor - cantidad + 1, valor + 1)
+
+    def valor(self, nombre):
+        """Valor actual del contador, 0 si todavía no se usó"""
+        return self.filter(nombre=nombre).values_list('valor', flat=True).first() or 0
+
+
+class Contador(models.Model):
+    """Último número entregado de cada numeración (cotizaciones, etc.)"""
+    nombre = models.CharField(max_length=50, unique=True)
+    valor = models.BigIntegerField(default=0)
+
+    objects = ContadorManager()
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+    class Meta:
+        verbose_name = 'Contador'
+        verbose_name_plural = 'Contadores'
+
+
+class DepartamentoQuerySet(models.QuerySet):
+    def actualizar_catalogo(self, **campos):
+        """
+        update() en una sola sentencia para cambios masivos del catálogo. Como
+        no pasa por save(), asigna aquí una versión nueva del catálogo (la
+        misma para todas las filas) y la fecha de actualización, y avisa a
+        las cuadrículas abiertas al confirmarse.
+        """
+        with transaction.atomic(using=self.db):
+            version = Contador.objects.db_manager(self.db).reservar(CONTADOR_DEPARTAMENTOS)[0]
+            filas = self.update(version=version, actualizado=timezone.now(), **campos)
+        if filas:
+            from .difusion import publicar_version
+            transaction.on_commit(lambda: publicar_version(version), using=self.db)
+        return filas
+
+
 class Departamento(models.Model):
 
     ESTADO_CHOICES = [
@@ -23,18 +93,78 @@ class Departamento(models.Model):
     area_libre = models.DecimalField(max_digits=6, decimal_places=2)
     habitaciones = models.IntegerField()
     banos = models.IntegerField()
-    pisos = models.CharField(max_length=50, null=True, blank=True)
+    pisos = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='Piso')
     disponible = models.BooleanField(default=True)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='disponible')
     imagen = models.ImageField(upload_to='departamentos/', blank=True, null=True)
+    actualizado = models.DateTimeField(auto_now=True)
+    # Valor del contador de departamentos en el último cambio publicado
+    version = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    objects = DepartamentoQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.codigo} - {self.nombre} - S/.{self.precio}"
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # La versión y el guardado en la misma transacción, como en actualizar_catalogo:
+        # ningún otro cambio confirma una versión mayor antes que este
+        with transaction.atomic(using=kwargs.get('using')):
+            if self.cambio_catalogo(update_fields):
+                self.version = Contador.objects.reservar(CONTADOR_DEPARTAMENTOS)[0]
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'version'}
+            super().save(*args, **kwargs)
+
+    def cambio_catalogo(self, update_fields=None):
+        """Si se está guardando un cambio en alguno de los CAMPOS_CATALOGO"""
+        campos = [c for c in CAMPOS_CATALOGO if update_fields is None or c in update_fields]
+        if not campos:
+            return False
+        if self._state.adding:
+            return True
+        anterior = Departamento.objects.filter(pk=self.pk).values(*campos).first()
+        if anterior is None:
+            return True
+        for campo in campos:
+            actual = getattr(self, campo)
+            if campo == 'imagen':
+                actual, anterior[campo] = actual.name or None, anterior[campo] or None
+            if actual != anterior[campo]:
+                return True
+        return False
     
     class Meta:
         ordering = ['codigo']
         verbose_name = 'Departamento'
         verbose_name_plural = 'Departamentos'
+        indexes = [
+            # Cuadrícula del edificio, ordenada por piso y código
+            models.Index(fields=['pisos', 'codigo'], name='departamento_piso_codigo_idx'),
+            models.Index(fields=['estado', 'pisos'], name='departamento_estado_piso_idx'),
+            # Selector de departamentos del formulario de cotización
+            models.Index(
+                fields=['codigo'],
+                condition=models.Q(disponible=True),
+                name='departamento_disponibles_idx',
+            ),
+        ]
+
+
+class DepartamentoEliminado(models.Model):
+    """Registro de un departamento borrado, para que los clientes del catálogo lo quiten"""
+    departamento_id = models.BigIntegerField()
+    codigo = models.CharField(max_length=20)
+    version = models.BigIntegerField(db_index=True)
+    eliminado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.codigo} (versión {self.version})"
+
+    class Meta:
+        verbose_name = 'Departamento eliminado'
+        verbose_name_plural = 'Departamentos eliminados'
 
 
 class Cotizacion(models.Model):
@@ -73,6 +203,7 @@ class Cotizacion(models.Model):
     
     # Metadatos
     fecha_creacion = models.DateTimeField(default=timezone.now)
+    actualizado = models.DateTimeField(auto_now=True)
     creado_por = models.ForeignKey(User, on_delete=models.PROTECT)
     activo = models.BooleanField(default=True)
 
@@ -89,27 +220,49 @@ class Cotizacion(models.Model):
     valor_descuento = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
     precio_final = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
+    monto_descuento = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
     datos_estaticos = models.JSONField(null=True, blank=True)
 
     
+    @staticmethod
+    def formatear_numero(numero):
+        return f"cotizacion_{numero:02d}"
+
+    @classmethod
+    def asignar_numeros(cls, cotizaciones):
+        """
+        Reserva de una vez los números de varias cotizaciones nuevas (para
+        bulk_create). Debe llamarse dentro de la misma transacción que las
+        inserta, así un error no deja huecos en la numeración.
+        """
+        sin_numero = [c for c in cotizaciones if not c.numero_cotizacion]
+        numeros = Contador.objects.reservar(CONTADOR_COTIZACIONES, len(sin_numero))
+        for cotizacion, numero in zip(sin_numero, numeros):
+            cotizacion.numero_cotizacion = cls.formatear_numero(numero)
+
     def save(self, *args, **kwargs):
         # Generar número de cotización automáticamente
         if not self.numero_cotizacion:
-            ultimo = Cotizacion.objects.order_by('-id').first()
-            if ultimo:
-                numero = int(ultimo.numero_cotizacion.split('_')[1]) + 1 
-            else:
-                numero = 1
-            self.numero_cotizacion = f"cotizacion_{numero:02d}"
+            # El número y el INSERT van en la misma transacción: el contador
+            # queda bloqueado hasta el commit y un error no consume el número
+            try:
+                with transaction.atomic():
+                    self.asignar_numeros([self])
+                    return self.save(*args, **kwargs)
+            except Exception:
+                self.numero_cotizacion = ''
+                raise
 
+        self.calcular_precios()
+        super().save(*args, **kwargs)
 
-        precio_base = self.departamento.precio + self.departamento.exceso_precio
-
-        # Calcular precio final considerando descuento
-        if self.tipo_descuento == 'PORC':
-            self.precio_final = precio_base - (precio_base * self.valor_descuento / 100)
-        else:  # MONTO
-            self.precio_final = precio_base - self.valor_descuento
+    def calcular_precios(self):
+        """Precio final y datos estáticos del departamento, sin consultar la base de datos"""
+        calculo = precios.calcular(self.departamento, self.tipo_descuento, self.valor_descuento)
+        precio_base = calculo['precio_base']
+        self.precio_final = calculo['precio_final']
+        # En soles, para los promedios del resumen de ventas
+        self.monto_descuento = calculo['descuento']
 
         # Guardar datos estáticos del departamento (con el precio visible)
         if not self.datos_estaticos and self.departamento:
@@ -118,11 +271,9 @@ class Cotizacion(models.Model):
                 "codigo": self.departamento.codigo.replace("DEP-", ""),
                 "area_m2": f"{self.departamento.area_m2} m²",
                 "area_libre": f"{self.departamento.area_libre} m²",
-                "precio": f"S/. {float(precio_base):,.2f}",
+                "precio": f"S/. {precio_base:,.2f}",
             }
 
-        super().save(*args, **kwargs)
-
     
     def __str__(self):
         return f"{self.numero_cotizacion} - {self.nombre_cliente}"
@@ -131,5 +282,116 @@ class Cotizacion(models.Model):
         ordering = ['-fecha_creacion']
         verbose_name = 'Cotización'
         verbose_name_plural = 'Cotizaciones'
+        indexes = [
+            # Paginación por cursor de la lista de cotizaciones activas. Parcial: SQLite
+            # no usa un índice que empiece por activo para el WHERE "activo" de Django
+            models.Index(
+                fields=['-fecha_creacion', '-id'],
+                condition=models.Q(activo=True),
+                name='cotizacion_activas_fecha_idx',
+            ),
+            # Listado del admin, que también muestra las inactivas
+            models.Index(fields=['-fecha_creacion', '-id'], name='cotizacion_fecha_idx'),
+            # Admin filtrado por agente; activo se filtra sobre las filas del agente
+            models.Index(fields=['creado_por', '-fecha_creacion', '-id'], name='cotizacion_creador_fecha_idx'),
+        ]
+
+
+
+
+class TrabajoPDF(models.Model):
+    """Generación en segundo plano del PDF de una cotización"""
+
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('listo', 'Listo'),
+        ('error', 'Error'),
+    ]
 
+    cotizacion = models.OneToOneField(Cotizacion, on_delete=models.CASCADE, related_name='trabajo_pdf')
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"PDF {self.cotizacion_id} - {self.estado}"
+
+    class Meta:
+        verbose_name = 'Trabajo PDF'
+        verbose_name_plural = 'Trabajos PDF'
+        indexes = [
+            # Cola del worker: pendientes por antigüedad y procesando vencidos
+            models.Index(fields=['estado', 'actualizado'], name='trabajopdf_estado_idx'),
+        ]
+
+
+class ResumenCotizaciones(models.Model):
+    """
+    Totales por mes de las cotizaciones activas, abiertos por una dimensión
+    (agente, medio de captación, distrito o departamento). Se mantienen al
+    guardar cada cotización; ver cotizaciones/resumen.py.
+    """
+
+    DIMENSION_CHOICES = [
+        ('total', 'Total'),
+        ('agente', 'Agente'),
+        ('medio', 'Medio de captación'),
+        ('distrito', 'Distrito'),
+        ('departamento', 'Departamento'),
+    ]
 
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    clave = models.CharField(max_length=100, blank=True)
+    mes = models.DateField()
+    cantidad = models.BigIntegerField(default=0)
+    suma_precio_final = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    suma_descuento = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.dimension} {self.clave} {self.mes:%Y-%m}: {self.cantidad}"
+
+    class Meta:
+        verbose_name = 'Resumen de cotizaciones'
+        verbose_name_plural = 'Resúmenes de cotizaciones'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'mes', 'clave'], name='resumen_dimension_mes_clave_unico'),
+        ]
+
+
+class MetricaPDF(models.Model):
+    """Contadores acumulados por etapa de la generación de PDFs"""
+    etapa = models.CharField(max_length=50, unique=True)
+    cantidad = models.BigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    aciertos = models.BigIntegerField(default=0)
+    fallos = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.etapa} ({self.cantidad})"
+
+    class Meta:
+        ordering = ['etapa']
+        verbose_name = 'Métrica PDF'
+        verbose_name_plural = 'Métricas PDF'
+
+
+class IndiceBusqueda(models.Model):
+    """
+    Fila del índice FTS5 de búsqueda (solo SQLite, ver busqueda.py). La tabla
+    la crean y la mantienen los triggers; aquí solo se lee para unirla a las
+    cotizaciones y ordenar por su relevancia (rank).
+    """
+    cotizacion = models.OneToOneField(
+        Cotizacion, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='indice_busqueda',
+    )
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'cotizaciones_busqueda'
@@ -0,0 +1,122 @@
+# cotizaciones/paginacion.py
+
+import base64
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+# Por debajo de esta cantidad estimada se cuenta con COUNT(*): es barato y exacto
+ESTIMAR_DESDE = 10000
+
+
+def codificar_cursor(fecha, pk):
+    """Posición (fecha, id) como texto seguro para la URL"""
+    texto = f'{fecha.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha, id) o None si el cursor no es válido"""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, pk = base64.urlsafe_b64decode(cursor + relleno).decode().split('|')
+        return datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class PaginaCursor:
+    """
+    Página de un listado ordenado por fecha de creación e id, de la más
+    reciente a la más antigua. Cada página se obtiene con un WHERE sobre
+    la posición del cursor y un LIMIT, sin OFFSET ni COUNT: cuesta lo mismo
+    la primera página que la número mil.
+    """
+    def __init__(self, queryset, tamano, despues=None, antes=None):
+        self.tamano = tamano
+        posicion_despues = decodificar_cursor(despues)
+        posicion_antes = decodificar_cursor(antes)
+
+        if posicion_antes:
+            # Hacia atrás: las siguientes más recientes, en orden inverso
+            fecha, pk = posicion_antes
+            qs = queryset.filter(fecha_creacion__gte=fecha).exclude(fecha_creacion=fecha, id__lte=pk)
+            filas = list(qs.order_by('fecha_creacion', 'id')[:tamano + 1])
+            self.hay_anterior = len(filas) > tamano
+            self.objetos = filas[:tamano][::-1]
+            self.hay_siguiente = True
+        else:
+            qs = queryset
+            if posicion_despues:
+                fecha, pk = posicion_despues
+                qs = qs.filter(fecha_creacion__lte=fecha).exclude(fecha_creacion=fecha, id__gte=pk)
+            filas = list(qs.order_by('-fecha_creacion', '-id')[:tamano + 1])
+            self.hay_siguiente = len(filas) > tamano
+            self.objetos = filas[:tamano]
+            self.hay_anterior = posicion_despues is not None
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def cursor_siguiente(self):
+        if self.hay_siguiente and self.objetos:
+            ultimo = self.objetos[-1]
+            return codificar_cursor(ultimo.fecha_creacion, ultimo.pk)
+        return None
+
+    @property
+    def cursor_anterior(self):
+        if self.hay_anterior and self.objetos:
+            primero = self.objetos[0]
+            return codificar_cursor(primero.fecha_creacion, primero.pk)
+        return None
+
+
+def conteo_estimado(queryset):
+    """
+    Filas de la tabla según las estadísticas de la base (pg_class en
+    PostgreSQL, sqlite_stat1 después de ANALYZE en SQLite), sin recorrerla.
+    None si el queryset tiene filtros, si no hay estadísticas o si la
+    tabla es chica.
+    """
+    if queryset.query.where or queryset.query.distinct:
+        return None
+    connection = connections[queryset.db]
+    tabla = queryset.model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [tabla])
+            elif connection.vendor == 'sqlite':
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+                if cursor.fetchone() is None:
+                    return None
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [tabla])
+            else:
+                return None
+            fila = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if fila is None or fila[0] is None:
+        return None
+    estimado = int(str(fila[0]).split()[0])
+    return estimado if estimado >= ESTIMAR_DESDE else None
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginador para el admin de tablas grandes: sin filtros usa el conteo
+    estimado en lugar de COUNT(*) sobre toda la tabla.
+    """
+    @cached_property
+    def count(self):
+        estimado = conteo_estimado(self.object_list)
+        return estimado if estimado is not None else super().count
@@ -0,0 +1,92 @@
+# cotizaciones/precios.py
+"""
+Precios de una cotización en un solo lugar: precio base del departamento
+(precio + exceso de precio), descuento, precio final y forma de pago
+(cuota inicial, separación y saldo a financiar). Todo en Decimal y
+redondeado a céntimos; lo usan el modelo, el formulario, las vistas y el PDF.
+
+simular() evalúa de una vez muchos departamentos por varios descuentos y
+cuotas iniciales: cada precio base y cada descuento se calcula una sola vez
+y el saldo de cada cuota sale de una resta.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+
+CENTIMOS = Decimal('0.01')
+
+
+def redondear(valor):
+    return Decimal(valor or 0).quantize(CENTIMOS, rounding=ROUND_HALF_UP)
+
+
+def monto_separacion():
+    return redondear(settings.MONTO_SEPARACION)
+
+
+def precio_base(departamento):
+    """Precio que se cotiza: el precio del departamento más el exceso de precio"""
+    return redondear(departamento.precio + departamento.exceso_precio)
+
+
+def monto_descuento(base, tipo, valor):
+    """Descuento en soles; PORC es un porcentaje del precio base y MONTO un monto fijo"""
+    if tipo == 'PORC':
+        return redondear(base * Decimal(valor or 0) / 100)
+    return redondear(valor)
+
+
+def calcular(departamento, tipo_descuento, valor_descuento):
+    """
+    Precio base, descuento y precio final. El descuento es válido si el
+    precio final no baja del precio del departamento: solo se descuenta
+    del exceso de precio.
+    """
+    base = precio_base(departamento)
+    descuento = monto_descuento(base, tipo_descuento, valor_descuento)
+    precio_final = base - descuento
+    return {
+        'precio_base': base,
+        'descuento': descuento,
+        'precio_final': precio_final,
+        'descuento_valido': precio_final >= departamento.precio,
+    }
+
+
+def forma_de_pago(precio_final, cuota_inicial=None):
+    """Cuota inicial, separación y saldo a financiar de un precio final"""
+    cuota = redondear(cuota_inicial)
+    separacion = monto_separacion()
+    return {
+        'precio_final': redondear(precio_final),
+        'cuota_inicial': cuota,
+        'separacion': separacion,
+        'saldo': redondear(precio_final) - cuota - separacion,
+    }
+
+
+def simular(departamentos, descuentos, cuotas_iniciales):
+    """
+    Matriz de precios: por cada departamento y cada descuento (tipo, valor),
+    el precio final y el saldo a financiar con cada cuota inicial.
+    """
+    cuotas = [redondear(c) for c in cuotas_iniciales]
+    separacion = monto_separacion()
+    matriz = []
+    for departamento in departamentos:
+        base = precio_base(departamento)
+        opciones = []
+        for tipo, valor in descuentos:
+            descuento = monto_descuento(base, tipo, valor)
+            precio_final = base - descuento
+            opciones.append({
+                'tipo': tipo,
+                'valor': valor,
+                'descuento': descuento,
+                'precio_final': precio_final,
+                'descuento_valido': precio_final >= departamento.precio,
+                'saldos': [precio_final - cuota - separacion for cuota in cuotas],
+            })
+        matriz.append({'departamento': departamento, 'precio_base': base, 'opciones': opciones})
+    return {'cuotas_iniciales': cuotas, 'separacion': separacion, 'departamentos': matriz}
@@ -0,0 +1,114 @@
+# cotizaciones/reajustes.py
+"""
+Reajustes de precio de varios departamentos a la vez: por rango de pisos,
+habitaciones, estado o patrón de código, un porcentaje o un monto sobre
+el precio base o el exceso de precio.
+
+La vista previa calcula el precio nuevo en la misma consulta que trae los
+departamentos, con la misma expresión que después se aplica en un solo
+UPDATE (Departamento.objects.actualizar_catalogo), así lo que se ve es
+exactamente lo que se guarda.
+"""
+
+import re
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.db.models.functions import Round
+
+from .models import Departamento
+
+CAMPOS_PRECIO = ['precio', 'exceso_precio']
+
+
+class ErrorReajuste(Exception):
+    """El reajuste no se puede aplicar tal como está"""
+
+
+def patron_codigo(patron):
+    """'18*' o '?01' como expresión regular: * cualquier texto, ? un carácter"""
+    partes = (re.escape(c) if c not in '*?' else ('.*' if c == '*' else '.') for c in patron.strip())
+    return '^' + ''.join(partes) + '$'
+
+
+def seleccionar(piso_desde=None, piso_hasta=None, habitaciones=None, estado=None, codigo=None):
+    """Departamentos a reajustar; los criterios vacíos no filtran"""
+    departamentos = Departamento.objects.all()
+    if piso_desde is not None:
+        departamentos = departamentos.filter(pisos__gte=piso_desde)
+    if piso_hasta is not None:
+        departamentos = departamentos.filter(pisos__lte=piso_hasta)
+    if habitaciones:
+        departamentos = departamentos.filter(habitaciones__in=habitaciones)
+    if estado:
+        departamentos = departamentos.filter(estado=estado)
+    if codigo:
+        departamentos = departamentos.filter(codigo__iregex=patron_codigo(codigo))
+    return departamentos
+
+
+def limite(campo):
+    """Primer valor que ya no entra en el campo (max_digits y decimal_places del modelo)"""
+    campo = Departamento._meta.get_field(campo)
+    return Decimal(10) ** (campo.max_digits - campo.decimal_places)
+
+
+def precio_nuevo(campo, tipo, valor):
+    """Expresión SQL del precio reajustado: PORC sube o baja un porcentaje, MONTO suma soles"""
+    if campo not in CAMPOS_PRECIO:
+        raise ErrorReajuste(f'No se puede reajustar el campo {campo}.')
+    if tipo == 'PORC':
+        expresion = Round(F(campo) * (1 + Decimal(valor) / 100), 2)
+    else:
+        expresion = F(campo) + Decimal(valor)
+    return ExpressionWrapper(expresion, output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def mensaje_excedidos(codigos, tope):
+    maximo = tope - Decimal('0.01')
+    return f'El reajuste pasaría del máximo de S/. {maximo:,.2f} en {", ".join(codigos)}.'
+
+
+def vista_previa(departamentos, campo, tipo, valor):
+    """
+    Cada departamento con su precio actual y el reajustado, en una sola
+    consulta, y los totales antes y después. negativos y excedidos son los
+    códigos que quedarían bajo cero o por encima de lo que entra en el campo.
+    """
+    filas = list(
+        departamentos.order_by('pisos', 'codigo')
+        .annotate(actual=F(campo), nuevo=precio_nuevo(campo, tipo, valor))
+        .values('id', 'codigo', 'nombre', 'pisos', 'habitaciones', 'estado', 'actual', 'nuevo')
+    )
+    for fila in filas:
+        fila['nuevo'] = Decimal(fila['nuevo']).quantize(Decimal('0.01'))
+        fila['diferencia'] = fila['nuevo'] - fila['actual']
+    tope = limite(campo)
+    return {
+        'filas': filas,
+        'total_actual': sum((f['actual'] for f in filas), Decimal(0)),
+        'total_nuevo': sum((f['nuevo'] for f in filas), Decimal(0)),
+        'negativos': [f['codigo'] for f in filas if f['nuevo'] < 0],
+        'excedidos': [f['codigo'] for f in filas if f['nuevo'] >= tope],
+        'limite': tope,
+    }
+
+
+def aplicar(departamentos, campo, tipo, valor):
+    """
+    Aplica el reajuste en una transacción y un solo UPDATE con F(); devuelve
+    la cantidad de departamentos cambiados. Ningún precio puede quedar negativo
+    ni pasar de lo que entra en el campo.
+    """
+    nuevo = precio_nuevo(campo, tipo, valor)
+    tope = limite(campo)
+    with transaction.atomic():
+        reajustados = departamentos.annotate(nuevo=nuevo)
+        negativos = list(reajustados.filter(nuevo__lt=0).values_list('codigo', flat=True))
+        if negativos:
+            raise ErrorReajuste(f'El reajuste dejaría precios negativos en {", ".join(negativos)}.')
+        excedidos = list(reajustados.filter(nuevo__gte=tope).values_list('codigo', flat=True))
+        if excedidos:
+            raise ErrorReajuste(mensaje_excedidos(excedidos, tope))
+        return departamentos.actualizar_catalogo(**{campo: nuevo})
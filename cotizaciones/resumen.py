@@ -0,0 +1,181 @@
+# cotizaciones/resumen.py
+"""
+Resumen de ventas para el tablero: por mes, cantidad de cotizaciones
+activas y sumas de precio final y de descuento, en total y por agente,
+medio de captación, distrito y departamento.
+
+Las filas de ResumenCotizaciones se corrigen con cada cambio: al guardar
+o borrar una cotización (signals) se resta lo que aportaba antes y se suma
+lo que aporta ahora, y las importaciones con bulk_create llaman a
+registrar_nuevas(). El tablero lee una fila por mes y clave, sin recorrer
+las cotizaciones. reconstruir() recalcula todo desde cero.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Cotizacion, Departamento, ResumenCotizaciones
+
+# Lo que una cotización aporta al resumen
+CAMPOS_RESUMEN = [
+    'activo', 'fecha_creacion', 'creado_por_id', 'medio_contacto', 'distrito_cliente',
+    'departamento_id', 'precio_final', 'monto_descuento',
+]
+CENTIMOS = Decimal('0.01')
+
+
+def normalizar_distrito(distrito):
+    """'  san  isidro' y 'San Isidro' cuentan como el mismo distrito"""
+    return ' '.join((distrito or '').split()).upper()[:100]
+
+
+def valores_resumen(cotizacion):
+    return {campo: getattr(cotizacion, campo) for campo in CAMPOS_RESUMEN}
+
+
+def _filas(valores):
+    mes = timezone.localdate(valores['fecha_creacion']).replace(day=1)
+    return [
+        ('total', '', mes),
+        ('agente', str(valores['creado_por_id']), mes),
+        ('medio', valores['medio_contacto'], mes),
+        ('distrito', normalizar_distrito(valores['distrito_cliente']), mes),
+        ('departamento', str(valores['departamento_id']), mes),
+    ]
+
+
+def _importe(valor):
+    # Redondeado como lo guarda la base, para que restar lo leído anule lo sumado
+    return Decimal(valor or 0).quantize(CENTIMOS)
+
+
+class Cambios:
+    """Diferencias por fila del resumen, acumuladas en memoria antes de escribirlas"""
+
+    def __init__(self):
+        self.filas = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+
+    def sumar(self, valores, signo=1):
+        """Suma (o resta, con signo=-1) lo que aporta una cotización; las inactivas no cuentan"""
+        if not valores or not valores['activo']:
+            return
+        precio, descuento = _importe(valores['precio_final']), _importe(valores['monto_descuento'])
+        for fila in _filas(valores):
+            totales = self.filas[fila]
+            totales[0] += signo
+            totales[1] += signo * precio
+            totales[2] += signo * descuento
+
+    def guardar(self, manager=None):
+        """Un UPDATE por fila que cambió; las que se anulan (editar observaciones, etc.) no se tocan"""
+        manager = manager or ResumenCotizaciones.objects
+        # En orden, para que dos transacciones bloqueen las filas en la misma secuencia
+        cambios = sorted((fila, totales) for fila, totales in self.filas.items() if any(totales))
+        if not cambios:
+            return
+        with transaction.atomic(using=manager.db):
+            for (dimension, clave, mes), (cantidad, precio, descuento) in cambios:
+                fila = manager.filter(dimension=dimension, clave=clave, mes=mes)
+                incrementos = {
+                    'cantidad': F('cantidad') + cantidad,
+                    'suma_precio_final': F('suma_precio_final') + precio,
+                    'suma_descuento': F('suma_descuento') + descuento,
+                }
+                if not fila.update(**incrementos):
+                    manager.get_or_create(dimension=dimension, clave=clave, mes=mes)
+                    fila.update(**incrementos)
+
+
+def registrar_nuevas(cotizaciones):
+    """Para las cotizaciones creadas con bulk_create, que no disparan signals"""
+    cambios = Cambios()
+    for cotizacion in cotizaciones:
+        cambios.sumar(valores_resumen(cotizacion))
+    cambios.guardar()
+
+
+def reconstruir(cotizaciones=None, manager=None):
+    """
+    Borra el resumen y lo recalcula recorriendo las cotizaciones activas.
+    Devuelve la cantidad de filas creadas. Los cambios que entren mientras
+    corre pueden quedar fuera: conviene ejecutarlo con poca actividad.
+    """
+    if cotizaciones is None:
+        cotizaciones = Cotizacion.objects.all()
+    manager = manager or ResumenCotizaciones.objects
+
+    cambios = Cambios()
+    for valores in cotizaciones.filter(activo=True).values(*CAMPOS_RESUMEN).iterator(chunk_size=2000):
+        cambios.sumar(valores)
+    filas = [
+        manager.model(
+            dimension=dimension, clave=clave, mes=mes,
+            cantidad=cantidad, suma_precio_final=precio, suma_descuento=descuento,
+        )
+        for (dimension, clave, mes), (cantidad, precio, descuento) in cambios.filas.items()
+    ]
+    with transaction.atomic(using=manager.db):
+        manager.all().delete()
+        manager.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def _nombres(dimension, claves):
+    if dimension == 'agente':
+        usuarios = User.objects.filter(pk__in=claves)
+        return {str(u.pk): u.get_full_name() or u.username for u in usuarios}
+    if dimension == 'departamento':
+        return {str(pk): codigo for pk, codigo in Departamento.objects.filter(pk__in=claves).values_list('pk', 'codigo')}
+    return {}
+
+
+def _promedios(fila):
+    cantidad = fila['cantidad']
+    fila['precio_promedio'] = (fila['suma_precio_final'] / cantidad).quantize(CENTIMOS) if cantidad else None
+    fila['descuento_promedio'] = (fila['suma_descuento'] / cantidad).quantize(CENTIMOS) if cantidad else None
+    return fila
+
+
+def tablero(desde, hasta):
+    """
+    Resumen entre dos meses (inclusive): la evolución mensual y, por cada
+    dimensión, los totales del período ordenados por cantidad. Lee solo
+    filas del resumen: una por mes y clave.
+    """
+    filas = ResumenCotizaciones.objects.filter(mes__gte=desde, mes__lte=hasta, cantidad__gt=0)
+    por_mes = []
+    por_dimension = defaultdict(dict)
+    for fila in filas.order_by('mes').values('dimension', 'clave', 'mes', 'cantidad', 'suma_precio_final', 'suma_descuento'):
+        if fila['dimension'] == 'total':
+            por_mes.append(_promedios(fila))
+            continue
+        totales = por_dimension[fila['dimension']].setdefault(fila['clave'], {
+            'clave': fila['clave'], 'cantidad': 0, 'suma_precio_final': Decimal(0), 'suma_descuento': Decimal(0),
+        })
+        totales['cantidad'] += fila['cantidad']
+        totales['suma_precio_final'] += fila['suma_precio_final']
+        totales['suma_descuento'] += fila['suma_descuento']
+
+    total = {
+        'cantidad': sum(m['cantidad'] for m in por_mes),
+        'suma_precio_final': sum((m['suma_precio_final'] for m in por_mes), Decimal(0)),
+        'suma_descuento': sum((m['suma_descuento'] for m in por_mes), Decimal(0)),
+    }
+    dimensiones = []
+    for dimension, nombre in ResumenCotizaciones.DIMENSION_CHOICES:
+        if dimension == 'total':
+            continue
+        grupos = por_dimension.get(dimension, {})
+        nombres = _nombres(dimension, grupos.keys())
+        lista = sorted(grupos.values(), key=lambda g: (-g['cantidad'], g['clave']))
+        for grupo in lista:
+            grupo['nombre'] = nombres.get(grupo['clave'], grupo['clave'] or '—')
+            _promedios(grupo)
+        dimensiones.append({'dimension': dimension, 'nombre': nombre, 'filas': lista})
+
+    return {'meses': por_mes, 'total': _promedios(total), 'dimensiones': dimensiones}
@@ -0,0 +1,97 @@
+# cotizaciones/signals.py
+
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    Contador, Cotizacion, Departamento, DepartamentoEliminado, ResumenCotizaciones, CONTADOR_DEPARTAMENTOS,
+)
+from .almacen_pdf import invalidar_pdf_cotizacion
+from .tareas import encolar_pdf
+from .busqueda import crear_indice
+from .difusion import publicar_version
+from .resumen import CAMPOS_RESUMEN, Cambios, valores_resumen
+
+
+@receiver(post_save, sender=Cotizacion)
+@receiver(post_delete, sender=Cotizacion)
+def invalidar_pdf_al_cambiar_cotizacion(sender, instance, **kwargs):
+    """El PDF guardado deja de ser válido cuando cambia la cotización"""
+    invalidar_pdf_cotizacion(instance.pk)
+
+
+@receiver(post_save, sender=Cotizacion)
+def encolar_pdf_al_guardar_cotizacion(sender, instance, **kwargs):
+    """El worker genera el PDF antes de que alguien lo abra"""
+    if instance.activo:
+        transaction.on_commit(lambda: encolar_pdf(instance.pk))
+
+
+@receiver(pre_save, sender=Cotizacion)
+def leer_aporte_anterior(sender, instance, raw, using, **kwargs):
+    """Lo que la cotización aportaba al resumen de ventas antes de este cambio"""
+    instance._aporte_anterior = None
+    if not raw and not instance._state.adding:
+        instance._aporte_anterior = (
+            Cotizacion.objects.using(using).filter(pk=instance.pk).values(*CAMPOS_RESUMEN).first()
+        )
+
+
+@receiver(post_save, sender=Cotizacion)
+def actualizar_resumen_al_guardar_cotizacion(sender, instance, raw, using, **kwargs):
+    """Resta el aporte anterior y suma el nuevo; editar otros campos no toca el resumen"""
+    if raw:
+        return  # loaddata: después, reconstruir_resumen
+    cambios = Cambios()
+    cambios.sumar(getattr(instance, '_aporte_anterior', None), -1)
+    cambios.sumar(valores_resumen(instance))
+    cambios.guardar(ResumenCotizaciones.objects.db_manager(using))
+
+
+@receiver(post_delete, sender=Cotizacion)
+def actualizar_resumen_al_borrar_cotizacion(sender, instance, using, **kwargs):
+    cambios = Cambios()
+    cambios.sumar(valores_resumen(instance), -1)
+    cambios.guardar(ResumenCotizaciones.objects.db_manager(using))
+
+
+@receiver(post_save, sender=Departamento)
+def invalidar_pdfs_al_cambiar_departamento(sender, instance, created, **kwargs):
+    """Los PDFs de las cotizaciones del departamento muestran sus datos"""
+    if created:
+        return
+    for cotizacion_id in instance.cotizaciones.values_list('pk', flat=True):
+        invalidar_pdf_cotizacion(cotizacion_id)
+
+
+@receiver(post_delete, sender=Departamento)
+def registrar_departamento_eliminado(sender, instance, **kwargs):
+    """
+    La baja también es un cambio de versión del catálogo (y de la cuadrícula
+    en caché). Las altas y cambios la reciben en Departamento.save().
+    """
+    eliminado = DepartamentoEliminado.objects.create(
+        departamento_id=instance.pk,
+        codigo=instance.codigo,
+        version=Contador.objects.reservar(CONTADOR_DEPARTAMENTOS)[0],
+    )
+    transaction.on_commit(lambda: publicar_version(eliminado.version))
+
+
+@receiver(post_save, sender=Departamento)
+def avisar_cambio_departamento(sender, instance, **kwargs):
+    """Las cuadrículas abiertas se actualizan por SSE (el difusor ignora versiones ya avisadas)"""
+    transaction.on_commit(lambda: publicar_version(instance.version))
+
+
+def asegurar_indice_busqueda(sender, using, **kwargs):
+    """
+    Una migración que reconstruye la tabla de cotizaciones en SQLite se
+    lleva los triggers del índice de búsqueda: se recrean después de migrar.
+    """
+    connection = connections[using]
+    aplicadas = MigrationRecorder(connection).applied_migrations()
+    if ('cotizaciones', '0024_busqueda_cotizaciones') in aplicadas:
+        crear_indice(connection)
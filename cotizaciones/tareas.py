@@ -0,0 +1,87 @@
+# cotizaciones/tareas.py
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Cotizacion, TrabajoPDF
+from .almacen_pdf import abrir_pdf_cotizacion
+
+logger = logging.getLogger(__name__)
+
+
+def encolar_pdf(cotizacion_id):
+    """Marca el PDF de la cotización para generarse en segundo plano"""
+    TrabajoPDF.objects.update_or_create(
+        cotizacion_id=cotizacion_id,
+        defaults={'estado': 'pendiente', 'intentos': 0, 'error': ''},
+    )
+
+
+def reclamar_trabajo():
+    """Toma el siguiente trabajo pendiente, sin que otro worker pueda tomarlo a la vez"""
+    while True:
+        with transaction.atomic():
+            qs = TrabajoPDF.objects.filter(estado='pendiente').order_by('actualizado')
+            if connection.features.has_select_for_update_skip_locked:
+                qs = qs.select_for_update(skip_locked=True)
+            trabajo = qs.first()
+            if trabajo is None:
+                return None
+
+            tomado = TrabajoPDF.objects.filter(pk=trabajo.pk, estado='pendiente').update(
+                estado='procesando',
+                intentos=F('intentos') + 1,
+                actualizado=timezone.now(),
+            )
+        if tomado:
+            return trabajo
+        # Otro worker lo tomó primero (SQLite no tiene SKIP LOCKED): probar el siguiente
+
+
+def procesar_trabajo(trabajo):
+    """Genera y guarda el PDF; devuelve el estado final del trabajo"""
+    try:
+        cotizacion = Cotizacion.objects.select_related('departamento').get(pk=trabajo.cotizacion_id)
+        abrir_pdf_cotizacion(cotizacion).close()
+    except Exception as e:
+        logger.exception("Error generando el PDF de la cotización %s", trabajo.cotizacion_id)
+        estado = 'pendiente' if trabajo.intentos + 1 < settings.PDF_COLA_MAX_INTENTOS else 'error'
+        TrabajoPDF.objects.filter(pk=trabajo.pk, estado='procesando').update(
+            estado=estado, error=str(e), actualizado=timezone.now()
+        )
+        return estado
+
+    # Si la cotización cambió mientras tanto el trabajo volvió a 'pendiente' y se respeta
+    TrabajoPDF.objects.filter(pk=trabajo.pk, estado='procesando').update(
+        estado='listo', error='', actualizado=timezone.now()
+    )
+    return 'listo'
+
+
+def liberar_trabajos_colgados():
+    """Devuelve a la cola los trabajos de workers que murieron a mitad de proceso"""
+    limite = timezone.now() - timedelta(seconds=settings.PDF_COLA_TIMEOUT)
+    return TrabajoPDF.objects.filter(estado='procesando', actualizado__lt=limite).update(
+        estado='pendiente', actualizado=timezone.now()
+    )
+
+
+def esperar_pdf(cotizacion_id, espera_maxima=None):
+    """
+    Si el PDF se está generando en un worker espera a que termine,
+    como máximo espera_maxima segundos. Devuelve el estado del trabajo.
+    """
+    if espera_maxima is None:
+        espera_maxima = settings.PDF_COLA_ESPERA
+    limite = time.monotonic() + espera_maxima
+    while True:
+        estado = TrabajoPDF.objects.filter(cotizacion_id=cotizacion_id).values_list('estado', flat=True).first()
+        if estado != 'procesando' or time.monotonic() >= limite:
+            return estado
+        time.sleep(0.2)
@@ -1,3 +1,1263 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from openpyxl import load_workbook
+from PIL import Image as PILImage
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Spacer
+
+from . import almacen_pdf, busqueda, financiamiento, imagenes, metricas, precios, reajustes, tareas
+from . import resumen as resumen_ventas
+from .busqueda import filtrar as filtrar_busqueda
+from .catalogo import version_actual
+from .difusion import DifusorLocal
+from .exportacion import COLUMNAS_COTIZACIONES
+from .forms import SimuladorPreciosForm
+from .importacion import ErrorArchivo, importar_cotizaciones
+from .paginacion import PaginaCursor, decodificar_cursor
+from .management.commands.revisar_indices import Command as RevisarIndices
+from .utils import ProformaRenderer, generar_pdf_cotizacion, obtener_renderer
+from .views import PISOS_MINIMOS, _filas_cuadricula
+from .models import (
+    Contador, Cotizacion, Departamento, MetricaPDF, ResumenCotizaciones, TrabajoPDF, CONTADOR_COTIZACIONES,
+)
+
+
+def crear_departamento(codigo='101', **campos):
+    datos = {
+        'codigo': codigo, 'nombre': f'Departamento {codigo}', 'precio': Decimal('250000'),
+        'area_m2': Decimal('70'), 'area_libre': Decimal('10'), 'habitaciones': 3, 'banos': 2, 'pisos': 1,
+    }
+    datos.update(campos)
+    return Departamento.objects.create(**datos)
+
+
+def crear_cotizacion(departamento, usuario, **campos):
+    datos = {
+        'nombre_cliente': 'Cliente', 'dni_cliente': '12345678', 'distrito_cliente': 'San Miguel',
+        'telefono_cliente': '987654321', 'departamento': departamento, 'creado_por': usuario, 'usuario': usuario,
+    }
+    datos.update(campos)
+    return Cotizacion.objects.create(**datos)
+
+
+class AlmacenTemporalMixin:
+    """PDFs guardados en un directorio temporal y no en el almacén del proyecto"""
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajuste = override_settings(PDF_CACHE_DIR=directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+
+class NumeracionConcurrenteTest(TransactionTestCase):
+    """Varios hilos, cada uno con su conexión, creando cotizaciones a la vez"""
+    HILOS = 8
+    POR_HILO = 25
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Se necesita una base en archivo para usar varias conexiones')
+        self.usuario = User.objects.create(username='agente')
+        self.departamento = Departamento.objects.create(
+            codigo='DEP-101', nombre='Departamento 101', precio=Decimal('250000'),
+            area_m2=Decimal('70'), area_libre=Decimal('10'), habitaciones=3, banos=2,
+        )
+
+    def _en_hilos(self, trabajo):
+        errores = []
+
+        def ejecutar():
+            try:
+                trabajo()
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=ejecutar) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, [])
+
+    def test_cotizaciones_sin_duplicados_ni_huecos(self):
+        def crear():
+            for i in range(self.POR_HILO):
+                Cotizacion.objects.create(
+                    nombre_cliente=f'Cliente {i}', dni_cliente='12345678', distrito_cliente='San Miguel',
+                    telefono_cliente='987654321', departamento=self.departamento, creado_por=self.usuario,
+                )
+
+        self._en_hilos(crear)
+
+        total = self.HILOS * self.POR_HILO
+        numeros = sorted(
+            int(n.split('_')[1]) for n in Cotizacion.objects.values_list('numero_cotizacion', flat=True)
+        )
+        self.assertEqual(numeros, list(range(1, total + 1)))
+        self.assertEqual(Contador.objects.get(nombre=CONTADOR_COTIZACIONES).valor, total)
+
+    def test_reserva_de_bloques(self):
+        reservados = []
+
+        def reservar():
+            for cantidad in (1, 5, 1, 10, 3):
+                reservados.extend(Contador.objects.reservar('prueba', cantidad))
+
+        self._en_hilos(reservar)
+
+        self.assertEqual(sorted(reservados), list(range(1, self.HILOS * 20 + 1)))
+
+
+# Las plantillas usan {% static %}: sin collectstatic no hay manifiesto
+sin_manifiesto = override_settings(STORAGES={
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+@sin_manifiesto
+class AdminConsultasTest(TestCase):
+    """Las listas del admin hacen las mismas consultas con 10 o con 60 filas"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.force_login(self.usuario)
+        self.departamentos = [self._departamento(i) for i in range(1, 4)]
+        self._cotizaciones(10)
+
+    def _departamento(self, numero):
+        return Departamento.objects.create(
+            codigo=f'DEP-{numero:03d}', nombre=f'Departamento {numero}', precio=Decimal('250000'),
+            area_m2=Decimal('70'), area_libre=Decimal('10'), habitaciones=3, banos=2, pisos=numero,
+        )
+
+    def _cotizaciones(self, cantidad):
+        cotizaciones = []
+        for i in range(cantidad):
+            cotizacion = Cotizacion(
+                nombre_cliente=f'Cliente {i}', dni_cliente='12345678', distrito_cliente='San Miguel',
+                telefono_cliente='987654321', departamento=self.departamentos[i % 3], creado_por=self.usuario,
+                usuario=self.usuario,
+            )
+            cotizacion.calcular_precios()
+            cotizaciones.append(cotizacion)
+        Cotizacion.asignar_numeros(cotizaciones)
+        Cotizacion.objects.bulk_create(cotizaciones)
+
+    def _consultas(self, url, **parametros):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return [c['sql'] for c in consultas.captured_queries]
+
+    def test_lista_de_cotizaciones(self):
+        url = reverse('admin:cotizaciones_cotizacion_changelist')
+        antes = self._consultas(url)
+        self._cotizaciones(50)
+        despues = self._consultas(url)
+
+        self.assertEqual(len(antes), len(despues))
+        # Un solo COUNT (el del paginador) y ningún DISTINCT de fechas
+        self.assertEqual(sum('COUNT(' in sql.upper() for sql in despues), 1)
+        self.assertFalse(any('DISTINCT' in sql.upper() for sql in despues))
+
+    def test_lista_de_departamentos(self):
+        url = reverse('admin:cotizaciones_departamento_changelist')
+        antes = self._consultas(url)
+        for numero in range(4, 30):
+            self._departamento(numero)
+        self.assertEqual(len(antes), len(self._consultas(url)))
+
+    def test_formulario_de_cotizacion_sin_select_de_departamentos(self):
+        url = reverse('admin:cotizaciones_cotizacion_change', args=[Cotizacion.objects.first().pk])
+        self.client.get(url)  # Llena la caché de ContentType
+        antes = self._consultas(url)
+        for numero in range(4, 30):
+            self._departamento(numero)
+        self.assertEqual(len(antes), len(self._consultas(url)))
+
+    def test_marcar_vendido_en_un_update(self):
+        url = reverse('admin:cotizaciones_departamento_changelist')
+        versiones = {d.pk: d.version for d in Departamento.objects.all()}
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(url, {
+                'action': 'marcar_vendido',
+                '_selected_action': [d.pk for d in self.departamentos[:2]],
+            })
+
+        actualizaciones = [
+            c['sql'] for c in consultas.captured_queries
+            if c['sql'].startswith('UPDATE "cotizaciones_departamento"')
+        ]
+        self.assertEqual(len(actualizaciones), 1)
+        vendidos = Departamento.objects.filter(estado='vendido')
+        self.assertEqual({d.pk for d in vendidos}, {d.pk for d in self.departamentos[:2]})
+        self.assertTrue(all(d.version > versiones[d.pk] for d in vendidos))
+        self.assertFalse(any(d.disponible for d in vendidos))
+
+    def test_marcar_disponible_lo_vuelve_cotizable(self):
+        url = reverse('admin:cotizaciones_departamento_changelist')
+        seleccion = [d.pk for d in self.departamentos[:2]]
+        self.client.post(url, {'action': 'marcar_separado', '_selected_action': seleccion})
+        self.assertFalse(Departamento.objects.filter(pk__in=seleccion, disponible=True).exists())
+
+        self.client.post(url, {'action': 'marcar_disponible', '_selected_action': seleccion})
+        self.assertEqual(
+            Departamento.objects.filter(pk__in=seleccion, estado='disponible', disponible=True).count(), 2,
+        )
+
+    def test_filtro_por_creador(self):
+        otro = User.objects.create_user('sin_cotizaciones', password='clave')
+        url = reverse('admin:cotizaciones_cotizacion_changelist')
+        respuesta = self.client.get(url, {'creado_por__id__exact': self.usuario.pk})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['cl'].result_count, 10)
+        self.assertNotContains(respuesta, otro.username)
+
+    def test_cambio_de_precio_en_un_update(self):
+        url = reverse('admin:cotizaciones_departamento_changelist')
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(url, {
+                'action': 'cambiar_precio',
+                '_selected_action': [d.pk for d in self.departamentos],
+                'aplicar': '1', 'campo': 'precio', 'tipo': 'PORC', 'valor': '10',
+            })
+
+        actualizaciones = [
+            c['sql'] for c in consultas.captured_queries
+            if c['sql'].startswith('UPDATE "cotizaciones_departamento"')
+        ]
+        self.assertEqual(len(actualizaciones), 1)
+        self.assertEqual(
+            set(Departamento.objects.values_list('precio', flat=True)), {Decimal('275000.00')}
+        )
+
+
+class ReajustePreciosTest(TestCase):
+    """La vista previa muestra lo mismo que después guarda el UPDATE"""
+
+    def setUp(self):
+        for piso, codigo in [(1, '101'), (2, '201'), (2, '202'), (3, '301')]:
+            Departamento.objects.create(
+                codigo=codigo, nombre=f'Departamento {codigo}', precio=Decimal('199999.99'),
+                exceso_precio=Decimal('1000'), area_m2=Decimal('70'), area_libre=Decimal('10'),
+                habitaciones=2 if codigo.endswith('1') else 3, banos=2, pisos=piso,
+            )
+
+    def test_seleccion(self):
+        self.assertEqual(
+            set(reajustes.seleccionar(piso_desde=2, habitaciones=[2]).values_list('codigo', flat=True)),
+            {'201', '301'},
+        )
+        self.assertEqual(
+            set(reajustes.seleccionar(codigo='2?2').values_list('codigo', flat=True)), {'202'}
+        )
+
+    def test_vista_previa_igual_a_lo_aplicado(self):
+        departamentos = reajustes.seleccionar(piso_desde=2)
+        previa = reajustes.vista_previa(departamentos, 'precio', 'PORC', Decimal('3.5'))
+        with CaptureQueriesContext(connection) as consultas:
+            filas = reajustes.aplicar(departamentos, 'precio', 'PORC', Decimal('3.5'))
+
+        self.assertEqual(filas, 3)
+        actualizaciones = [
+            c['sql'] for c in consultas.captured_queries
+            if c['sql'].startswith('UPDATE "cotizaciones_departamento"')
+        ]
+        self.assertEqual(len(actualizaciones), 1)
+        guardados = dict(Departamento.objects.values_list('codigo', 'precio'))
+        self.assertEqual({f['codigo']: f['nuevo'] for f in previa['filas']}, {c: guardados[c] for c in ('201', '202', '301')})
+        self.assertEqual(guardados['101'], Decimal('199999.99'))
+
+    def test_no_deja_precios_negativos(self):
+        with self.assertRaises(reajustes.ErrorReajuste):
+            reajustes.aplicar(Departamento.objects.all(), 'exceso_precio', 'MONTO', Decimal('-1500'))
+        self.assertEqual(set(Departamento.objects.values_list('exceso_precio', flat=True)), {Decimal('1000')})
+
+    def test_no_pasa_del_maximo_del_campo(self):
+        # precio tiene max_digits=10 y 2 decimales: el máximo es 99,999,999.99
+        departamentos = reajustes.seleccionar(codigo='101')
+        previa = reajustes.vista_previa(departamentos, 'precio', 'PORC', Decimal('50000'))
+        self.assertEqual(previa['excedidos'], ['101'])
+        with self.assertRaises(reajustes.ErrorReajuste):
+            reajustes.aplicar(departamentos, 'precio', 'PORC', Decimal('50000'))
+        self.assertEqual(Departamento.objects.get(codigo='101').precio, Decimal('199999.99'))
+
+        staff = User.objects.create_user('staff', password='clave', is_staff=True)
+        self.client.force_login(staff)
+        with sin_manifiesto:
+            respuesta = self.client.post(reverse('cotizaciones:reajuste_precios'), {
+                'codigo': '101', 'campo': 'precio', 'tipo': 'PORC', 'valor': '50000', 'accion': 'vista_previa',
+            })
+        self.assertIn('valor', respuesta.context['form'].errors)
+        self.assertNotContains(respuesta, 'value="aplicar"')
+
+
+class PreciosTest(TestCase):
+    """Modelo, formulario y simulador calculan el mismo precio"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('agente', password='clave')
+        self.departamento = Departamento.objects.create(
+            codigo='DEP-101', nombre='Departamento 101', precio=Decimal('250000'),
+            exceso_precio=Decimal('10000.33'), area_m2=Decimal('70'), area_libre=Decimal('10'),
+            habitaciones=3, banos=2, pisos=1,
+        )
+
+    def test_cotizacion_y_simulador_coinciden(self):
+        cotizacion = Cotizacion.objects.create(
+            nombre_cliente='Cliente', dni_cliente='12345678', distrito_cliente='Surco',
+            telefono_cliente='987654321', departamento=self.departamento, creado_por=self.usuario,
+            tipo_descuento='PORC', valor_descuento=Decimal('3.5'), cuota_inicial=Decimal('20000'),
+        )
+        cotizacion.refresh_from_db()
+        simulacion = precios.simular([self.departamento], [('PORC', Decimal('3.5'))], [Decimal('20000')])
+        opcion = simulacion['departamentos'][0]['opciones'][0]
+
+        self.assertEqual(cotizacion.precio_final, opcion['precio_final'])
+        self.assertEqual(cotizacion.monto_descuento, opcion['descuento'])
+        self.assertEqual(cotizacion.precio_final + cotizacion.monto_descuento, Decimal('260000.33'))
+        pago = precios.forma_de_pago(cotizacion.precio_final, cotizacion.cuota_inicial)
+        self.assertEqual(pago['saldo'], opcion['saldos'][0])
+        self.assertEqual(pago['saldo'], cotizacion.precio_final - Decimal('20000') - Decimal('1500'))
+
+    @override_settings(MONTO_SEPARACION=Decimal('2500'))
+    def test_separacion_configurable(self):
+        self.assertEqual(precios.forma_de_pago(Decimal('100000'), None)['saldo'], Decimal('97500.00'))
+
+    def test_descuento_no_baja_del_precio(self):
+        self.assertTrue(precios.calcular(self.departamento, 'MONTO', Decimal('10000.33'))['descuento_valido'])
+        self.assertFalse(precios.calcular(self.departamento, 'MONTO', Decimal('10000.34'))['descuento_valido'])
+        simulacion = precios.simular([self.departamento], [('PORC', Decimal('3')), ('PORC', Decimal('5'))], [0])
+        self.assertEqual(
+            [o['descuento_valido'] for o in simulacion['departamentos'][0]['opciones']], [True, False]
+        )
+
+    def test_formulario_del_simulador(self):
+        form = SimuladorPreciosForm({'descuentos': '5%, 2000', 'cuotas_iniciales': '20000,30000.50'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['descuentos'], [('PORC', Decimal('5')), ('MONTO', Decimal('2000'))])
+        self.assertEqual(form.cleaned_data['cuotas_iniciales'], [Decimal('20000'), Decimal('30000.50')])
+        self.assertFalse(SimuladorPreciosForm({'descuentos': '120%', 'cuotas_iniciales': '0'}).is_valid())
+
+
+class FinanciamientoTest(TestCase):
+    """El cronograma escalado de los factores coincide con el cálculo mes a mes"""
+
+    def test_cronograma(self):
+        credito = financiamiento.cronograma(Decimal('282500'), 20)
+        pagos = credito['pagos']
+
+        self.assertEqual(len(pagos), 240)
+        self.assertEqual(credito['cuota'], Decimal('2478.27'))
+        self.assertEqual(sum(p['amortizacion'] for p in pagos), Decimal('282500.00'))
+        self.assertEqual(sum(p['interes'] for p in pagos), credito['total_intereses'])
+        self.assertEqual(sum(p['cuota'] for p in pagos), credito['total_pagado'])
+        self.assertEqual(pagos[-1]['saldo'], Decimal('0.00'))
+        self.assertEqual(pagos[-1]['cuota'], credito['ultima_cuota'])
+        self.assertLess(abs(credito['ultima_cuota'] - credito['cuota']), Decimal('5'))
+        self.assertTrue(all(p['interes'] >= 0 for p in pagos))
+        # Mes a mes con la tasa mensual: interés del saldo anterior y el resto amortiza
+        saldo = Decimal('282500')
+        tem = financiamiento.factores(credito['tea'], 20)[0]
+        for pago in pagos[:12]:
+            saldo -= credito['cuota'] - (saldo * tem).quantize(Decimal('0.01'))
+            self.assertLessEqual(abs(pago['saldo'] - saldo), Decimal('0.05'))
+
+    def test_saldos_anuales(self):
+        tabla = financiamiento.saldos_anuales(Decimal('282500'))
+        self.assertEqual([c['anios'] for c in tabla['creditos']], [10, 15, 20, 25])
+        self.assertEqual(len(tabla['filas']), 25)
+        pagos = financiamiento.cronograma(Decimal('282500'), 15)['pagos']
+        self.assertEqual(tabla['filas'][4]['saldos'][1], pagos[59]['saldo'])
+        self.assertIsNone(tabla['filas'][10]['saldos'][0])
+        self.assertEqual(financiamiento.saldos_anuales(Decimal('-10'))['filas'], [])
+
+    @override_settings(HIPOTECA_TASAS={10: Decimal('0')})
+    def test_tasa_cero(self):
+        credito = financiamiento.cronograma(Decimal('120000'), 10)
+        self.assertEqual(credito['cuota'], Decimal('1000.00'))
+        self.assertEqual(credito['total_intereses'], Decimal('0.00'))
+        with self.assertRaises(ValueError):
+            financiamiento.cronograma(Decimal('120000'), 20)
+
+    def test_pagina_del_credito_solo_si_se_activa(self):
+        usuario = User.objects.create_user('agente', password='clave')
+        cotizacion = Cotizacion.objects.select_related('departamento').get(
+            pk=crear_cotizacion(crear_departamento(), usuario).pk
+        )
+        renderer = obtener_renderer(False)
+        paginas = _paginas(renderer.render(cotizacion))
+        with override_settings(HIPOTECA_EN_PDF=True):
+            self.assertEqual(_paginas(renderer.render(cotizacion)), paginas + 1)
+
+
+class AlmacenPdfTest(AlmacenTemporalMixin, TestCase):
+    """El PDF se genera una vez por contenido y después se lee del disco"""
+
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user('agente', password='clave')
+        self.cotizacion = crear_cotizacion(crear_departamento(), self.usuario)
+
+    def test_segunda_apertura_lee_del_almacen(self):
+        with mock.patch('cotizaciones.almacen_pdf.generar_pdf_cotizacion', wraps=almacen_pdf.generar_pdf_cotizacion) as generar:
+            with almacen_pdf.abrir_pdf_cotizacion(self.cotizacion) as pdf:
+                primero = pdf.read()
+            with almacen_pdf.abrir_pdf_cotizacion(self.cotizacion) as pdf:
+                segundo = pdf.read()
+
+        self.assertEqual(generar.call_count, 1)
+        self.assertTrue(primero.startswith(b'%PDF'))
+        self.assertEqual(primero, segundo)
+        self.assertTrue(almacen_pdf.pdf_disponible(self.cotizacion))
+
+    def test_huella_sigue_al_contenido(self):
+        huella = almacen_pdf.huella_cotizacion(self.cotizacion)
+        self.cotizacion.observaciones = 'No sale en el PDF'
+        self.assertEqual(almacen_pdf.huella_cotizacion(self.cotizacion), huella)
+        self.cotizacion.nombre_cliente = 'Otro cliente'
+        self.assertNotEqual(almacen_pdf.huella_cotizacion(self.cotizacion), huella)
+
+    def test_guardar_la_cotizacion_descarta_el_pdf(self):
+        almacen_pdf.abrir_pdf_cotizacion(self.cotizacion).close()
+        self.cotizacion.nombre_cliente = 'Otro cliente'
+        self.cotizacion.save()
+        self.assertFalse(os.path.exists(os.path.join(settings.PDF_CACHE_DIR, str(self.cotizacion.pk))))
+        self.assertFalse(almacen_pdf.pdf_disponible(self.cotizacion))
+
+
+def _streams(pdf):
+    """Contenido de páginas e imágenes de un PDF sin compresión, sin depender de los números de objeto"""
+    return sorted(re.findall(rb'stream\r?\n(.*?)endstream', pdf, re.S))
+
+
+def _paginas(pdf):
+    return len(re.findall(rb'/Type /Page\b(?!s)', pdf))
+
+
+def _texto(pdf):
+    """Operadores de dibujo de las páginas, descomprimidos (ASCII85 + Flate de ReportLab)"""
+    contenidos = re.findall(rb'/Filter \[ /ASCII85Decode /FlateDecode \] /Length \d+\s*>>\s*stream\r?\n(.*?)endstream', pdf, re.S)
+    return b''.join(zlib.decompress(base64.a85decode(c.strip(), adobe=True)) for c in contenidos)
+
+
+class PlantillaPdfTest(AlmacenTemporalMixin, TestCase):
+    """
+    Las partes fijas compartidas (BloqueFijo, ImagenFija) usan detalles
+    internos de ReportLab: deben dibujar lo mismo que los flowables originales
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user('agente', password='clave')
+        self.cotizacion = crear_cotizacion(crear_departamento(), self.usuario)
+
+    def test_misma_salida_que_sin_plantilla(self):
+        con_plantilla = generar_pdf_cotizacion(self.cotizacion)
+        sin_plantilla = generar_pdf_cotizacion(self.cotizacion, usar_plantilla=False)
+        self.assertEqual(_streams(con_plantilla), _streams(sin_plantilla))
+
+    def _documento(self, renderer, bloque):
+        salida = BytesIO()
+        doc = SimpleDocTemplate(salida, pagesize=A4)
+        # Las notas empiezan a pocos puntos del final de la primera página
+        doc.build([Spacer(1, doc.height - 40), renderer._fijo(bloque)])
+        return salida.getvalue()
+
+    def test_bloque_fijo_se_parte_al_final_de_la_pagina(self):
+        compartido = self._documento(ProformaRenderer(), 'notas')
+        original = self._documento(ProformaRenderer(plantilla=False), 'notas')
+        self.assertEqual(_paginas(compartido), 2)
+        self.assertEqual(_streams(compartido), _streams(original))
+
+
+class CacheImagenesTest(TestCase):
+    """La imagen del departamento se descarga una vez y luego sale del disco o de la memoria"""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        # Storage local con URL https, para pasar por la descarga (simulada) sin credenciales de Cloudinary
+        storages = {
+            **settings.STORAGES,
+            'default': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': os.path.join(directorio, 'media'), 'base_url': 'https://media.example.com/'},
+            },
+        }
+        ajuste = override_settings(STORAGES=storages, IMAGENES_CACHE_DIR=os.path.join(directorio, 'cache'))
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        imagenes._memoria.clear()
+        self.addCleanup(imagenes._memoria.clear)
+
+        png = BytesIO()
+        PILImage.new('RGB', (8, 8), 'red').save(png, format='PNG')
+        respuesta = mock.Mock(content=png.getvalue())
+        parche = mock.patch('cotizaciones.imagenes.requests.get', return_value=respuesta)
+        self.descargar = parche.start()
+        self.addCleanup(parche.stop)
+        self.departamento = Departamento(codigo='101', imagen='departamentos/101.png')
+
+    def test_una_descarga_por_imagen(self):
+        primera = imagenes.obtener_imagen_departamento(self.departamento)
+        self.assertIs(imagenes.obtener_imagen_departamento(self.departamento), primera)
+        imagenes._memoria.clear()
+        desde_disco = imagenes.obtener_imagen_departamento(self.departamento)
+
+        self.assertEqual(self.descargar.call_count, 1)
+        self.assertEqual((desde_disco.ancho, desde_disco.alto), (8, 8))
+        self.assertEqual(len(os.listdir(settings.IMAGENES_CACHE_DIR)), 1)
+
+    def test_sin_imagen(self):
+        self.assertIsNone(imagenes.obtener_imagen_departamento(Departamento(codigo='102')))
+        self.descargar.assert_not_called()
+
+
+class ColaPdfTest(AlmacenTemporalMixin, TestCase):
+    """Un trabajo se reclama una sola vez y los errores se reintentan hasta el máximo"""
+
+    def setUp(self):
+        super().setUp()
+        usuario = User.objects.create_user('agente', password='clave')
+        departamento = crear_departamento()
+        self.cotizaciones = [crear_cotizacion(departamento, usuario) for _ in range(2)]
+        hace_un_minuto = timezone.now() - timedelta(minutes=1)
+        for minutos, cotizacion in enumerate(self.cotizaciones):
+            tareas.encolar_pdf(cotizacion.pk)
+            TrabajoPDF.objects.filter(cotizacion=cotizacion).update(actualizado=hace_un_minuto + timedelta(seconds=minutos))
+
+    def test_reclama_el_mas_antiguo_una_vez(self):
+        primero = tareas.reclamar_trabajo()
+        segundo = tareas.reclamar_trabajo()
+
+        self.assertEqual(primero.cotizacion_id, self.cotizaciones[0].pk)
+        self.assertEqual(segundo.cotizacion_id, self.cotizaciones[1].pk)
+        self.assertIsNone(tareas.reclamar_trabajo())
+        self.assertEqual(
+            list(TrabajoPDF.objects.values_list('estado', 'intentos').distinct()), [('procesando', 1)]
+        )
+
+    def test_procesa_y_guarda_el_pdf(self):
+        trabajo = tareas.reclamar_trabajo()
+        self.assertEqual(tareas.procesar_trabajo(trabajo), 'listo')
+        self.assertTrue(almacen_pdf.pdf_disponible(self.cotizaciones[0]))
+
+    @override_settings(PDF_COLA_MAX_INTENTOS=2)
+    def test_reintenta_hasta_el_maximo(self):
+        TrabajoPDF.objects.filter(cotizacion=self.cotizaciones[1]).delete()
+        with mock.patch('cotizaciones.tareas.abrir_pdf_cotizacion', side_effect=OSError('disco lleno')):
+            self.assertEqual(tareas.procesar_trabajo(tareas.reclamar_trabajo()), 'pendiente')
+            self.assertEqual(tareas.procesar_trabajo(tareas.reclamar_trabajo()), 'error')
+
+        trabajo = TrabajoPDF.objects.get()
+        self.assertEqual((trabajo.intentos, trabajo.error), (2, 'disco lleno'))
+        self.assertIsNone(tareas.reclamar_trabajo())
+
+    def test_libera_trabajos_colgados(self):
+        tareas.reclamar_trabajo()
+        self.assertEqual(tareas.liberar_trabajos_colgados(), 0)
+        limite = timezone.now() - timedelta(seconds=settings.PDF_COLA_TIMEOUT + 1)
+        TrabajoPDF.objects.filter(estado='procesando').update(actualizado=limite)
+
+        self.assertEqual(tareas.liberar_trabajos_colgados(), 1)
+        # Vuelve a la cola detrás de los que ya esperaban
+        reclamados = [tareas.reclamar_trabajo().cotizacion_id for _ in range(2)]
+        self.assertEqual(reclamados, [self.cotizaciones[1].pk, self.cotizaciones[0].pk])
+
+
+class ExportacionPdfTest(AlmacenTemporalMixin, TestCase):
+    """El ZIP de PDFs se arma dentro de la petición, sin pool de procesos"""
+
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user('jefe', password='clave', is_staff=True)
+        departamento = crear_departamento()
+        self.cotizaciones = [crear_cotizacion(departamento, self.usuario) for _ in range(2)]
+        self.client.force_login(self.usuario)
+
+    def test_zip_con_los_pdfs(self):
+        with mock.patch('cotizaciones.exportacion.ProcessPoolExecutor') as pool, \
+                mock.patch('cotizaciones.exportacion.connections') as conexiones:
+            response = self.client.get(reverse('cotizaciones:exportar_pdfs'))
+            contenido = b''.join(response.streaming_content)
+
+        pool.assert_not_called()
+        conexiones.close_all.assert_not_called()
+        with zipfile.ZipFile(BytesIO(contenido)) as zf:
+            self.assertEqual(
+                sorted(zf.namelist()), sorted(f'{c.numero_cotizacion}.pdf' for c in self.cotizaciones)
+            )
+            self.assertTrue(zf.read(zf.namelist()[0]).startswith(b'%PDF'))
+
+    def test_solo_personal(self):
+        self.client.force_login(User.objects.create_user('agente', password='clave'))
+        response = self.client.get(reverse('cotizaciones:exportar_pdfs'))
+        self.assertRedirects(response, reverse('cotizaciones:lista_cotizaciones'), fetch_redirect_response=False)
+
+
+class PdfCondicionalTest(AlmacenTemporalMixin, TestCase):
+    """El navegador revalida con el ETag y recibe 304 sin generar el PDF"""
+
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user('agente', password='clave')
+        self.cotizacion = crear_cotizacion(crear_departamento(), self.usuario)
+        self.client.force_login(self.usuario)
+        self.url = reverse('cotizaciones:ver_pdf', args=[self.cotizacion.pk])
+
+    def _get(self, url, **cabeceras):
+        response = self.client.get(url, headers=cabeceras)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def test_304_con_if_none_match(self):
+        etag = self._get(self.url)['ETag']
+        with mock.patch('cotizaciones.views.abrir_pdf_cotizacion') as abrir:
+            response = self._get(self.url, if_none_match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        abrir.assert_not_called()
+
+    def test_sin_last_modified(self):
+        # La fecha no cambia con la configuración del PDF: If-Modified-Since solo no da 304
+        response = self._get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        futuro = http_date(time.time() + 3600)
+        self.assertEqual(self._get(self.url, if_modified_since=futuro).status_code, 200)
+
+    def test_cambio_de_configuracion_invalida_el_etag(self):
+        etag = self._get(self.url)['ETag']
+        with override_settings(MONTO_SEPARACION=Decimal('2500')):
+            response = self._get(self.url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cambio_de_la_cotizacion_invalida_el_etag(self):
+        etag = self._get(self.url)['ETag']
+        self.cotizacion.nombre_cliente = 'Otro cliente'
+        self.cotizacion.save()
+
+        response = self._get(self.url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_imprimir(self):
+        url = reverse('cotizaciones:imprimir_cotizacion', args=[self.cotizacion.pk])
+        response = self._get(url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self._get(url, if_none_match=response['ETag']).status_code, 304)
+
+
+class RendererCompartidoTest(TestCase):
+    """Un renderer por proceso, usado a la vez desde varios hilos"""
+
+    def test_un_renderer_por_proceso(self):
+        self.assertIs(obtener_renderer(False), obtener_renderer(False))
+        self.assertIsNot(obtener_renderer(False), obtener_renderer(True))
+
+    def test_hilos_generan_el_mismo_pdf(self):
+        usuario = User.objects.create_user('agente', password='clave')
+        cotizacion = Cotizacion.objects.select_related('departamento').get(
+            pk=crear_cotizacion(crear_departamento(), usuario).pk
+        )
+        renderer = obtener_renderer(False)
+        esperado = _streams(renderer.render(cotizacion))
+        resultados = []
+
+        def generar():
+            resultados.append(_streams(renderer.render(cotizacion)))
+
+        hilos = [threading.Thread(target=generar) for _ in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(resultados), 6)
+        for streams in resultados:
+            self.assertEqual(streams, esperado)
+
+    def test_monto_de_separacion_de_settings(self):
+        usuario = User.objects.create_user('agente', password='clave')
+        cotizacion = Cotizacion.objects.select_related('departamento').get(
+            pk=crear_cotizacion(crear_departamento(), usuario).pk
+        )
+        renderer = obtener_renderer(False)
+        huella = almacen_pdf.huella_cotizacion(cotizacion)
+        self.assertIn(b'S/. 1,500.00', _texto(renderer.render(cotizacion)))
+
+        with override_settings(MONTO_SEPARACION=Decimal('2500')):
+            otro = obtener_renderer(False)
+            texto = _texto(otro.render(cotizacion))
+            self.assertNotEqual(almacen_pdf.huella_cotizacion(cotizacion), huella)
+        self.assertIsNot(otro, renderer)
+        self.assertIn(b'Separaci\\363n S/. 2,500.00', texto)
+        self.assertNotIn(b'S/. 1,500.00', texto)
+
+
+class BenchmarkRenderizadoTest(TestCase):
+    """El benchmark entrega JSON por caso y modo y no deja datos sintéticos"""
+
+    def test_json_por_caso_y_modo(self):
+        salida = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(salida), ignore_errors=True)
+        call_command(
+            'benchmark_renderizado', cotizaciones=2, repeticiones=1, calentamiento=0,
+            salida=salida, stdout=StringIO(),
+        )
+
+        with open(salida, encoding='utf-8') as f:
+            resultado = json.load(f)
+        self.assertEqual(set(resultado['casos']), {'sin_imagen', 'con_imagen'})
+        normal = resultado['casos']['con_imagen']['normal']
+        self.assertEqual(normal['pdfs'], 2)
+        self.assertLessEqual(normal['latencia_ms']['p50'], normal['latencia_ms']['max'])
+        self.assertIn('compacto_vs_normal', resultado['casos']['sin_imagen'])
+        self.assertFalse(Departamento.objects.exists())
+        self.assertFalse(Cotizacion.objects.exists())
+
+    def test_parametros_invalidos(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_renderizado', cotizaciones=0, stdout=StringIO())
+
+
+@override_settings(METRICAS_PDF_INTERVALO=3600)
+class MetricasPdfTest(TestCase):
+    """Las etapas se acumulan en memoria, se vuelcan a la base y se suman en el resumen"""
+
+    def setUp(self):
+        metricas.reiniciar()
+        self.addCleanup(metricas.reiniciar)
+
+    def test_volcado_y_resumen(self):
+        for acierto in (True, False, True):
+            with metricas.etapa('prueba') as medida:
+                medida.bytes = 100
+                medida.acierto = acierto
+        metricas.volcar()
+        with metricas.etapa('prueba') as medida:
+            medida.bytes = 300
+
+        self.assertEqual(MetricaPDF.objects.get(etapa='prueba').cantidad, 3)
+        prueba = metricas.resumen()['prueba']
+        self.assertEqual((prueba['cantidad'], prueba['bytes'], prueba['media_bytes']), (4, 600, 150))
+        self.assertEqual(prueba['tasa_aciertos'], round(2 / 3, 3))
+
+    def test_etapas_de_un_pdf(self):
+        usuario = User.objects.create_user('jefe', password='clave', is_staff=True)
+        cotizacion = crear_cotizacion(crear_departamento(), usuario)
+        ProformaRenderer(plantilla=False).render(cotizacion)
+
+        self.client.force_login(usuario)
+        etapas = self.client.get(reverse('cotizaciones:metricas_pdf')).json()['etapas']
+        self.assertEqual(etapas['pdf']['cantidad'], 1)
+        self.assertGreater(etapas['pdf']['media_bytes'], 0)
+        self.assertGreater(len(etapas), 1)
+
+
+class PdfCompactoTest(TestCase):
+    """La salida compacta es más liviana, tiene las mismas páginas y otra huella"""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        storages = {
+            **settings.STORAGES,
+            'default': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': str(settings.MEDIA_ROOT), 'base_url': settings.MEDIA_URL},
+            },
+        }
+        ajuste = override_settings(STORAGES=storages, IMAGENES_CACHE_DIR=directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        imagenes._memoria.clear()
+        self.addCleanup(imagenes._memoria.clear)
+        usuario = User.objects.create_user('agente', password='clave')
+        departamento = crear_departamento(imagen='departamentos/tp-2.jpg')
+        self.cotizacion = crear_cotizacion(departamento, usuario)
+
+    def test_mas_liviano_y_con_las_mismas_paginas(self):
+        normal = generar_pdf_cotizacion(self.cotizacion, compacto=False)
+        compacto = generar_pdf_cotizacion(self.cotizacion, compacto=True)
+
+        self.assertLess(len(compacto), len(normal))
+        self.assertEqual(_paginas(compacto), _paginas(normal))
+        self.assertTrue(compacto.startswith(b'%PDF') and compacto.rstrip().endswith(b'%%EOF'))
+        # El JPEG que ya cabe en la resolución de impresión va tal cual
+        self.assertIn(b'/DCTDecode', compacto)
+
+    def test_huella_distinta(self):
+        normal = almacen_pdf.huella_cotizacion(self.cotizacion)
+        with override_settings(PDF_COMPACTO=True):
+            self.assertNotEqual(almacen_pdf.huella_cotizacion(self.cotizacion), normal)
+
+
+class ImportacionTest(TestCase):
+    """Importación por lotes desde CSV"""
+
+    ENCABEZADO = 'nombre,dni,distrito,telefono,codigo\n'
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('agente', password='clave')
+        crear_departamento()
+
+    def _fila(self, nombre):
+        return f'{nombre},12345678,San Miguel,987654321,101\n'
+
+    def test_importa_y_reporta_filas_con_errores(self):
+        archivo = BytesIO((self.ENCABEZADO + self._fila('Ana') + 'Luis,1,Surco,987654321,999\n' + self._fila('Rosa')).encode())
+        resultado = importar_cotizaciones(archivo, 'cotizaciones.csv', self.usuario, lote=1)
+
+        self.assertEqual((resultado.filas, resultado.creadas), (3, 2))
+        self.assertEqual([e['fila'] for e in resultado.errores], [3])
+        self.assertEqual(Cotizacion.objects.count(), 2)
+
+    def test_csv_que_no_es_utf8_no_importa_nada(self):
+        # Más allá de la muestra que lee el Sniffer, después de varios lotes
+        contenido = (self.ENCABEZADO + self._fila('Ana') * 200).encode() + self._fila('Muñoz').encode('latin-1')
+        with self.assertRaisesMessage(ErrorArchivo, 'línea 202'):
+            importar_cotizaciones(BytesIO(contenido), 'cotizaciones.csv', self.usuario, lote=50)
+        self.assertFalse(Cotizacion.objects.exists())
+
+
+class PaginaCursorTest(TestCase):
+    """Las páginas por cursor recorren todo el orden, con empates de fecha, en ambos sentidos"""
+
+    def setUp(self):
+        usuario = User.objects.create_user('agente', password='clave')
+        departamento = crear_departamento()
+        cotizaciones = [crear_cotizacion(departamento, usuario) for _ in range(8)]
+        # Varias con la misma fecha: el id desempata
+        fecha = timezone.now() - timedelta(days=1)
+        for i, cotizacion in enumerate(cotizaciones):
+            Cotizacion.objects.filter(pk=cotizacion.pk).update(fecha_creacion=fecha + timedelta(hours=i // 3))
+        self.queryset = Cotizacion.objects.filter(activo=True)
+        self.orden = list(self.queryset.order_by('-fecha_creacion', '-id').values_list('pk', flat=True))
+
+    def test_recorre_hacia_adelante_y_atras(self):
+        paginas = [PaginaCursor(self.queryset, 3)]
+        while paginas[-1].cursor_siguiente:
+            paginas.append(PaginaCursor(self.queryset, 3, despues=paginas[-1].cursor_siguiente))
+
+        self.assertEqual([o.pk for p in paginas for o in p], self.orden)
+        self.assertEqual([len(p) for p in paginas], [3, 3, 2])
+        self.assertIsNone(paginas[0].cursor_anterior)
+        anterior = PaginaCursor(self.queryset, 3, antes=paginas[2].cursor_anterior)
+        self.assertEqual([o.pk for o in anterior], [o.pk for o in paginas[1]])
+        self.assertTrue(anterior.hay_anterior)
+
+    def test_cursor_invalido_es_la_primera_pagina(self):
+        self.assertIsNone(decodificar_cursor('no-es-un-cursor'))
+        self.assertEqual([o.pk for o in PaginaCursor(self.queryset, 3, despues='xx')], self.orden[:3])
+
+    def test_vista_parcial(self):
+        self.client.force_login(User.objects.get(username='agente'))
+        primera = PaginaCursor(self.queryset, 3)
+        response = self.client.get(
+            reverse('cotizaciones:lista_cotizaciones'), {'despues': primera.cursor_siguiente, 'parcial': 1}
+        )
+        self.assertEqual([c.pk for c in response.context['cotizaciones']], self.orden[3:])
+        self.assertNotContains(response, '<html')
+
+
+class BusquedaCotizacionesTest(TestCase):
+    """Búsqueda por nombre, DNI o teléfono con el índice de texto, sin importar tildes"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('agente', password='clave')
+        departamento = crear_departamento()
+        self.maria = crear_cotizacion(departamento, self.usuario, nombre_cliente='María Pérez', dni_cliente='40111222')
+        self.mario = crear_cotizacion(departamento, self.usuario, nombre_cliente='Mario Perales', dni_cliente='40333444')
+        self.juan = crear_cotizacion(
+            departamento, self.usuario, nombre_cliente='Juan Quispe', dni_cliente='70999888', telefono_cliente='912345678'
+        )
+        self.queryset = Cotizacion.objects.filter(activo=True)
+
+    def _buscar(self, texto):
+        return [c.pk for c in filtrar_busqueda(self.queryset, {'q': texto})]
+
+    def test_por_nombre_dni_y_telefono(self):
+        self.assertEqual(self._buscar('perez'), [self.maria.pk])
+        self.assertEqual(sorted(self._buscar('mar per')), sorted([self.maria.pk, self.mario.pk]))
+        self.assertEqual(self._buscar('70999888'), [self.juan.pk])
+        self.assertEqual(self._buscar('912345'), [self.juan.pk])
+
+    def test_sin_importar_tildes_ni_mayusculas(self):
+        self.assertEqual(self._buscar('PEREZ'), [self.maria.pk])
+        self.assertEqual(self._buscar('pérez'), [self.maria.pk])
+        self.assertEqual(self._buscar('Marîa'), [self.maria.pk])
+
+    def test_postgresql_quita_tildes_en_el_indice_y_en_la_consulta(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            sql, parametros = busqueda.buscar(self.queryset, 'pérez').query.sql_with_params()
+        documento = busqueda.DOCUMENTO_PG
+        self.assertTrue(documento.startswith(f'{busqueda.SIN_TILDES}('))
+        self.assertIn(f'{documento} ILIKE {busqueda.SIN_TILDES}(%s)', sql)
+        self.assertIn(f'word_similarity({busqueda.SIN_TILDES}(%s), {documento})', sql)
+        self.assertIn('%pérez%', parametros)
+
+    def test_el_indice_sigue_los_update_masivos(self):
+        Cotizacion.objects.filter(pk=self.juan.pk).update(nombre_cliente='Juana Pérez')
+        self.assertEqual(sorted(self._buscar('perez')), sorted([self.maria.pk, self.juan.pk]))
+        self.assertEqual(self._buscar('quispe'), [])
+
+    @sin_manifiesto
+    def test_vista_con_filtros(self):
+        self.client.force_login(self.usuario)
+        response = self.client.get(reverse('cotizaciones:lista_cotizaciones'), {'q': 'maria'})
+        self.assertEqual([c.pk for c in response.context['cotizaciones']], [self.maria.pk])
+        self.assertTrue(response.context['busqueda'])
+
+
+@sin_manifiesto
+class RevisarIndicesTest(TestCase):
+    """revisar_indices hace EXPLAIN de las consultas de cada pantalla y marca los recorridos sin índice"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        crear_cotizacion(crear_departamento(), self.usuario, nombre_cliente='María Pérez')
+
+    def test_todas_las_pantallas(self):
+        salida = StringIO()
+        call_command('revisar_indices', stdout=salida)
+        self.assertIn('Búsqueda por nombre', salida.getvalue())
+        self.assertIn('Todas las consultas usan índices.', salida.getvalue())
+
+    def test_marca_el_recorrido_de_una_tabla_grande(self):
+        comando = RevisarIndices(stdout=StringIO())
+        comando.min_filas, comando.ver_sql, comando.filas_por_tabla = 0, False, {}
+        sin_indice = Cotizacion.objects.filter(observaciones='x').order_by().query.sql_with_params()
+        con_indice = Cotizacion.objects.filter(numero_cotizacion='COT_1').order_by().query.sql_with_params()
+
+        self.assertEqual(comando.revisar(*sin_indice), 1)
+        self.assertEqual(comando.revisar(*con_indice), 0)
+
+    def test_sin_superusuario(self):
+        User.objects.filter(is_superuser=True).update(is_superuser=False)
+        with self.assertRaises(CommandError):
+            call_command('revisar_indices', stdout=StringIO())
+
+
+class CuadriculaDepartamentosTest(TestCase):
+    """La cuadrícula agrupa por piso entero, del más alto al primero"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for codigo, piso in (('302', 3), ('301', 3), ('101', 1), ('2001', 20), ('SP', None)):
+            crear_departamento(codigo, pisos=piso)
+
+    def test_filas_por_piso(self):
+        filas = _filas_cuadricula()
+
+        self.assertEqual([piso for piso, _ in filas], list(range(20, 0, -1)))
+        por_piso = {piso: [d['codigo'] for d in deptos] for piso, deptos in filas}
+        self.assertEqual(por_piso[3], ['301', '302'])
+        self.assertEqual(por_piso[20], ['2001'])
+        self.assertEqual(por_piso[2], [])
+        self.assertNotIn('SP', [d['codigo'] for _, deptos in filas for d in deptos])
+
+    def test_pisos_minimos(self):
+        Departamento.objects.filter(pisos__gt=3).delete()
+        self.assertEqual(_filas_cuadricula()[0][0], PISOS_MINIMOS)
+
+    @sin_manifiesto
+    def test_vendidos_bloqueados_para_agentes(self):
+        Departamento.objects.filter(codigo='101').actualizar_catalogo(estado='vendido')
+        self.client.force_login(User.objects.create_user('agente', password='clave'))
+        response = self.client.get(reverse('cotizaciones:lista_departamentos'))
+
+        self.assertContains(response, 'data-codigo="301"')
+        self.assertNotContains(response, 'data-codigo="101"')
+        self.assertContains(response, 'vendido bloqueado')
+
+
+@sin_manifiesto
+class CacheCuadriculaTest(TestCase):
+    """La cuadrícula sale de la caché hasta que cambia algún departamento"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.departamento = crear_departamento('101', precio=Decimal('250000'))
+        self.client.force_login(User.objects.create_user('jefe', password='clave', is_staff=True))
+        self.url = reverse('cotizaciones:lista_departamentos')
+
+    def _consultas_a_departamentos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url)
+        tablas = [c['sql'] for c in consultas.captured_queries if 'FROM "cotizaciones_departamento"' in c['sql']]
+        return response, len(tablas)
+
+    def test_sin_consultas_con_la_cuadricula_en_cache(self):
+        self.assertEqual(self._consultas_a_departamentos()[1], 1)
+        response, consultas = self._consultas_a_departamentos()
+        self.assertEqual(consultas, 0)
+        self.assertContains(response, 'data-codigo="101"')
+
+    def test_cambios_invalidan_la_cache(self):
+        self.client.get(self.url)
+
+        self.departamento.precio = Decimal('260000')
+        self.departamento.save()
+        self.assertContains(self.client.get(self.url), 'data-precio="260000,00"')
+
+        Departamento.objects.filter(pk=self.departamento.pk).actualizar_catalogo(estado='vendido')
+        self.assertContains(self.client.get(self.url), 'apartment-cell vendido')
+
+        crear_departamento('102')
+        self.assertContains(self.client.get(self.url), 'data-codigo="102"')
+
+        self.departamento.delete()
+        self.assertNotContains(self.client.get(self.url), 'data-codigo="101"')
+
+    def test_guardar_sin_cambios_no_invalida(self):
+        self.client.get(self.url)
+        self.departamento.save()
+        self.assertEqual(self._consultas_a_departamentos()[1], 0)
+
+
+class CatalogoDepartamentosTest(TestCase):
+    """La API del catálogo devuelve con ?desde= cada cambio posterior y 304 si no hubo cambios"""
+
+    def setUp(self):
+        self.primero = crear_departamento('101')
+        self.segundo = crear_departamento('102')
+        self.client.force_login(User.objects.create_user('agente', password='clave'))
+        self.url = reverse('cotizaciones:api_departamentos')
+
+    def _codigos(self, desde):
+        datos = self.client.get(self.url, {'desde': desde}).json()
+        return datos['version'], sorted(d['codigo'] for d in datos['departamentos'])
+
+    def test_desde_devuelve_cada_cambio(self):
+        version, _ = self._codigos(0)
+        self.primero.precio = Decimal('251000')
+        self.primero.save()
+        self.segundo.estado = 'separado'
+        self.segundo.save()
+
+        nueva, codigos = self._codigos(version)
+        self.assertEqual(codigos, ['101', '102'])
+        self.assertEqual(nueva, version + 2)
+        self.assertEqual(self._codigos(nueva)[1], [])
+
+        eliminado = self.segundo.pk
+        self.segundo.delete()
+        datos = self.client.get(self.url, {'desde': nueva}).json()
+        self.assertEqual(datos['eliminados'], [eliminado])
+
+    def test_guardar_sin_cambios_no_publica(self):
+        version, _ = self._codigos(0)
+        self.primero.descripcion = 'Vista a la calle'
+        self.primero.save()
+        self.assertEqual(self._codigos(version), (version, []))
+
+    def test_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, headers={'if_none_match': etag}).status_code, 304)
+        self.primero.precio = Decimal('251000')
+        self.primero.save()
+        self.assertEqual(self.client.get(self.url, headers={'if_none_match': etag}).status_code, 200)
+
+
+@override_settings(SSE_LATIDO=60)
+class EventosDepartamentosTest(TestCase):
+    """Cada conexión SSE recibe la versión actual y luego cada versión publicada"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('agente', password='clave')
+        crear_departamento()
+        self.version = version_actual()
+        self.difusor = DifusorLocal(intervalo=3600)
+        parche = mock.patch('cotizaciones.views.obtener_difusor', return_value=self.difusor)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.url = reverse('cotizaciones:eventos_departamentos')
+
+    async def test_recibe_las_versiones_publicadas(self):
+        await self.async_client.aforce_login(self.usuario)
+        response = await self.async_client.get(self.url)
+        eventos = aiter(response.streaming_content)
+        try:
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            self.assertTrue((await anext(eventos)).startswith(b'retry: '))
+            self.assertEqual(await anext(eventos), f'id: {self.version}\ndata: {self.version}\n\n'.encode())
+
+            siguiente = asyncio.ensure_future(anext(eventos))
+            await asyncio.sleep(0)
+            self.difusor.publicar(self.version + 1)
+            self.assertEqual(
+                await asyncio.wait_for(siguiente, 5),
+                f'id: {self.version + 1}\ndata: {self.version + 1}\n\n'.encode(),
+            )
+        finally:
+            await eventos.aclose()
+
+    def test_bajo_wsgi_responde_204(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+
+
+@sin_manifiesto
+class ResumenCotizacionesTest(TestCase):
+    """Cada forma de cambiar cotizaciones deja el resumen igual que reconstruirlo desde cero"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.departamentos = [crear_departamento('101'), crear_departamento('102', exceso_precio=Decimal('20000'))]
+        self.cotizaciones = [
+            crear_cotizacion(
+                self.departamentos[i % 2], self.usuario, distrito_cliente=distrito,
+                tipo_descuento='PORC', valor_descuento=Decimal(i),
+            )
+            for i, distrito in enumerate(['San Miguel', ' san  miguel', 'Surco', 'Lince'])
+        ]
+        # Una del mes pasado, para que haya más de un mes
+        Cotizacion.objects.filter(pk=self.cotizaciones[3].pk).update(fecha_creacion=timezone.now() - timedelta(days=40))
+        resumen_ventas.reconstruir()
+        self.client.force_login(self.usuario)
+
+    def assertResumenCoincide(self):
+        campos = ('dimension', 'clave', 'mes', 'cantidad', 'suma_precio_final', 'suma_descuento')
+        incremental = set(ResumenCotizaciones.objects.filter(cantidad__gt=0).values_list(*campos))
+        resumen_ventas.reconstruir()
+        self.assertEqual(incremental, set(ResumenCotizaciones.objects.values_list(*campos)))
+        self.assertTrue(incremental)
+
+    def test_crear(self):
+        crear_cotizacion(self.departamentos[1], self.usuario, medio_contacto='Facebook', valor_descuento=Decimal('1000'), tipo_descuento='MONTO')
+        self.assertResumenCoincide()
+
+    def test_editar(self):
+        cotizacion = self.cotizaciones[0]
+        cotizacion.distrito_cliente = 'Magdalena'
+        cotizacion.valor_descuento = Decimal('2.5')
+        cotizacion.save()
+        self.assertResumenCoincide()
+
+    def test_desactivar(self):
+        response = self.client.post(reverse('cotizaciones:eliminar_cotizacion', args=[self.cotizaciones[1].pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Cotizacion.objects.get(pk=self.cotizaciones[1].pk).activo)
+        self.assertResumenCoincide()
+
+    def test_desactivar_en_el_admin(self):
+        self.client.post(reverse('admin:cotizaciones_cotizacion_changelist'), {
+            'action': 'desactivar',
+            helpers.ACTION_CHECKBOX_NAME: [self.cotizaciones[0].pk, self.cotizaciones[3].pk],
+        })
+        self.assertEqual(Cotizacion.objects.filter(activo=True).count(), 2)
+        self.assertResumenCoincide()
+
+    def test_borrar_en_el_admin(self):
+        self.client.post(reverse('admin:cotizaciones_cotizacion_changelist'), {
+            'action': 'delete_selected', 'post': 'yes',
+            helpers.ACTION_CHECKBOX_NAME: [self.cotizaciones[1].pk, self.cotizaciones[2].pk],
+        })
+        self.assertEqual(Cotizacion.objects.count(), 2)
+        self.assertResumenCoincide()
+
+    def test_borrar_el_departamento(self):
+        self.departamentos[0].delete()
+        self.assertResumenCoincide()
+
+    def test_importar(self):
+        archivo = BytesIO(
+            'nombre,dni,distrito,telefono,codigo,descuento\n'
+            'Ana,12345678,Surco,987654321,101,3\n'
+            'Luis,87654321,Lince ,987654321,102,0\n'.encode()
+        )
+        self.assertEqual(importar_cotizaciones(archivo, 'cotizaciones.csv', self.usuario).creadas, 2)
+        self.assertResumenCoincide()
+
+
+class ExportacionTablasTest(TestCase):
+    """CSV y XLSX enviados por partes, con las columnas que acepta la importación"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('jefe', password='clave', is_staff=True)
+        departamento = crear_departamento(exceso_precio=Decimal('10000'))
+        self.cotizaciones = [
+            crear_cotizacion(departamento, self.usuario, nombre_cliente=f'Cliente Ñandú {i}', valor_descuento=Decimal(i) / 2)
+            for i in range(5)
+        ]
+        self.client.force_login(self.usuario)
+        parche = mock.patch('cotizaciones.exportacion.LOTE_EXPORTACION', 2)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _descargar(self, **parametros):
+        response = self.client.get(reverse('cotizaciones:exportar_cotizaciones'), parametros)
+        self.assertTrue(response.streaming)
+        partes = list(response.streaming_content)
+        return response, partes
+
+    def test_csv_por_lotes(self):
+        response, partes = self._descargar(formato='csv')
+
+        self.assertEqual(len(partes), 4)  # encabezado y tres lotes de hasta 2 filas
+        self.assertIn('cotizaciones_', response['Content-Disposition'])
+        filas = list(csv.DictReader(StringIO(b''.join(partes).decode('utf-8-sig'))))
+        self.assertEqual(len(filas), 5)
+        por_numero = {f['numero_cotizacion']: f for f in filas}
+        for cotizacion in self.cotizaciones:
+            fila = por_numero[cotizacion.numero_cotizacion]
+            self.assertEqual(fila['nombre_cliente'], cotizacion.nombre_cliente)
+            self.assertEqual(Decimal(fila['precio_final']), cotizacion.precio_final)
+            self.assertEqual(Decimal(fila['precio_lista']), Decimal('260000'))
+
+    def test_el_csv_se_puede_importar(self):
+        _, partes = self._descargar(formato='csv')
+        resultado = importar_cotizaciones(BytesIO(b''.join(partes)), 'exportadas.csv', self.usuario)
+        self.assertEqual((resultado.creadas, resultado.errores), (5, []))
+
+    def test_xlsx(self):
+        _, partes = self._descargar(formato='xlsx')
+        libro = load_workbook(BytesIO(b''.join(partes)), read_only=True)
+        filas = list(libro.active.iter_rows(values_only=True))
+        libro.close()
+
+        self.assertEqual(filas[0], tuple(encabezado for encabezado, _ in COLUMNAS_COTIZACIONES))
+        self.assertEqual(len(filas), 6)
+        self.assertIn('Cliente Ñandú 0', [f[2] for f in filas[1:]])
+
+    def test_formato_no_soportado(self):
+        response = self.client.get(reverse('cotizaciones:exportar_cotizaciones'), {'formato': 'pdf'})
+        self.assertEqual(response.status_code, 302)
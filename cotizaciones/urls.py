@@ -20,8 +20,20 @@ urlpatterns = [
     path('cotizaciones/<int:pk>/editar/', views.editar_cotizacion, name='editar_cotizacion'),
     path('ver_pdf/<int:pk>/', views.ver_pdf, name='ver_pdf'),
     path('descargar_pdf/<int:pk>/', views.descargar_pdf, name='descargar_pdf'),
+    path('cotizaciones/pdf/<int:pk>/estado/', views.estado_pdf, name='estado_pdf'),
+    path('cotizaciones/<int:pk>/financiamiento/', views.financiamiento_cotizacion, name='financiamiento_cotizacion'),
+    path('cotizaciones/exportar/pdf/', views.exportar_pdfs, name='exportar_pdfs'),
+    path('cotizaciones/exportar/', views.exportar_cotizaciones, name='exportar_cotizaciones'),
+    path('cotizaciones/importar/', views.importar_cotizaciones, name='importar_cotizaciones'),
+    path('cotizaciones/metricas/pdf/', views.metricas_pdf, name='metricas_pdf'),
+    path('cotizaciones/tablero/', views.tablero_ventas, name='tablero_ventas'),
     # Departamentos
     path('departamentos/', views.lista_departamentos, name='lista_departamentos'),
+    path('departamentos/api/', views.api_departamentos, name='api_departamentos'),
+    path('departamentos/eventos/', views.eventos_departamentos, name='eventos_departamentos'),
+    path('departamentos/exportar/', views.exportar_departamentos, name='exportar_departamentos'),
+    path('departamentos/reajuste/', views.reajuste_precios, name='reajuste_precios'),
+    path('departamentos/simulador/', views.simulador_precios, name='simulador_precios'),
     path('departamentos/nuevo/', views.nuevo_departamento, name='nuevo_departamento'),
     path('departamentos/editar/<int:pk>/', views.editar_departamento, name='editar_departamento'),
     path('departamentos/eliminar/<int:pk>/', views.eliminar_departamento, name='eliminar_departamento'),
@@ -6,16 +6,21 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, cm
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
-from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
 from reportlab.platypus.flowables import Flowable
 from io import BytesIO
 from datetime import datetime, timedelta
 from django.templatetags.static import static
 from django.conf import settings
 import os
-import requests
-from PIL import Image as PILImage
+import logging
 import json
+import threading
+
+from . import financiamiento, metricas, precios
+from .imagenes import ImagenCodificada, obtener_imagen_departamento
+
+logger = logging.getLogger(__name__)
 
 
 class LineFlowable(Flowable):
@@ -33,27 +38,88 @@ class LineFlowable(Flowable):
         self.canv.setLineWidth(0.5)
         self.canv.line(0, self.height, self.width, self.height)
 
-def generar_pdf_cotizacion(cotizacion):
-    """Genera un PDF para la cotización estilo MyE Grupo Inmobiliario"""
-
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=A4,
-        rightMargin=1.5*cm,
-        leftMargin=1.5*cm,
-        topMargin=1*cm,
-        bottomMargin=1*cm
-    )
-    
-    # Contenedor para los elementos del PDF
-    elements = []
-    
-    # Estilos
+class _BloqueCompartido:
+    """Flowable fijo ya maquetado, compartido por todos los documentos del proceso"""
+    def __init__(self, flowable):
+        self.flowable = flowable
+        self.lock = threading.Lock()
+        self.ancho_disponible = None
+        self.medidas = None
+
+
+class BloqueFijo(Flowable):
+    """
+    Parte fija de la proforma maquetada una sola vez por proceso. Se crea
+    uno por documento, porque el frame le asigna canv y _frame, y delega
+    tamaño y dibujo en el bloque compartido. El resultado es idéntico al
+    de maquetar el flowable original en cada PDF.
+    """
+    def __init__(self, compartido):
+        Flowable.__init__(self)
+        self.compartido = compartido
+
+    def __repr__(self):
+        return "BloqueFijo(%r)" % self.compartido.flowable
+
+    def wrap(self, availWidth, availHeight):
+        compartido = self.compartido
+        with compartido.lock:
+            if compartido.ancho_disponible != availWidth:
+                compartido.medidas = compartido.flowable.wrap(availWidth, availHeight)
+                compartido.ancho_disponible = availWidth
+            self.width, self.height = compartido.medidas
+            return compartido.medidas
+
+    def split(self, availWidth, availHeight):
+        # Cerca del final de la página se parte como el flowable original; las
+        # partes son objetos nuevos de este documento y ya no se comparten
+        compartido = self.compartido
+        with compartido.lock:
+            compartido.flowable.wrap(availWidth, availHeight)
+            compartido.ancho_disponible = None
+            partes = compartido.flowable.split(availWidth, availHeight)
+        return [BloqueFijo(compartido) if parte is compartido.flowable else parte for parte in partes]
+
+    def getSpaceBefore(self):
+        return self.compartido.flowable.getSpaceBefore()
+
+    def getSpaceAfter(self):
+        return self.compartido.flowable.getSpaceAfter()
+
+    def getKeepWithNext(self):
+        return self.compartido.flowable.getKeepWithNext()
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        # El flowable original es compartido entre hilos: se dibuja de a uno
+        with self.compartido.lock:
+            self.compartido.flowable.drawOn(canvas, x, y, _sW)
+
+
+class ImagenFija(Flowable):
+    """Dibuja una ImagenCodificada con el tamaño indicado, como Image"""
+    def __init__(self, imagen, width, height, hAlign='CENTER'):
+        Flowable.__init__(self)
+        self.imagen = imagen
+        self.drawWidth = width
+        self.drawHeight = height
+        self.hAlign = hAlign
+
+    def __repr__(self):
+        return "ImagenFija(%s)" % self.imagen.nombre
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        self.imagen.dibujar(self.canv, 0, 0, self.drawWidth, self.drawHeight)
+
+
+def _crear_estilos():
+    """Estilos de párrafo usados en la proforma"""
     styles = getSampleStyleSheet()
-    
-    # Estilos personalizados
-    titulo_empresa = ParagraphStyle(
+
+    estilos = {}
+    estilos['titulo_empresa'] = ParagraphStyle(
         'TituloEmpresa',
         parent=styles['Normal'],
         fontSize=16,
@@ -62,7 +128,7 @@ def generar_pdf_cotizacion(cotizacion):
         textColor=colors.HexColor('#2c3e50')
     )
     
-    titulo_proforma = ParagraphStyle(
+    estilos['titulo_proforma'] = ParagraphStyle(
         'TituloProforma',
         parent=styles['Normal'],
         fontSize=20,
@@ -71,7 +137,7 @@ def generar_pdf_cotizacion(cotizacion):
         textColor=colors.HexColor('#8B0000')
     )
     
-    numero_proforma = ParagraphStyle(
+    estilos['numero_proforma'] = ParagraphStyle(
         'NumeroProforma',
         parent=styles['Normal'],
         fontSize=18,
@@ -80,7 +146,7 @@ def generar_pdf_cotizacion(cotizacion):
         textColor=colors.red
     )
     
-    subtitulo_style = ParagraphStyle(
+    estilos['subtitulo'] = ParagraphStyle(
         'Subtitulo',
         parent=styles['Normal'],
         fontSize=12,
@@ -89,130 +155,35 @@ def generar_pdf_cotizacion(cotizacion):
         spaceAfter=4
     )
     
-    normal_style = ParagraphStyle(
-        'NormalCustom',
-        parent=styles['Normal'],
-        fontSize=11,
-        fontName='Helvetica'
-    )
-    
-    small_style = ParagraphStyle(
+    estilos['small'] = ParagraphStyle(
         'Small',
         parent=styles['Normal'],
         fontSize=9,
         fontName='Helvetica'
     )
-    
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')
-    logo = Image(logo_path, width=120, height=70)
-    logo_table = Table([[logo]], colWidths=[100])
-    logo_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
 
-    logo_table.hAlign = 'LEFT'
-    elements.append(logo_table)
-
-    # ENCABEZADO CON LOGO Y NÚMERO DE PROFORMA
-    header_data = [
-        [
-            Paragraph('<b>MyE Grupo Inmobiliario SAC</b>', titulo_empresa),
-            '',
-            Paragraph('PROFORMA', titulo_proforma)
-        ],
-        [
-            Paragraph('Construyendo tu Futuro<br/>Dirección del Proyecto: Av. Pío XII 318 San Miguel', small_style),
-            '',
-            Paragraph(f'N° {cotizacion.numero_cotizacion.replace("cotizacion_", "00")}', numero_proforma)
-        ]
-    ]
-    
-    header_table = Table(header_data, colWidths=[10*cm, 2*cm, 6*cm])
-    header_table.setStyle(TableStyle([
+    estilos['normal'] = ParagraphStyle('normal_style', fontName='Helvetica', fontSize=10)
+    estilos['notas'] = ParagraphStyle('NotasStyle', parent=estilos['small'], fontSize=8)
+    return estilos
+
+
+def _crear_estilos_tabla():
+    """Estilos de las tablas con datos de la cotización"""
+    estilos = {}
+    estilos['encabezado'] = TableStyle([
         ('ALIGN', (0, 0), (0, -1), 'LEFT'),
         ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
         ('VALIGN', (0, 0), (-1, -1), 'TOP'),
         ('SPAN', (0, 1), (1, 1)),
-    ]))
-    
-    elements.append(header_table)
-    elements.append(Spacer(1, 10))
-    
-    # SECCIÓN CLIENTE
-    elements.append(Paragraph('<b>CLIENTE</b>', subtitulo_style))
-    
-    # Datos del cliente en formato de líneas con puntos
-    fecha_actual = cotizacion.fecha_creacion.strftime('%d/%m/%Y')
-    fecha_vencimiento = (cotizacion.fecha_creacion + timedelta(days=15)).strftime('%d/%m/%Y')
-    
-    cliente_data = [
-        ['Nombre:', cotizacion.nombre_cliente, f'Fecha: {fecha_actual}'],
-        ['DNI:', cotizacion.dni_cliente, f'Presupuesto válido hasta: {fecha_vencimiento}'],
-        ['Domicilio:', cotizacion.direccion_cliente or '', ''],
-        ['Teléfono:', cotizacion.telefono_cliente or '', ''],
-        ['E-mail:', cotizacion.email_cliente or '', ''],
-        ['Distrito:', cotizacion.distrito_cliente or '',f'Medio de Captación: {cotizacion.medio_contacto}'],
-    ]
-    
-    bold_style = ParagraphStyle('bold_style', fontName='Helvetica-Bold', fontSize=10)
-    normal_style = ParagraphStyle('normal_style', fontName='Helvetica', fontSize=10)
-
-    for row in cliente_data:
-
-        left_text = Paragraph(f"<b>{row[0]}</b> {row[1]}", normal_style)
-        right_text = Paragraph(row[2], normal_style)
-        data_table = Table(
-            [[left_text, right_text]],
-            colWidths=[8*cm, 10*cm]
-        )
-        
-        data_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),   # Primera columna a la izquierda
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),  # Segunda columna a la derecha
-            ('VALIGN', (0, 0), (-1, -1), 'BOTTOM'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('TOPPADDING', (0, 0), (-1, -1), 2),
-        ]))
-        elements.append(data_table)
-    
-    
-    # --- TABLA DE COTIZACIÓN ---
-    depto = cotizacion.departamento
-    precio_base_asignado = float(depto.precio) + float(depto.exceso_precio)
-
-    if not cotizacion.datos_estaticos:
-        datos_estaticos = {
-            "nombre": depto.nombre,
-            "codigo": depto.codigo.replace("DEP-", ""),
-            "area_m2": f"{depto.area_m2} m²",
-            "area_libre": f"{depto.area_libre} m²",
-            "precio": f"S/. {precio_base_asignado:,.2f}",
-        }
-        cotizacion.datos_estaticos = datos_estaticos
-
-        try:
-            cotizacion.save()
-        except Exception:
-            pass
-
-    else:
-        datos_estaticos = cotizacion.datos_estaticos
-
-    cotizacion_header = ['COTIZACIÓN', 'N°', 'Área techada', 'Área Libre', 'Precio']
-    cotizacion_data = [
-        cotizacion_header,
-        [
-            datos_estaticos["nombre"],
-            datos_estaticos["codigo"],
-            datos_estaticos["area_m2"],
-            datos_estaticos["area_libre"],
-            datos_estaticos["precio"],
-        ]
-    ]
-    
-    cotizacion_table = Table(cotizacion_data, colWidths=[5*cm, 2*cm, 3*cm, 3*cm, 4*cm])
-    cotizacion_table.setStyle(TableStyle([
+    ])
+    estilos['cliente'] = TableStyle([
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),   # Primera columna a la izquierda
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),  # Segunda columna a la derecha
+        ('VALIGN', (0, 0), (-1, -1), 'BOTTOM'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 2),
+    ])
+    estilos['cotizacion'] = TableStyle([
         # Encabezado
         ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
@@ -226,34 +197,8 @@ def generar_pdf_cotizacion(cotizacion):
         ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
         ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
         ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
-    ]))
-    
-    elements.append(cotizacion_table)
-    elements.append(Spacer(1, 15))
-   
-    # Tabla de descuento y precio total
-    resumen_data = []
-
-    if cotizacion.tipo_descuento == 'PORC' and cotizacion.valor_descuento > 0:
-        descuento_monto = float(precio_base_asignado) * float(cotizacion.valor_descuento) / 100
-        resumen_data.append([
-            Paragraph(f'<b>Descuento ({cotizacion.valor_descuento}%)</b>', normal_style),
-            f'S/. {descuento_monto:,.2f}'
-        ])
-    elif cotizacion.tipo_descuento == 'MONTO' and cotizacion.valor_descuento > 0:
-        resumen_data.append([
-            Paragraph('<b>Descuento </b>', normal_style),
-            f'S/. {cotizacion.valor_descuento:,.2f}'
-        ])
-
-    # Siempre mostrar precio final
-    resumen_data.append([
-        Paragraph('<b>Precio Total</b>', subtitulo_style),
-        f'S/. {cotizacion.precio_final:,.2f}'
     ])
-    
-    resumen_table = Table(resumen_data, colWidths=[5*cm, 3*cm])
-    resumen_table.setStyle(TableStyle([
+    estilos['resumen'] = TableStyle([
         ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#e8f4f8')),
         ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
         ('FONTSIZE', (0, 0), (-1, -1), 11),
@@ -261,23 +206,8 @@ def generar_pdf_cotizacion(cotizacion):
         ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#34495e')),
         ('TOPPADDING', (0, 0), (-1, -1), 10),
         ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-    ]))
-
-    cuota_inicial = float(cotizacion.cuota_inicial) if cotizacion.cuota_inicial else 0
-    separacion = 1500
-    saldo_financiar = float(cotizacion.precio_final) - cuota_inicial - separacion
-
-    # FORMA DE PAGO Y RESUMEN DE PRECIOS
-    forma_pago_data = [
-        [Paragraph('<b>FORMA DE PAGO</b>', subtitulo_style), '', Paragraph('<b>MONTOS</b>', subtitulo_style)],
-        ['PRECIO', '', f'S/. {cotizacion.precio_final:,.2f}'],
-        ['CUOTA INICIAL', '', f'S/. {cuota_inicial:,.2f}'],
-        ['SEPARACIÓN','', f'S/. {separacion:,.2f}'],
-        ['SALDO A FINANCIAR', '', f'S/. {saldo_financiar:,.2f}'],
-    ]
-    
-    forma_pago_table = Table(forma_pago_data, colWidths=[6*cm, 0*cm, 3*cm])
-    forma_pago_table.setStyle(TableStyle([
+    ])
+    estilos['forma_pago'] = TableStyle([
         ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
         ('FONTNAME', (2, 0), (2, 0), 'Helvetica-Bold'),
         ('FONTSIZE', (0, 0), (-1, -1), 10),
@@ -285,17 +215,22 @@ def generar_pdf_cotizacion(cotizacion):
         ('LINEBELOW', (0, 0), (-1, 0), 1, colors.grey),
         ('LINEBELOW', (0, -1), (-1, -1), 1, colors.black),
         ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-    ]))
-    
-
-    
-    # Agregar tablas de forma de pago
-    tabla_contenedora = Table(
-        [[forma_pago_table, resumen_table]],
-        colWidths=[11*cm, 7*cm]  # Ajusta si deseas más o menos espacio
-    )
-
-    tabla_contenedora.setStyle(TableStyle([
+    ])
+    estilos['financiamiento'] = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('TOPPADDING', (0, 0), (-1, -1), 2),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
+    ])
+    estilos['contenedora'] = TableStyle([
         ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Ambas arriba, a la misma altura
         ('ALIGN', (0, 0), (0, 0), 'LEFT'),
         ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
@@ -303,21 +238,39 @@ def generar_pdf_cotizacion(cotizacion):
         ('RIGHTPADDING', (0, 0), (-1, -1), 6),
         ('TOPPADDING', (0, 0), (-1, -1), 2),
         ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ])
+    return estilos
+
+
+def _bloques_estaticos(estilos, plantilla=False, compacto=False):
+    """Partes de la proforma que son iguales en todas las cotizaciones"""
+    small_style = estilos['small']
+    subtitulo_style = estilos['subtitulo']
+    bloques = {}
+
+    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')
+    if plantilla or compacto:
+        logo = ImagenFija(ImagenCodificada(logo_path, compacta=compacto), width=120, height=70)
+    else:
+        logo = Image(logo_path, width=120, height=70)
+    logo_table = Table([[logo]], colWidths=[100])
+    logo_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
     ]))
 
-    elements.append(tabla_contenedora)
-    elements.append(Spacer(1, 10))
-    
+    logo_table.hAlign = 'LEFT'
+    bloques['logo'] = logo_table
+
     # PROCESO DE COMPRA
-    elements.append(Paragraph('<b>PROCESO DE COMPRA:</b>', subtitulo_style))
-    proceso_texto = """
-    1.- Pago de Separación S/. 1,500.00<br/>
+    bloques['proceso_titulo'] = Paragraph('<b>PROCESO DE COMPRA:</b>', subtitulo_style)
+    proceso_texto = f"""
+    1.- Pago de Separación S/. {precios.monto_separacion():,.2f}<br/>
     2.- Aprobación de Crédito<br/>
     3.- Cancelación de Cuota Inicial y firma de minuta<br/>
     4.- Desembolso por parte del Banco del saldo financiado.
     """
-    elements.append(Paragraph(proceso_texto, small_style))
-    elements.append(Spacer(1, 5))
+    bloques['proceso'] = Paragraph(proceso_texto, small_style)
     
     # INFORMACIÓN DE LA EMPRESA
     empresa_data = [
@@ -335,11 +288,10 @@ def generar_pdf_cotizacion(cotizacion):
         ('TOPPADDING', (0, 0), (-1, -1), 5),
         ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
     ]))
-    elements.append(empresa_table)
-    elements.append(Spacer(1, 5))
+    bloques['empresa'] = empresa_table
     
     # NOTAS Y CONDICIONES
-    elements.append(Paragraph('<b>Notas y Condiciones:</b>', subtitulo_style))
+    bloques['notas_titulo'] = Paragraph('<b>Notas y Condiciones:</b>', subtitulo_style)
     notas_texto = """
     1. Luego del pago por concepto de separación, el Cliente tiene 10 días útiles para entregar todos los documentos a la Entidad Financiera<br/>
     2. La Presente proforma no implica reserva del inmueble cotizado<br/>
@@ -349,8 +301,7 @@ def generar_pdf_cotizacion(cotizacion):
     6. Las imágenes entregadas en material gráfico, departamento, áreas, medios digitales, entre otros son referenciales. Las características del proyecto indicadas en los anexos del contrato de compra y venta.<br/>
     7. Nuestro proyecto cuenta con una edificación sismo resistente que cumple con lo dispuesto en el Reglamento Nacional de Edificaciones y todas las técnicas de la materia.
     """
-    elements.append(Paragraph(notas_texto, ParagraphStyle('NotasStyle', parent=small_style, fontSize=8)))
-    elements.append(Spacer(1, 5))
+    bloques['notas'] = Paragraph(notas_texto, estilos['notas'])
     
     # INFORMES
     informes_data = [
@@ -371,44 +322,336 @@ def generar_pdf_cotizacion(cotizacion):
         ('LEFTPADDING', (0, 0), (-1, -1), 10),
         ('RIGHTPADDING', (0, 0), (-1, -1), 10),
     ]))
-    elements.append(informes_table)
+    bloques['informes'] = informes_table
+    return bloques
 
 
+# Fuentes usadas por la proforma; se cargan sus métricas al crear el renderer
+FUENTES = ['Helvetica', 'Helvetica-Bold']
 
-    depto_image_path = None
+# Tamaño en puntos con el que se imprime la imagen del departamento
+TAMANO_IMAGEN_DEPTO = (550, 750)
+
+
+class ProformaRenderer:
+    """
+    Genera los PDFs de las cotizaciones. Estilos, estilos de tabla, métricas
+    de las fuentes, logo decodificado y partes fijas se preparan al crearlo;
+    cada render solo maqueta los datos de la cotización. Una misma instancia
+    se puede usar desde varios hilos.
+    Con plantilla=False las partes fijas se maquetan en cada documento, como
+    antes, y la instancia sirve para un solo PDF.
+    Con compacto se prioriza el tamaño del archivo: imágenes a la resolución
+    de impresión, JPEG sin recodificar y streams binarios comprimidos.
+    """
+    def __init__(self, plantilla=True, compacto=False):
+        for fuente in FUENTES:
+            pdfmetrics.getFont(fuente)
+        self.plantilla = plantilla
+        self.compacto = compacto
+        self.estilos = _crear_estilos()
+        self.estilos_tabla = _crear_estilos_tabla()
+        financiamiento.precalcular()
+        fijos = _bloques_estaticos(self.estilos, plantilla=plantilla, compacto=compacto)
+        if plantilla:
+            fijos = {nombre: _BloqueCompartido(f) for nombre, f in fijos.items()}
+        self.fijos = fijos
+
+    def _fijo(self, nombre):
+        if self.plantilla:
+            return BloqueFijo(self.fijos[nombre])
+        return self.fijos[nombre]
+
+    def render(self, cotizacion):
+        """PDF de la cotización como bytes"""
+        buffer = BytesIO()
+        self.render_to(cotizacion, buffer)
+        return buffer.getvalue()
+
+    def render_to(self, cotizacion, stream):
+        """Escribe el PDF de la cotización en un archivo o stream abierto"""
+        with metricas.documento(cotizacion.pk) as total:
+            doc = SimpleDocTemplate(
+                stream,
+                pagesize=A4,
+                rightMargin=1.5*cm,
+                leftMargin=1.5*cm,
+                topMargin=1*cm,
+                bottomMargin=1*cm,
+                pageCompression=1 if self.compacto else None,
+            )
+            elementos = self._elementos(cotizacion)
+            with metricas.etapa('doc_build') as medida:
+                inicio = stream.tell()
+                doc.build(elementos)
+                medida.bytes = stream.tell() - inicio
+            total.bytes = medida.bytes
+
+    def _elementos(self, cotizacion):
+        # Contenedor para los elementos del PDF
+        elements = []
+        estilos = self.estilos
+        estilos_tabla = self.estilos_tabla
+
+        titulo_empresa = estilos['titulo_empresa']
+        titulo_proforma = estilos['titulo_proforma']
+        numero_proforma = estilos['numero_proforma']
+        subtitulo_style = estilos['subtitulo']
+        small_style = estilos['small']
+        normal_style = estilos['normal']
+
+        elements.append(self._fijo('logo'))
+
+        # ENCABEZADO CON LOGO Y NÚMERO DE PROFORMA
+        header_data = [
+            [
+                Paragraph('<b>MyE Grupo Inmobiliario SAC</b>', titulo_empresa),
+                '',
+                Paragraph('PROFORMA', titulo_proforma)
+            ],
+            [
+                Paragraph('Construyendo tu Futuro<br/>Dirección del Proyecto: Av. Pío XII 318 San Miguel', small_style),
+                '',
+                Paragraph(f'N° {cotizacion.numero_cotizacion.replace("cotizacion_", "00")}', numero_proforma)
+            ]
+        ]
+    
+        header_table = Table(header_data, colWidths=[10*cm, 2*cm, 6*cm])
+        header_table.setStyle(estilos_tabla['encabezado'])
+    
+        elements.append(header_table)
+        elements.append(Spacer(1, 10))
+    
+        # SECCIÓN CLIENTE
+        elements.append(Paragraph('<b>CLIENTE</b>', subtitulo_style))
+    
+        # Datos del cliente en formato de líneas con puntos
+        fecha_actual = cotizacion.fecha_creacion.strftime('%d/%m/%Y')
+        fecha_vencimiento = (cotizacion.fecha_creacion + timedelta(days=15)).strftime('%d/%m/%Y')
+    
+        cliente_data = [
+            ['Nombre:', cotizacion.nombre_cliente, f'Fecha: {fecha_actual}'],
+            ['DNI:', cotizacion.dni_cliente, f'Presupuesto válido hasta: {fecha_vencimiento}'],
+            ['Domicilio:', cotizacion.direccion_cliente or '', ''],
+            ['Teléfono:', cotizacion.telefono_cliente or '', ''],
+            ['E-mail:', cotizacion.email_cliente or '', ''],
+            ['Distrito:', cotizacion.distrito_cliente or '',f'Medio de Captación: {cotizacion.medio_contacto}'],
+        ]
+    
+        for row in cliente_data:
+
+            left_text = Paragraph(f"<b>{row[0]}</b> {row[1]}", normal_style)
+            right_text = Paragraph(row[2], normal_style)
+            data_table = Table(
+                [[left_text, right_text]],
+                colWidths=[8*cm, 10*cm]
+            )
+        
+            data_table.setStyle(estilos_tabla['cliente'])
+            elements.append(data_table)
+    
+    
+        # --- TABLA DE COTIZACIÓN ---
+        depto = cotizacion.departamento
+        precio_base_asignado = precios.precio_base(depto)
+
+        if not cotizacion.datos_estaticos:
+            datos_estaticos = {
+                "nombre": depto.nombre,
+                "codigo": depto.codigo.replace("DEP-", ""),
+                "area_m2": f"{depto.area_m2} m²",
+                "area_libre": f"{depto.area_libre} m²",
+                "precio": f"S/. {precio_base_asignado:,.2f}",
+            }
+            cotizacion.datos_estaticos = datos_estaticos
+
+            with metricas.etapa('datos_estaticos'):
+                try:
+                    cotizacion.save()
+                except Exception:
+                    pass
+
+        else:
+            datos_estaticos = cotizacion.datos_estaticos
+
+        cotizacion_header = ['COTIZACIÓN', 'N°', 'Área techada', 'Área Libre', 'Precio']
+        cotizacion_data = [
+            cotizacion_header,
+            [
+                datos_estaticos["nombre"],
+                datos_estaticos["codigo"],
+                datos_estaticos["area_m2"],
+                datos_estaticos["area_libre"],
+                datos_estaticos["precio"],
+            ]
+        ]
+    
+        cotizacion_table = Table(cotizacion_data, colWidths=[5*cm, 2*cm, 3*cm, 3*cm, 4*cm])
+        cotizacion_table.setStyle(estilos_tabla['cotizacion'])
+    
+        elements.append(cotizacion_table)
+        elements.append(Spacer(1, 15))
+   
+        # Tabla de descuento y precio total
+        resumen_data = []
+
+        # El descuento guardado con la cotización, calculado sobre el precio base de ese momento
+        if cotizacion.tipo_descuento == 'PORC' and cotizacion.valor_descuento > 0:
+            resumen_data.append([
+                Paragraph(f'<b>Descuento ({cotizacion.valor_descuento}%)</b>', normal_style),
+                f'S/. {cotizacion.monto_descuento:,.2f}'
+            ])
+        elif cotizacion.tipo_descuento == 'MONTO' and cotizacion.valor_descuento > 0:
+            resumen_data.append([
+                Paragraph('<b>Descuento </b>', normal_style),
+                f'S/. {cotizacion.monto_descuento:,.2f}'
+            ])
+
+        # Siempre mostrar precio final
+        resumen_data.append([
+            Paragraph('<b>Precio Total</b>', subtitulo_style),
+            f'S/. {cotizacion.precio_final:,.2f}'
+        ])
+    
+        resumen_table = Table(resumen_data, colWidths=[5*cm, 3*cm])
+        resumen_table.setStyle(estilos_tabla['resumen'])
+
+        pago = precios.forma_de_pago(cotizacion.precio_final, cotizacion.cuota_inicial)
+
+        # FORMA DE PAGO Y RESUMEN DE PRECIOS
+        forma_pago_data = [
+            [Paragraph('<b>FORMA DE PAGO</b>', subtitulo_style), '', Paragraph('<b>MONTOS</b>', subtitulo_style)],
+            ['PRECIO', '', f'S/. {pago["precio_final"]:,.2f}'],
+            ['CUOTA INICIAL', '', f'S/. {pago["cuota_inicial"]:,.2f}'],
+            ['SEPARACIÓN','', f'S/. {pago["separacion"]:,.2f}'],
+            ['SALDO A FINANCIAR', '', f'S/. {pago["saldo"]:,.2f}'],
+        ]
+    
+        forma_pago_table = Table(forma_pago_data, colWidths=[6*cm, 0*cm, 3*cm])
+        forma_pago_table.setStyle(estilos_tabla['forma_pago'])
+    
+
+    
+        # Agregar tablas de forma de pago
+        tabla_contenedora = Table(
+            [[forma_pago_table, resumen_table]],
+            colWidths=[11*cm, 7*cm]  # Ajusta si deseas más o menos espacio
+        )
+
+        tabla_contenedora.setStyle(estilos_tabla['contenedora'])
+
+        elements.append(tabla_contenedora)
+        elements.append(Spacer(1, 10))
+
+        # PROCESO DE COMPRA
+        elements.append(self._fijo('proceso_titulo'))
+        elements.append(self._fijo('proceso'))
+        elements.append(Spacer(1, 5))
+    
+        # INFORMACIÓN DE LA EMPRESA
+        elements.append(self._fijo('empresa'))
+        elements.append(Spacer(1, 5))
+    
+        # NOTAS Y CONDICIONES
+        elements.append(self._fijo('notas_titulo'))
+        elements.append(self._fijo('notas'))
+        elements.append(Spacer(1, 5))
+    
+        # INFORMES
+        elements.append(self._fijo('informes'))
+
+        # CRÉDITO HIPOTECARIO REFERENCIAL DEL SALDO, en su propia página
+        if settings.HIPOTECA_EN_PDF:
+            elements.extend(self._financiamiento(pago['saldo']))
 
-    if getattr(depto, 'imagen', None):  # verifica que exista el campo
-        try:
-            if depto.imagen and hasattr(depto.imagen, 'url'):
-                depto_image_path = depto.imagen.url
-        except ValueError:
-            depto_image_path = None
 
-    c = canvas.Canvas(buffer, pagesize=A4)
 
-    if depto_image_path:
+        # Imagen del departamento (desde el caché local; la red solo la primera vez)
         try:
-            response = requests.get(depto_image_path)
-            if response.status_code == 200:
-                img_data = BytesIO(response.content)
-                pil_img = PILImage.open(img_data)
-                #pil_img = pil_img.rotate(90, expand=True)
-
-                rotated_img_data = BytesIO()
-                pil_img.save(rotated_img_data, format='PNG')
-                rotated_img_data.seek(0)
-
-                depto_image = Image(rotated_img_data, width=550, height=750)  # intercambiamos ancho/alto
-                depto_image.hAlign = 'CENTER'
+            imagen_depto = obtener_imagen_departamento(depto, compacta=self.compacto, tamano=TAMANO_IMAGEN_DEPTO)
+            if imagen_depto:
+                depto_image = ImagenFija(imagen_depto, *TAMANO_IMAGEN_DEPTO)
                 elements.append(PageBreak())
                 elements.append(depto_image)
 
         except Exception as e:
-            print("Error cargando imagen del departamento:", e)
+            logger.warning("Error cargando imagen del departamento %s: %s", depto.pk, e)
+
+        return elements
+
+    def _financiamiento(self, saldo):
+        """Cuota por plazo y saldo al cierre de cada año; sale de factores ya precalculados"""
+        tabla = financiamiento.saldos_anuales(saldo)
+        creditos = tabla['creditos']
+        if not creditos:
+            return []
+        estilos = self.estilos
+        ancho_plazo = 14*cm / len(creditos)
+
+        resumen_data = [['', *(f'{c["anios"]} AÑOS' for c in creditos)]]
+        resumen_data.append(['TEA', *(f'{c["tea"]:.2f}%' for c in creditos)])
+        resumen_data.append(['CUOTA MENSUAL', *(f'S/. {c["cuota"]:,.2f}' for c in creditos)])
+        resumen_data.append(['TOTAL INTERESES', *(f'S/. {c["total_intereses"]:,.2f}' for c in creditos)])
+        resumen_data.append(['TOTAL A PAGAR', *(f'S/. {c["total_pagado"]:,.2f}' for c in creditos)])
+        resumen_table = Table(resumen_data, colWidths=[4*cm] + [ancho_plazo] * len(creditos))
+        resumen_table.setStyle(self.estilos_tabla['financiamiento'])
+
+        saldos_data = [['AÑO', *(f'SALDO A {c["anios"]} AÑOS' for c in creditos)]]
+        for fila in tabla['filas']:
+            saldos_data.append([
+                str(fila['anio']),
+                *('' if s is None else f'S/. {s:,.2f}' for s in fila['saldos']),
+            ])
+        saldos_table = Table(saldos_data, colWidths=[4*cm] + [ancho_plazo] * len(creditos), repeatRows=1)
+        saldos_table.setStyle(self.estilos_tabla['financiamiento'])
+
+        return [
+            PageBreak(),
+            Paragraph('CRÉDITO HIPOTECARIO REFERENCIAL', estilos['subtitulo']),
+            Spacer(1, 5),
+            Paragraph(
+                f'Saldo a financiar: S/. {creditos[0]["monto"]:,.2f}. Cuotas mensuales fijas; '
+                'montos referenciales, sujetos a la evaluación de la entidad financiera.',
+                estilos['small'],
+            ),
+            Spacer(1, 8),
+            resumen_table,
+            Spacer(1, 12),
+            Paragraph('SALDO AL CIERRE DE CADA AÑO', estilos['subtitulo']),
+            Spacer(1, 5),
+            saldos_table,
+        ]
 
-    
-    # Generar el PDF 
-    doc.build(elements) 
-    pdf = buffer.getvalue() 
-    buffer.close() 
-    return pdf
\ No newline at end of file
+
+_renderers = {}
+_renderer_lock = threading.Lock()
+
+
+def obtener_renderer(compacto=None):
+    """
+    Renderer compartido del proceso, creado la primera vez que se usa. Las
+    partes fijas llevan el monto de separación, así que hay uno por monto.
+    """
+    if compacto is None:
+        compacto = settings.PDF_COMPACTO
+    clave = (compacto, precios.monto_separacion())
+    renderer = _renderers.get(clave)
+    if renderer is None:
+        with _renderer_lock:
+            renderer = _renderers.get(clave)
+            if renderer is None:
+                renderer = _renderers[clave] = ProformaRenderer(compacto=compacto)
+    return renderer
+
+
+def generar_pdf_cotizacion(cotizacion, usar_plantilla=True, compacto=None):
+    """
+    Genera un PDF para la cotización estilo MyE Grupo Inmobiliario.
+    Con usar_plantilla se usa el renderer compartido del proceso; sin ella
+    se prepara todo de nuevo para este PDF. compacto=None sigue PDF_COMPACTO.
+    """
+    if compacto is None:
+        compacto = settings.PDF_COMPACTO
+    if usar_plantilla:
+        return obtener_renderer(compacto).render(cotizacion)
+    return ProformaRenderer(plantilla=False, compacto=compacto).render(cotizacion)
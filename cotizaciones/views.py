@@ -4,14 +4,44 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, FileResponse, Http404
+from django.http import HttpResponse, FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
+from django.core.paginator import Paginator
 from django.urls import reverse
-from .models import Cotizacion, Departamento
-from .forms import LoginForm, CotizacionForm, DepartamentoForm
-from .utils import generar_pdf_cotizacion
-from datetime import datetime
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils import timezone
+from .models import Cotizacion, Departamento, ResumenCotizaciones, TrabajoPDF
+from .forms import (
+    LoginForm, CotizacionForm, DepartamentoForm, ImportarCotizacionesForm, BusquedaCotizacionesForm,
+    ReajustePreciosForm, SimuladorPreciosForm,
+)
+from .almacen_pdf import abrir_pdf_cotizacion, pdf_disponible, huella_cotizacion
+from .tareas import esperar_pdf
+from .exportacion import (
+    seleccionar_cotizaciones, iterar_pdfs, zip_en_streaming, en_hilo, exportar_tabla, FORMATOS_TABLA,
+    filas_cotizaciones, filas_departamentos, COLUMNAS_COTIZACIONES, COLUMNAS_DEPARTAMENTOS,
+)
+from .paginacion import PaginaCursor
+from .busqueda import filtrar as filtrar_cotizaciones
+from .catalogo import catalogo, version_actual
+from .difusion import obtener_difusor
+from .importacion import importar_cotizaciones as importar_archivo, ErrorArchivo
+from . import financiamiento
+from . import metricas
+from . import precios
+from . import reajustes
+from . import resumen as resumen_ventas
+from datetime import datetime, date
+from django.conf import settings
+import asyncio
 import os
+from collections import defaultdict
 from io import BytesIO
 
 def login_view(request):
@@ -39,13 +69,54 @@ def logout_view(request):
     messages.info(request, 'Sesión cerrada exitosamente')
     return redirect('cotizaciones:login')
 
+COTIZACIONES_POR_PAGINA = 50
+
+# Columnas que muestra la lista de cotizaciones
+CAMPOS_LISTA_COTIZACIONES = [
+    'numero_cotizacion', 'nombre_cliente', 'dni_cliente', 'medio_contacto', 'precio_final',
+    'tipo_descuento', 'valor_descuento', 'monto_descuento', 'fecha_creacion',
+    'departamento__codigo', 'departamento__nombre', 'creado_por__username',
+]
+
 @login_required
 def lista_cotizaciones(request):
-    """Vista principal - Lista de cotizaciones"""
-    cotizaciones = Cotizacion.objects.filter(activo=True)
-    return render(request, 'cotizaciones/lista_cotizaciones.html', {
-        'cotizaciones': cotizaciones
-    })
+    """Vista principal - Lista de cotizaciones, con búsqueda y filtros"""
+    cotizaciones = (
+        Cotizacion.objects.filter(activo=True)
+        .select_related('departamento', 'creado_por')
+        .only(*CAMPOS_LISTA_COTIZACIONES)
+    )
+    form = BusquedaCotizacionesForm(request.GET or None)
+    busqueda = form.is_valid() and form.tiene_criterios()
+
+    if busqueda:
+        # Resultados ordenados por relevancia: paginación por número de página
+        resultados = filtrar_cotizaciones(cotizaciones, form.cleaned_data)
+        pagina = Paginator(resultados, COTIZACIONES_POR_PAGINA).get_page(request.GET.get('pagina'))
+    else:
+        pagina = PaginaCursor(
+            cotizaciones, COTIZACIONES_POR_PAGINA,
+            despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+        )
+        if request.GET.get('antes') and not pagina.hay_anterior:
+            # Volviendo hacia atrás se llegó al principio: la primera página completa
+            pagina = PaginaCursor(cotizaciones, COTIZACIONES_POR_PAGINA)
+
+    parametros = request.GET.copy()
+    for clave in ('pagina', 'parcial', 'despues', 'antes'):
+        parametros.pop(clave, None)
+
+    contexto = {
+        'cotizaciones': pagina,
+        'pagina': pagina,
+        'form': form,
+        'busqueda': busqueda,
+        'parametros': parametros.urlencode(),
+    }
+    if request.GET.get('parcial'):
+        # Siguiente tramo de filas para el scroll infinito
+        return render(request, 'cotizaciones/_filas_cotizaciones.html', contexto)
+    return render(request, 'cotizaciones/lista_cotizaciones.html', contexto)
 
 
 @login_required
@@ -59,7 +130,7 @@ def nueva_cotizacion(request):
     if dept_id:
         try:
             departamento = Departamento.objects.get(id=dept_id)
-            precio_mostrado = departamento.precio + departamento.exceso_precio
+            precio_mostrado = precios.precio_base(departamento)
         except Departamento.DoesNotExist:
             departamento = None
 
@@ -78,11 +149,13 @@ def nueva_cotizacion(request):
             cotizacion.save()
 
             pdf_url = reverse('cotizaciones:ver_pdf', args=[cotizacion.pk])
+            estado_pdf_url = reverse('cotizaciones:estado_pdf', args=[cotizacion.pk])
             lista_url = reverse('cotizaciones:lista_cotizaciones')
 
             return render(request, 'cotizaciones/nueva_cotizacion.html', {
                 'form': CotizacionForm(),
                 'pdf_url': pdf_url,
+                'estado_pdf_url': estado_pdf_url,
                 'lista_url': lista_url,
                 'creada': True
             })
@@ -124,58 +197,330 @@ def eliminar_cotizacion(request, pk):
     messages.success(request, f'Cotización {cotizacion.numero_cotizacion} eliminada')
     return redirect('cotizaciones:lista_cotizaciones')
 
+def _validador(cotizacion, variante):
+    """
+    ETag fuerte según la huella del PDF. Sin Last-Modified: la huella también
+    cambia con la configuración (separación, modo compacto, hipoteca) y las
+    fechas de la cotización y del departamento no.
+    """
+    return quote_etag(f'{variante}-{huella_cotizacion(cotizacion)}')
+
+def _con_validador(response, etag):
+    response['ETag'] = etag
+    # Datos de clientes: solo el navegador guarda copia y siempre revalida
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _no_modificado(request, etag):
+    """Respuesta 304 si el navegador ya tiene esta versión, sin generar nada"""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        _con_validador(response, etag)
+    return response
+
+def _abrir_pdf(cotizacion):
+    """PDF del almacén; si un worker lo está generando se espera a que termine"""
+    if not pdf_disponible(cotizacion):
+        esperar_pdf(cotizacion.pk)
+    return abrir_pdf_cotizacion(cotizacion)
+
+@login_required
+def estado_pdf(request, pk):
+    """Estado de la generación del PDF, para consultar desde la página"""
+    cotizacion = get_object_or_404(Cotizacion.objects.select_related('departamento'), pk=pk)
+    if pdf_disponible(cotizacion):
+        estado = 'listo'
+    else:
+        estado = TrabajoPDF.objects.filter(cotizacion=cotizacion).values_list('estado', flat=True).first() or 'pendiente'
+        if estado == 'listo':
+            # Se generó pero la cotización cambió después
+            estado = 'pendiente'
+    return JsonResponse({
+        'estado': estado,
+        'listo': estado == 'listo',
+        'pdf_url': reverse('cotizaciones:ver_pdf', args=[pk]),
+    })
+
+@login_required
+def financiamiento_cotizacion(request, pk):
+    """
+    Crédito hipotecario referencial del saldo a financiar en JSON: la cuota
+    de cada plazo configurado y, con ?plazo=<años>, el cronograma mes a mes.
+    """
+    cotizacion = get_object_or_404(Cotizacion, pk=pk, activo=True)
+    saldo = precios.forma_de_pago(cotizacion.precio_final, cotizacion.cuota_inicial)['saldo']
+    datos = {'saldo': saldo, 'creditos': financiamiento.creditos(saldo)}
+
+    plazo = request.GET.get('plazo')
+    if plazo is not None:
+        try:
+            datos['cronograma'] = financiamiento.cronograma(saldo, int(plazo))['pagos'] if saldo > 0 else []
+        except ValueError:
+            plazos = ', '.join(str(anios) for anios in financiamiento.tasas())
+            return JsonResponse({'error': f'El plazo debe ser uno de: {plazos} años.'}, status=400)
+    return JsonResponse(datos)
+
 @login_required
 def descargar_pdf(request, pk):
     """Vista para descargar la cotización en PDF"""
-    cotizacion = get_object_or_404(Cotizacion, pk=pk, activo=True)
+    cotizacion = get_object_or_404(Cotizacion.objects.select_related('departamento'), pk=pk, activo=True)
+
+    etag = _validador(cotizacion, 'pdf')
+    no_modificado = _no_modificado(request, etag)
+    if no_modificado:
+        return no_modificado
     
-    # Generar el PDF
-    pdf_buffer = generar_pdf_cotizacion(cotizacion)
+    # PDF del almacén (se genera solo si la cotización cambió)
+    pdf = _abrir_pdf(cotizacion)
     
-    # Crear la respuesta HTTP con el PDF
-    response = HttpResponse(pdf_buffer, content_type='application/pdf')
     filename = f"cotizacion_{cotizacion.numero_cotizacion}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    response = FileResponse(pdf, content_type='application/pdf', as_attachment=True, filename=filename)
+    return _con_validador(response, etag)
+
+@login_required
+def exportar_pdfs(request):
+    """Descarga en un ZIP los PDFs de las cotizaciones activas filtradas"""
+    if not (request.user.is_superuser or request.user.is_staff):
+        messages.error(request, 'No tienes permisos para exportar cotizaciones.')
+        return redirect('cotizaciones:lista_cotizaciones')
+
+    try:
+        desde = date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else None
+        hasta = date.fromisoformat(request.GET['hasta']) if request.GET.get('hasta') else None
+    except ValueError:
+        messages.error(request, 'Fecha inválida, use el formato AAAA-MM-DD.')
+        return redirect('cotizaciones:lista_cotizaciones')
+
+    ids = seleccionar_cotizaciones(desde, hasta, request.GET.get('departamento'))
+    # En el proceso de la petición, desde el almacén (el worker ya generó casi todos);
+    # el pool de procesos es solo para el comando export_cotizaciones_pdf
+    pdfs = iterar_pdfs(ids)
+
+    filename = f"cotizaciones_{datetime.now().strftime('%Y%m%d')}.zip"
+    return _descarga_en_streaming(request, zip_en_streaming(pdfs), 'application/zip', filename)
+
+def _descarga_en_streaming(request, partes, content_type, filename):
+    """Adjunto que se envía a medida que se genera, también bajo ASGI"""
+    if isinstance(request, ASGIRequest):
+        partes = en_hilo(partes)
+    response = StreamingHttpResponse(partes, content_type=content_type)
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
     return response
 
+def _exportar_tabla(request, columnas, filas, nombre):
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS_TABLA:
+        messages.error(request, 'Formato no soportado, use csv o xlsx.')
+        return redirect('cotizaciones:lista_cotizaciones')
+    content_type, partes = exportar_tabla(formato, columnas, filas)
+    filename = f"{nombre}_{datetime.now().strftime('%Y%m%d')}.{formato}"
+    return _descarga_en_streaming(request, partes, content_type, filename)
+
+@login_required
+def exportar_cotizaciones(request):
+    """Cotizaciones activas filtradas en CSV o XLSX, leídas y enviadas por lotes"""
+    if not (request.user.is_superuser or request.user.is_staff):
+        messages.error(request, 'No tienes permisos para exportar cotizaciones.')
+        return redirect('cotizaciones:lista_cotizaciones')
+
+    try:
+        desde = date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else None
+        hasta = date.fromisoformat(request.GET['hasta']) if request.GET.get('hasta') else None
+    except ValueError:
+        messages.error(request, 'Fecha inválida, use el formato AAAA-MM-DD.')
+        return redirect('cotizaciones:lista_cotizaciones')
+
+    filas = filas_cotizaciones(desde, hasta, request.GET.get('departamento'))
+    return _exportar_tabla(request, COLUMNAS_COTIZACIONES, filas, 'cotizaciones')
+
+@login_required
+def exportar_departamentos(request):
+    """Departamentos en CSV o XLSX"""
+    if not (request.user.is_superuser or request.user.is_staff):
+        messages.error(request, 'No tienes permisos para exportar departamentos.')
+        return redirect('cotizaciones:lista_departamentos')
+
+    return _exportar_tabla(request, COLUMNAS_DEPARTAMENTOS, filas_departamentos(), 'departamentos')
+
+@login_required
+def importar_cotizaciones(request):
+    """Carga masiva de cotizaciones desde un CSV o Excel de campañas"""
+    if not (request.user.is_superuser or request.user.is_staff):
+        messages.error(request, 'No tienes permisos para importar cotizaciones.')
+        return redirect('cotizaciones:lista_cotizaciones')
+
+    resultado = None
+    if request.method == 'POST':
+        form = ImportarCotizacionesForm(request.POST, request.FILES)
+        if form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            try:
+                resultado = importar_archivo(archivo, archivo.name, request.user)
+            except ErrorArchivo as e:
+                messages.error(request, str(e))
+            else:
+                if resultado.creadas:
+                    messages.success(request, f'{resultado.creadas} cotizaciones importadas')
+                if resultado.errores:
+                    messages.warning(request, f'{len(resultado.errores)} filas con errores no se importaron')
+    else:
+        form = ImportarCotizacionesForm()
+
+    return render(request, 'cotizaciones/importar_cotizaciones.html', {
+        'form': form,
+        'resultado': resultado,
+    })
+
+@login_required
+def metricas_pdf(request):
+    """Tiempos, bytes y aciertos de caché acumulados por etapa de la generación de PDFs"""
+    if not (request.user.is_superuser or request.user.is_staff):
+        messages.error(request, 'No tienes permisos para ver las métricas.')
+        return redirect('cotizaciones:lista_cotizaciones')
+
+    return JsonResponse({'etapas': metricas.resumen()})
+
+@login_required
+def tablero_ventas(request):
+    """Cotizaciones del año por mes, agente, medio de captación, distrito y departamento"""
+    if not (request.user.is_superuser or request.user.is_staff):
+        messages.error(request, 'No tienes permisos para ver el tablero de ventas.')
+        return redirect('cotizaciones:lista_cotizaciones')
+
+    anios = [fecha.year for fecha in ResumenCotizaciones.objects.filter(dimension='total').dates('mes', 'year')]
+    try:
+        anio = int(request.GET.get('anio'))
+        inicio = date(anio, 1, 1)
+    except (TypeError, ValueError):
+        anio = timezone.localdate().year
+        inicio = date(anio, 1, 1)
+
+    contexto = resumen_ventas.tablero(inicio, inicio.replace(month=12))
+    contexto.update({'anio': anio, 'anios': sorted(set(anios) | {anio}, reverse=True)})
+    return render(request, 'cotizaciones/tablero_ventas.html', contexto)
+
 @login_required
 def imprimir_cotizacion(request, pk):
     """Vista para visualizar la cotización lista para imprimir"""
-    cotizacion = get_object_or_404(Cotizacion, pk=pk, activo=True)
-    return render(request, 'cotizaciones/imprimir_cotizacion.html', {
+    cotizacion = get_object_or_404(Cotizacion.objects.select_related('departamento'), pk=pk, activo=True)
+
+    etag = _validador(cotizacion, 'imprimir')
+    no_modificado = _no_modificado(request, etag)
+    if no_modificado:
+        return no_modificado
+
+    response = render(request, 'cotizaciones/imprimir_cotizacion.html', {
         'cotizacion': cotizacion
     })
+    return _con_validador(response, etag)
+
+# La cuadrícula muestra al menos estos pisos, aunque los de arriba estén vacíos
+PISOS_MINIMOS = 18
+
+# Columnas que usa la cuadrícula del edificio
+CAMPOS_CUADRICULA = [
+    'id', 'codigo', 'nombre', 'precio', 'area_m2', 'area_libre',
+    'habitaciones', 'banos', 'pisos', 'estado', 'imagen',
+]
+
+def _filas_cuadricula():
+    """Departamentos agrupados por piso, del más alto al primero"""
+    storage = Departamento._meta.get_field('imagen').storage
+    por_piso = defaultdict(list)
+    for depto in Departamento.objects.order_by('pisos', 'codigo').values(*CAMPOS_CUADRICULA):
+        depto['imagen_url'] = storage.url(depto['imagen']) if depto['imagen'] else ''
+        por_piso[depto['pisos']].append(depto)
+    por_piso.pop(None, None)  # Sin piso asignado: no tienen lugar en la cuadrícula
+
+    piso_mas_alto = max(max(por_piso, default=0), PISOS_MINIMOS)
+    return [(piso, por_piso.get(piso, [])) for piso in range(piso_mas_alto, 0, -1)]
 
 @login_required
 def lista_departamentos(request):
-    """Lista de departamentos (con precios personalizados por usuario)"""
-    departamentos = Departamento.objects.all().order_by('pisos', 'codigo')
-    pisos_range = range(1, 19)
-
-    # Agregar precios personalizados por usuario
-    departamentos_info = []
-    for depto in departamentos:
-        precio_mostrado = depto.precio
-
-        departamentos_info.append({
-            'obj': depto,
-            'precio_mostrado': precio_mostrado
+    """
+    Cuadrícula del edificio. El HTML se guarda en caché con la versión de los
+    departamentos en la clave: mientras nadie los cambie, la página solo
+    consulta esa versión.
+    """
+    es_admin = request.user.is_superuser or request.user.is_staff
+    version = version_actual()
+    clave = f'cuadricula_departamentos:{version}:{int(es_admin)}'
+
+    cuadricula = cache.get(clave)
+    if cuadricula is None:
+        cuadricula = render_to_string('cotizaciones/_cuadricula_departamentos.html', {
+            'filas': _filas_cuadricula(),
+            'es_admin': es_admin,
         })
-
-    # Organizar departamentos por piso (usando la info con precio personalizado)
-    departamentos_por_piso = {}
-    for piso in pisos_range:
-        depts_en_piso = [d for d in departamentos_info if str(d['obj'].pisos) == str(piso)]
-        departamentos_por_piso[piso] = depts_en_piso
+        cache.set(clave, cuadricula, settings.CUADRICULA_CACHE_SEGUNDOS)
 
     return render(request, 'cotizaciones/lista_departamentos.html', {
-        'departamentos_por_piso': departamentos_por_piso,
-        'pisos_range': pisos_range,
-        'es_admin': request.user.is_superuser or request.user.is_staff,
+        'cuadricula': mark_safe(cuadricula),
+        'version': version,
+        'es_admin': es_admin,
     })
 
 
+@login_required
+def api_departamentos(request):
+    """
+    Catálogo de departamentos en JSON. ?desde=<versión> (o ?since=) devuelve
+    solo los cambios y las bajas posteriores; el ETag es la versión del catálogo.
+    """
+    desde = request.GET.get('desde', request.GET.get('since'))
+    if desde is not None:
+        try:
+            desde = int(desde)
+        except ValueError:
+            return JsonResponse({'error': 'El parámetro desde debe ser un número de versión.'}, status=400)
+
+    version = version_actual()
+    etag = quote_etag(f'catalogo-{version}')
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(catalogo(version, desde), json_dumps_params={'separators': (',', ':')})
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+async def eventos_departamentos(request):
+    """
+    Server-Sent Events con la versión del catálogo cada vez que cambia un
+    departamento. Cada conexión es una corrutina esperando en una cola, sin
+    ocupar un hilo. Bajo WSGI no hay streaming: 204 y el navegador consulta
+    la API periódicamente.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    try:
+        conocida = int(request.headers.get('Last-Event-ID') or request.GET.get('desde') or -1)
+    except ValueError:
+        conocida = -1
+    difusor = obtener_difusor()
+
+    async def eventos():
+        ultima = conocida
+        async with difusor.suscribir() as cola:
+            yield f'retry: {settings.SSE_LATIDO * 1000}\n\n'
+            version = await sync_to_async(version_actual)()
+            while True:
+                if version > ultima:
+                    ultima = version
+                    yield f'id: {version}\ndata: {version}\n\n'
+                try:
+                    version = await asyncio.wait_for(cola.get(), settings.SSE_LATIDO)
+                except asyncio.TimeoutError:
+                    yield ': latido\n\n'
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Sin buffer en el proxy
+    return response
+
+
 @login_required
 def nuevo_departamento(request):
     # Solo admin puede crear departamentos
@@ -253,6 +598,53 @@ def eliminar_departamento(request, pk):
         'cotizaciones_relacionadas': cotizaciones_relacionadas
     })
 
+@login_required
+def reajuste_precios(request):
+    """Reajuste de precio de varios departamentos: primero la vista previa, después se aplica todo junto"""
+    if not (request.user.is_superuser or request.user.is_staff):
+        messages.error(request, 'No tienes permisos para reajustar precios.')
+        return redirect('cotizaciones:lista_departamentos')
+
+    form = ReajustePreciosForm(request.POST or None)
+    previa = None
+    if request.method == 'POST' and form.is_valid():
+        departamentos = reajustes.seleccionar(**form.criterios())
+        campo, tipo, valor = form.cleaned_data['campo'], form.cleaned_data['tipo'], form.cleaned_data['valor']
+        version = version_actual()
+        if request.POST.get('accion') == 'aplicar':
+            if form.cleaned_data['version'] != version:
+                messages.warning(request, 'Los departamentos cambiaron desde la vista previa. Revísela de nuevo antes de aplicar.')
+            else:
+                try:
+                    filas = reajustes.aplicar(departamentos, campo, tipo, valor)
+                except reajustes.ErrorReajuste as e:
+                    messages.error(request, f'{e} No se aplicó.')
+                else:
+                    messages.success(request, f'Precio actualizado en {filas} departamento(s).')
+                    return redirect('cotizaciones:lista_departamentos')
+        previa = reajustes.vista_previa(departamentos, campo, tipo, valor)
+        # La versión con la que se calculó la vista previa viaja en el formulario
+        datos = request.POST.copy()
+        datos['version'] = version
+        form = ReajustePreciosForm(datos)
+        form.is_valid()
+        if previa['excedidos']:
+            form.add_error('valor', reajustes.mensaje_excedidos(previa['excedidos'], previa['limite']))
+
+    return render(request, 'cotizaciones/reajuste_precios.html', {'form': form, 'previa': previa})
+
+@login_required
+def simulador_precios(request):
+    """Precio final y saldo a financiar de varios departamentos por cada descuento y cuota inicial"""
+    form = SimuladorPreciosForm(request.GET or None)
+    simulacion = None
+    if form.is_valid():
+        departamentos = form.cleaned_data['departamentos'] or form.fields['departamentos'].queryset
+        simulacion = precios.simular(
+            departamentos, form.cleaned_data['descuentos'], form.cleaned_data['cuotas_iniciales'],
+        )
+    return render(request, 'cotizaciones/simulador_precios.html', {'form': form, 'simulacion': simulacion})
+
 @login_required
 def editar_cotizacion(request, pk):
     """Vista para editar una cotización existente"""
@@ -276,15 +668,14 @@ def editar_cotizacion(request, pk):
 
 
 def ver_pdf(request, pk):
-    cotizacion = get_object_or_404(Cotizacion, pk=pk)
+    cotizacion = get_object_or_404(Cotizacion.objects.select_related('departamento'), pk=pk)
 
-    pdf_buffer = generar_pdf_cotizacion(cotizacion)
-
-    if isinstance(pdf_buffer, bytes):
-        pdf_buffer = BytesIO(pdf_buffer)
-
-    response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="cotizacion_{cotizacion.numero_cotizacion}.pdf"'
-    return response
+    etag = _validador(cotizacion, 'pdf')
+    no_modificado = _no_modificado(request, etag)
+    if no_modificado:
+        return no_modificado
 
+    pdf = _abrir_pdf(cotizacion)
 
+    response = FileResponse(pdf, content_type='application/pdf', filename=f"cotizacion_{cotizacion.numero_cotizacion}.pdf")
+    return _con_validador(response, etag)
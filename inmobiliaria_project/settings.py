@@ -1,6 +1,7 @@
 """
 Django settings for inmobiliaria_project project.
 """
+from decimal import Decimal
 from pathlib import Path
 import os
 import dj_database_url
@@ -89,9 +90,24 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Base en archivo para que las pruebas con varios hilos compartan datos
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # SQLite es solo para desarrollo y pruebas: producción usa PostgreSQL (DATABASE_URL),
+    # donde reservar() bloquea solo la fila del contador.
+    # Aquí cada transacción toma el bloqueo de escritura de toda la base al empezar
+    # (BEGIN IMMEDIATE) y las transacciones se ejecutan de una en una. Es a propósito:
+    # varias escrituras leen antes de escribir (update_or_create, el resumen) y, con
+    # transacciones diferidas, subir de lectura a escritura con otro escritor activo
+    # falla al instante con "database is locked" sin esperar el timeout.
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    })
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -132,3 +148,47 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'cotizaciones:login'
 LOGIN_REDIRECT_URL = 'cotizaciones:lista_cotizaciones'
 LOGOUT_REDIRECT_URL = 'cotizaciones:login'
+
+# Almacén de PDFs generados (se reutilizan mientras la cotización no cambie)
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', str(BASE_DIR / 'pdf_cache'))
+
+# Caché local de imágenes de departamentos usadas en los PDFs
+IMAGENES_CACHE_DIR = os.environ.get('IMAGENES_CACHE_DIR', str(BASE_DIR / 'imagenes_cache'))
+IMAGENES_CACHE_MAX_BYTES = int(os.environ.get('IMAGENES_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+IMAGENES_CACHE_MEMORIA_BYTES = int(os.environ.get('IMAGENES_CACHE_MEMORIA_BYTES', 64 * 1024 * 1024))
+IMAGENES_TIMEOUT = 10
+
+# Cuadrícula de departamentos en caché; la clave lleva la versión, así que
+# cualquier cambio la invalida sin esperar a que venza
+CUADRICULA_CACHE_SEGUNDOS = 24 * 60 * 60
+
+# Avisos de cambios de departamentos por Server-Sent Events (requiere ASGI)
+DIFUSOR_DEPARTAMENTOS = 'cotizaciones.difusion.DifusorLocal'
+SSE_INTERVALO_VERSION = 2     # segundos entre lecturas de la versión hecha en otro proceso
+SSE_LATIDO = 15               # segundos entre comentarios que mantienen viva la conexión
+
+# Cola de generación de PDFs (worker: python manage.py procesar_pdfs)
+PDF_COLA_ESPERA = 10          # segundos que una vista espera un PDF en proceso
+PDF_COLA_TIMEOUT = 300        # segundos tras los que un trabajo en proceso se da por perdido
+PDF_COLA_MAX_INTENTOS = 3
+
+# PDFs compactos: imágenes a la resolución de impresión, JPEG sin recodificar y streams binarios
+PDF_COMPACTO = os.environ.get('PDF_COMPACTO', '') == '1'
+PDF_COMPACTO_DPI = 150
+PDF_COMPACTO_CALIDAD_JPEG = 85
+
+# Métricas por etapa de la generación de PDFs: cada cuántos segundos se suman a la base de datos
+METRICAS_PDF_INTERVALO = 60
+
+# Monto de separación de un departamento (forma de pago de la proforma)
+MONTO_SEPARACION = Decimal(os.environ.get('MONTO_SEPARACION', '1500'))
+
+# Crédito hipotecario referencial de la proforma: TEA (%) por plazo en años
+HIPOTECA_TASAS = {
+    10: Decimal('8.50'),
+    15: Decimal('8.75'),
+    20: Decimal('9.00'),
+    25: Decimal('9.25'),
+}
+# Página del crédito referencial en la proforma: apagada salvo que se active con HIPOTECA_EN_PDF=1
+HIPOTECA_EN_PDF = os.environ.get('HIPOTECA_EN_PDF', '0') == '1'